@@ -5,9 +5,11 @@ from fastapi.security import APIKeyHeader, OAuth2PasswordBearer
 from jose import JWTError, jwt
 from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.services.ml_pipeline import ModelPipeline, get_pipeline
+from app.services.ml_pipeline import ModelPipeline
+from app.services.ml_pipeline import get_pipeline as get_loaded_pipeline
 
 from app.core import config, security
+from app.core.ml_config import ml_settings
 from app.crud import user as crud_user
 from app.db import models
 from app.db.session import async_session_maker
@@ -18,6 +20,11 @@ reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{config.settings}/auth/access-token"
 )
 
+# Same scheme without the automatic 401, for endpoints open to anonymous users
+optional_oauth2 = OAuth2PasswordBearer(
+    tokenUrl=f"{config.settings}/auth/access-token", auto_error=False
+)
+
 APIKeyHeader = APIKeyHeader(name="X-API-KEY")
 
 
@@ -49,7 +56,7 @@ async def get_current_user(
 
 
 async def get_optional_current_user(
-    token: Annotated[str | None, Depends(reusable_oauth2)] = None,
+    token: Annotated[str | None, Depends(optional_oauth2)] = None,
     db: Annotated[AsyncSession, Depends(get_db_session)] = None,
 ) -> models.User | None:
     if token:
@@ -69,3 +76,25 @@ async def api_key_auth(
             detail="Invalid API Key",
         )
     return True
+
+
+async def get_pipeline() -> ModelPipeline:
+    pipeline = get_loaded_pipeline()
+    if not pipeline.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Models are still loading",
+            headers={"Retry-After": "5"},
+        )
+    return pipeline
+
+
+async def get_detection_size(detection_tier: str | None = None) -> int | None:
+    if detection_tier is None:
+        return None
+    if detection_tier not in ml_settings.ML_DETECTION_TIERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown detection tier '{detection_tier}'",
+        )
+    return ml_settings.ML_DETECTION_TIERS[detection_tier]
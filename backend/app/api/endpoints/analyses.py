@@ -1,9 +1,11 @@
+import asyncio
+import time
 import uuid
+import zipfile
+from functools import partial
 from pathlib import Path
 from typing import Annotated
-import tempfile
-import shutil
-import os
+import json
 import logging
 
 from fastapi import (
@@ -15,79 +17,459 @@ from fastapi import (
     UploadFile,
     status,
 )
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.dependencies import (
     api_key_auth,
     get_current_user,
     get_db_session,
+    get_detection_size,
     get_optional_current_user,
     get_pipeline,
 )
+from app.core.metrics import STAGE_SECONDS
+from app.core.ml_config import ml_settings
 from app.crud import analysis as crud_analysis
 from app.db import models
+from app.services.jobs import job_manager
 from app.services.ml_pipeline import ModelPipeline
+from app.services.quality import QualityRejection
+from app.services.result_cache import result_cache
+from app.services.scoring import score_results
 from app.schemas import analysis as schemas_analysis
 from app.services.storage import storage_service
 
 
-from app.llm_handler import llm_response
+from app.llm_handler import (
+    LLMUnavailableError,
+    get_recommendations,
+    stream_recommendations,
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Archive members analysed by /analyses/batch, everything else is ignored
+BATCH_IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
 
-@router.post(
-    "/process",
-    response_model=schemas_analysis.AnalysisResult,
-)
-async def process_analysis(
-    pipeline: Annotated[ModelPipeline, Depends(get_pipeline)],
-    file: UploadFile = File(...),
-):
+
+async def run_pipeline(
+    pipeline: ModelPipeline, file: UploadFile, detection_size: int | None = None
+) -> dict:
+    """Run detection and classification on an uploaded image."""
+    with STAGE_SECONDS.time(stage="upload_read"):
+        image_bytes = await file.read()
+    return await run_pipeline_on_bytes(
+        pipeline, image_bytes, detection_size=detection_size
+    )
+
+
+async def run_pipeline_on_bytes(
+    pipeline: ModelPipeline,
+    image_bytes: bytes,
+    on_faces_detected=None,
+    detection_size: int | None = None,
+) -> dict:
     """
-    Process image and return analysis without saving.
+    Pipeline output for the image: `results` per face and the
+    `model_version` of the models that produced them.
     """
     if not pipeline:
         raise HTTPException(status_code=500, detail="Models not loaded")
 
+    # Bytes are decoded once in memory and shared by detection and cropping
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-            shutil.copyfileobj(file.file, tmp)
-            tmp_path = tmp.name
-
-        results = await pipeline.process_image(tmp_path)
-    finally:
-        if "tmp_path" in locals() and os.path.exists(tmp_path):
-            os.remove(tmp_path)
+        output = await result_cache.get_or_process(
+            pipeline, image_bytes, on_faces_detected, detection_size
+        )
+    except QualityRejection as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=e.to_dict()
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Could not decode the image")
 
-    if not results:
+    if not output["results"]:
         raise HTTPException(
             status_code=400, detail="No faces detected in the image"
         )
+    return output
+
+
+async def recommend(
+    pipeline: ModelPipeline, results: list[dict], metrics: dict
+) -> dict:
+    """LLM recommendations, 503 when the LLM is not configured."""
+    try:
+        return await get_recommendations(pipeline, results, metrics)
+    except LLMUnavailableError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Recommendations are not available",
+        )
 
-    text = pipeline.print_results(results)
-    llm_answer = await llm_response(text)
-    logger.info(f"LLM answer: {llm_answer}")
-    parsed_text = await pipeline.parse_llm_response(llm_answer)
 
+def build_analysis_result(
+    parsed_text: dict,
+    metrics: dict,
+    model_version: str | None = None,
+    filtered_faces: list[dict] = (),
+) -> schemas_analysis.AnalysisResult:
+    """Combine the locally scored diagram with the LLM recommendations."""
     rec_text = parsed_text["analysis_text"]
     diagram = parsed_text.get("parameters", {})
 
-    analysis_result = schemas_analysis.AnalysisResult(
+    return schemas_analysis.AnalysisResult(
         recommendations=rec_text,
-        puffiness=int(diagram.get("swelling", 0)),
-        dark_circles=int(diagram.get("eyes_darkircles", 0)),
-        fatigue=int(diagram.get("tireness", 0)),
-        acne=int(diagram.get("acne", 0)),
-        eyes_health=int(diagram.get("eyes_health", 0)),
-        skin_health=int(diagram.get("skin_health", 0)),
+        puffiness=metrics["swelling"],
+        dark_circles=metrics["eyes_darkcircles"],
+        fatigue=metrics["tireness"],
+        acne=metrics["acne"],
+        eyes_health=metrics["eyes_health"],
+        skin_health=metrics["skin_health"],
         skin_condition=diagram.get(
             "skin_condition",
             "Описание состояния кожи не было сгенерировано.",
         ),
+        model_version=model_version,
+        filtered_faces=list(filtered_faces),
+    )
+
+
+def summarize_classifications(results: list[dict]) -> list[dict]:
+    """Compact per-face classifier output for streaming clients."""
+    return [
+        {
+            "face_id": result["face_id"],
+            "bbox": list(result["bbox"]),
+            "detection_confidence": result["detection_confidence"],
+            "classes": {
+                classification["model"]: {
+                    "class_name": classification["class_name"],
+                    "confidence": classification["confidence"],
+                }
+                for classification in result["classification_results"]
+                if "class_name" in classification
+            },
+        }
+        for result in results
+    ]
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post(
+    "/process",
+    response_model=schemas_analysis.AnalysisResult,
+)
+async def process_analysis(
+    pipeline: Annotated[ModelPipeline, Depends(get_pipeline)],
+    detection_size: Annotated[int | None, Depends(get_detection_size)],
+    file: UploadFile = File(...),
+):
+    """
+    Process image and return analysis without saving.
+    """
+    output = await run_pipeline(pipeline, file, detection_size)
+    results, model_version = output["results"], output["model_version"]
+    metrics = score_results(pipeline, results)
+    parsed_text = await recommend(pipeline, results, metrics)
+    return build_analysis_result(
+        parsed_text, metrics, model_version, output["filtered_faces"]
+    )
+
+
+@router.post("/process/stream")
+async def process_analysis_stream(
+    pipeline: Annotated[ModelPipeline, Depends(get_pipeline)],
+    detection_size: Annotated[int | None, Depends(get_detection_size)],
+    file: UploadFile = File(...),
+):
+    """
+    Process image and stream the analysis as Server-Sent Events.
+
+    Events: `metrics` with the classifier outputs of every face, the
+    locally scored diagram of the primary face and the faces dropped by the
+    quality gate as soon as they are ready, `token` for every chunk of LLM text,
+    then `result` with the full AnalysisResult or `error`.
+    """
+    output = await run_pipeline(pipeline, file, detection_size)
+    results, model_version = output["results"], output["model_version"]
+    metrics = score_results(pipeline, results)
+
+    async def event_stream():
+        yield sse_event(
+            "metrics",
+            {
+                "faces": summarize_classifications(results),
+                "diagram": metrics,
+                "filtered_faces": output["filtered_faces"],
+            },
+        )
+        try:
+            async for event, payload in stream_recommendations(pipeline, results, metrics):
+                if event == "token":
+                    yield sse_event("token", {"text": payload})
+                else:
+                    analysis_result = build_analysis_result(
+                        payload, metrics, model_version, output["filtered_faces"]
+                    )
+                    yield sse_event("result", analysis_result.model_dump())
+        except Exception as e:
+            logger.error(f"Streaming analysis failed: {e}")
+            yield sse_event("error", {"detail": "Failed to generate recommendations"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def collect_batch_items(
+    files: list[UploadFile], keys: list[str]
+) -> list[tuple[str, int | None, object]]:
+    """
+    Flatten a batch request into (name, size, load) items. `load` is a
+    coroutine function returning the image bytes, so nothing is read until
+    a worker picks the item up.
+    """
+    items = []
+    for upload in files:
+        filename = upload.filename or "upload"
+        if upload.content_type in ZIP_CONTENT_TYPES or filename.lower().endswith(".zip"):
+            try:
+                archive = zipfile.ZipFile(upload.file)
+            except zipfile.BadZipFile:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"{filename} is not a valid zip archive",
+                )
+            for info in archive.infolist():
+                if info.is_dir() or Path(info.filename).suffix.lower() not in BATCH_IMAGE_SUFFIXES:
+                    continue
+                load = partial(asyncio.to_thread, archive.read, info)
+                items.append((f"{filename}/{info.filename}", info.file_size, load))
+        else:
+            items.append((filename, upload.size, upload.read))
+
+    for key in keys:
+        load = partial(asyncio.to_thread, storage_service.download_file, key)
+        items.append((key, None, load))
+    return items
+
+
+async def analyse_batch_item(
+    pipeline: ModelPipeline,
+    index: int,
+    item: tuple[str, int | None, object],
+    detection_size: int | None,
+) -> dict:
+    """Analyse one batch item; failures are reported in the line, not raised."""
+    name, size, load = item
+    line = {"index": index, "name": name}
+    max_bytes = ml_settings.ANALYSIS_BATCH_MAX_IMAGE_BYTES
+    if size is not None and size > max_bytes:
+        return {**line, "status": "error", "detail": "Image is too large"}
+
+    try:
+        with STAGE_SECONDS.time(stage="upload_read"):
+            image_bytes = await load()
+        if len(image_bytes) > max_bytes:
+            return {**line, "status": "error", "detail": "Image is too large"}
+        output = await result_cache.get_or_process(
+            pipeline, image_bytes, None, detection_size
+        )
+    except QualityRejection as e:
+        return {**line, "status": "rejected", "detail": e.to_dict()}
+    except FileNotFoundError:
+        return {**line, "status": "error", "detail": "Object not found"}
+    except ValueError:
+        return {**line, "status": "error", "detail": "Could not decode the image"}
+    except Exception as e:
+        logger.error(f"Batch analysis of {name} failed: {e}")
+        return {**line, "status": "error", "detail": "Analysis failed"}
+
+    results = output["results"]
+    if not results:
+        return {**line, "status": "error", "detail": "No faces detected in the image"}
+    return {
+        **line,
+        "status": "ok",
+        "model_version": output["model_version"],
+        "faces": summarize_classifications(results),
+        "diagram": score_results(pipeline, results),
+        "filtered_faces": output["filtered_faces"],
+    }
+
+
+async def batch_lines(
+    pipeline: ModelPipeline,
+    items: list[tuple[str, int | None, object]],
+    detection_size: int | None,
+):
+    """
+    NDJSON lines in completion order. A fixed set of workers pulls items,
+    so at most ANALYSIS_BATCH_CONCURRENCY images are in memory and in the
+    pipeline at once; the last line is the summary.
+    """
+    start = time.perf_counter()
+    queue: asyncio.Queue = asyncio.Queue()
+    pending = iter(enumerate(items))
+    workers = max(1, min(ml_settings.ANALYSIS_BATCH_CONCURRENCY, len(items)))
+
+    async def worker():
+        for index, item in pending:
+            await queue.put(
+                await analyse_batch_item(pipeline, index, item, detection_size)
+            )
+
+    async def run_workers():
+        try:
+            await asyncio.gather(*(worker() for _ in range(workers)))
+        finally:
+            queue.put_nowait(None)
+
+    runner = asyncio.create_task(run_workers())
+    counts = {"ok": 0, "rejected": 0, "error": 0}
+    try:
+        while (line := await queue.get()) is not None:
+            counts[line["status"]] += 1
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+    finally:
+        # The client went away or the batch is done: stop pulling items
+        runner.cancel()
+
+    summary = {
+        "total": len(items),
+        **counts,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    yield json.dumps({"summary": summary}) + "\n"
+
+
+@router.post("/batch", dependencies=[Depends(api_key_auth)])
+async def process_batch(
+    pipeline: Annotated[ModelPipeline, Depends(get_pipeline)],
+    detection_size: Annotated[int | None, Depends(get_detection_size)],
+    files: list[UploadFile] = File(default=[]),
+    keys: list[str] = Form(default=[]),
+):
+    """
+    Analyse many images for internal jobs without saving them.
+
+    Accepts any mix of uploaded images, zip archives of images and object
+    keys in the storage bucket. Results are streamed as NDJSON, one line
+    per image as soon as it completes (`index` refers to the request
+    order, `status` is ok, rejected or error; `diagram` scores the primary
+    face as in AnalysisResult), followed by a `summary` line. Concurrent images share classifier batches when
+    ML_MICRO_BATCHING is on. No LLM recommendations are generated.
+    """
+    items = collect_batch_items(files, keys)
+    if not items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="No images in the batch"
+        )
+    if len(items) > ml_settings.ANALYSIS_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch may contain at most {ml_settings.ANALYSIS_BATCH_MAX_ITEMS} images",
+        )
+
+    return StreamingResponse(
+        batch_lines(pipeline, items, detection_size),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    return analysis_result
+
+
+@router.post(
+    "/jobs",
+    response_model=schemas_analysis.AnalysisJob,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def submit_analysis_job(
+    pipeline: Annotated[ModelPipeline, Depends(get_pipeline)],
+    current_user: Annotated[
+        models.User | None, Depends(get_optional_current_user)
+    ],
+    detection_size: Annotated[int | None, Depends(get_detection_size)],
+    file: UploadFile = File(...),
+):
+    """
+    Queue an analysis and return its job id immediately.
+
+    Stage events (`faces_detected`, `classified`, `recommendations_ready`
+    or `failed`) are pushed to the user's `/ws` connection; anonymous
+    clients poll `GET /analyses/jobs/{job_id}` instead.
+    """
+    with STAGE_SECONDS.time(stage="upload_read"):
+        image_bytes = await file.read()
+
+    async def handler(job):
+        async def faces_detected(count: int):
+            await job_manager.report(job, "faces_detected", {"faces": count})
+
+        output = await run_pipeline_on_bytes(
+            pipeline, image_bytes, faces_detected, detection_size
+        )
+        results, model_version = output["results"], output["model_version"]
+        if job.stage != "faces_detected":
+            # Served from the result cache, detection did not run
+            await faces_detected(len(results))
+
+        metrics = score_results(pipeline, results)
+        await job_manager.report(
+            job,
+            "classified",
+            {
+                "faces": summarize_classifications(results),
+                "diagram": metrics,
+                "filtered_faces": output["filtered_faces"],
+            },
+        )
+        parsed_text = await recommend(pipeline, results, metrics)
+        return build_analysis_result(
+            parsed_text, metrics, model_version, output["filtered_faces"]
+        ).model_dump()
+
+    try:
+        job = job_manager.submit(handler, current_user.id if current_user else None)
+    except asyncio.QueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many analyses in progress, try again later",
+        )
+    return job.to_dict()
+
+
+@router.get("/jobs/{job_id}", response_model=schemas_analysis.AnalysisJob)
+async def read_analysis_job(
+    job_id: str,
+    current_user: Annotated[
+        models.User | None, Depends(get_optional_current_user)
+    ],
+):
+    """
+    Poll the state of an analysis job.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Job not found"
+        )
+    if job.owner_id is not None and (
+        current_user is None or job.owner_id != current_user.id
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this job",
+        )
+    return job.to_dict()
 
 
 @router.post(
@@ -108,6 +490,7 @@ async def create_analysis(
     skin_condition: str = Form(...),
     eyes_health: int | None = Form(None),
     skin_health: int | None = Form(None),
+    model_version: str | None = Form(None),
 ):
     """
     Create a new analysis and save it to the database.
@@ -127,6 +510,7 @@ async def create_analysis(
         eyes_health=eyes_health or 0,
         skin_health=skin_health or 0,
         skin_condition=skin_condition,
+        model_version=model_version,
     )
 
     analysis = await crud_analysis.create_analysis(db, analysis_in=analysis_in)
@@ -210,7 +594,8 @@ async def assign_analysis_to_user(
 
     analysis.owner_id = current_user.id
     db.add(analysis)
-    await db.commit()
+    with STAGE_SECONDS.time(stage="db_commit"):
+        await db.commit()
     await db.refresh(analysis)
 
     if analysis.image_path:
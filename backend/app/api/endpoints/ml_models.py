@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.api.dependencies import api_key_auth, get_pipeline
+from app.services.ml_pipeline import ModelPipeline
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Keeps a reference to the running reload so it is not garbage collected
+reload_task: asyncio.Task | None = None
+
+
+def describe_models(pipeline: ModelPipeline) -> dict:
+    return {
+        "version_key": pipeline.model_version_key(),
+        "model_versions": pipeline.get_model_versions(),
+        "registry": {
+            name: spec.model_dump() for name, spec in pipeline.registry.specs.items()
+        },
+        "reloading": pipeline.reloading,
+        "last_reload": pipeline.last_reload,
+    }
+
+
+@router.get("/")
+async def read_models(
+    pipeline: Annotated[ModelPipeline, Depends(get_pipeline)],
+):
+    """
+    Registry entries and the versions of the models currently serving.
+    """
+    return describe_models(pipeline)
+
+
+@router.post(
+    "/reload",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(api_key_auth)],
+)
+async def reload_models(
+    pipeline: Annotated[ModelPipeline, Depends(get_pipeline)],
+):
+    """
+    Load the weights from the registry in the background, warm them up and
+    swap them in. Requests keep being served by the current models until
+    the swap; poll `GET /models` for the outcome.
+    """
+    global reload_task
+    if pipeline.reloading:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Model reload already in progress",
+        )
+
+    async def reload():
+        try:
+            await pipeline.reload_models()
+        except Exception as e:
+            logger.error(f"Model reload failed: {e}")
+
+    reload_task = asyncio.create_task(reload())
+    # Let the task take the reload lock so the response reflects it
+    await asyncio.sleep(0)
+    return describe_models(pipeline)
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import PostgresDsn, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -33,6 +35,8 @@ class Settings(BaseSettings):
     MINIO_ROOT_PASSWORD: str
     MINIO_ROOT_USER: str
     MINIO_PUBLIC_URL: str
+    # "memory" keeps uploads in process memory instead of MinIO (load tests)
+    STORAGE_BACKEND: Literal["minio", "memory"] = "minio"
 
     INTERNAL_API_KEY: str
 
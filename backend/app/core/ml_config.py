@@ -0,0 +1,160 @@
+from typing import Literal
+
+from pydantic import model_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class MLSettings(BaseSettings):
+    """
+    Inference settings for the ML pipeline.
+
+    Kept apart from `Settings` and fully defaulted, so the pipeline can be
+    imported and configured without the database/MinIO environment.
+    """
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        case_sensitive=True,
+        extra="ignore",
+    )
+
+    # Run the five MobileNet classifiers as one grouped network. On CPU the
+    # grouped convolutions only beat five separate forwards for a single
+    # face (~0.7x the time at batch 1, 1.3-1.7x at batch 2-8), so larger
+    # batches fall back to the separate models. Cannot be combined with
+    # ML_CASCADE: the grouped network always computes every head
+    ML_FUSED_HEADS: bool = False
+    ML_FUSED_HEADS_MAX_BATCH: int = 1
+
+    # Early-exit cascade over the classifiers, needs ML_FUSED_HEADS off.
+    # Rules decide per face from the detection confidence, the crop size
+    # and earlier classifier outputs whether a model is skipped or run on
+    # a ML_CASCADE_REDUCED_SIZE input,
+    # as JSON, e.g. [{"models": ["mobilenet_eyes_pupils"], "action": "skip",
+    # "when_model": "mobilenet_age", "when_classes": ["baby"],
+    # "min_confidence": 0.9}]; see app.services.cascade. Empty = built-in rules
+    ML_CASCADE: bool = False
+    ML_CASCADE_RULES: list[dict] = []
+    ML_CASCADE_REDUCED_SIZE: int = 160
+
+    # Cross-request micro-batching of face crops before the classifiers
+    ML_MICRO_BATCHING: bool = False
+    ML_MICRO_BATCH_SIZE: int = 8
+    ML_MICRO_BATCH_WAIT_MS: float = 5.0
+
+    # Where blocking YOLO/MobileNet work runs: the event loop itself,
+    # a thread pool or a pool of worker processes with their own models
+    ML_EXECUTOR: Literal["inline", "thread", "process"] = "thread"
+    # 0 = os.cpu_count() // torch intra-op threads
+    ML_EXECUTOR_WORKERS: int = 0
+    # 0 = keep torch's default intra-op thread count
+    ML_TORCH_THREADS: int = 0
+    # 0 = one in-flight inference per executor worker
+    ML_MAX_CONCURRENT_INFERENCES: int = 0
+
+    # Execution runtime for YOLO and the classifiers. "onnx" loads the
+    # graphs written by `python -m app.tools.onnx_export` (needs onnxruntime)
+    ML_BACKEND: Literal["torch", "onnx"] = "torch"
+    # Empty = app/onnx
+    ML_ONNX_DIR: str = ""
+
+    # Per-classifier precision for the torch backend, as JSON, e.g.
+    # {"mobilenet_age": "int8", "mobilenet_skin": "bf16"}; missing = fp32
+    ML_PRECISION: dict[str, Literal["fp32", "bf16", "int8"]] = {}
+    # Folder of face photos used to calibrate int8 activations
+    ML_CALIBRATION_DIR: str = ""
+    ML_CALIBRATION_IMAGES: int = 64
+
+    # Pipeline results keyed by image hash + model versions.
+    # Size 0 disables the in-process LRU tier; the persistent tier is an
+    # optional SQLite file shared by all workers on the host
+    ML_RESULT_CACHE_SIZE: int = 256
+    ML_RESULT_CACHE_TTL: float = 3600.0
+    ML_RESULT_CACHE_PATH: str = ""
+
+    # Reuse parsed LLM recommendations for near-identical classifier
+    # outputs: probabilities are bucketed to LLM_CACHE_BUCKET_WIDTH.
+    # Size 0 disables the cache
+    LLM_CACHE_SIZE: int = 1024
+    LLM_CACHE_TTL: float = 86400.0
+    LLM_CACHE_BUCKET_WIDTH: float = 0.1
+
+    # Face detection input size. Requests may pick a tier by name
+    # (?detection_tier=fast); the ONNX YOLO graph is exported at 640, so
+    # other sizes need a re-export for the onnx backend.
+    # ML_FAST_DECODE decodes large JPEGs at 1/2, 1/4 or 1/8 scale for
+    # detection and crops faces from the smallest decode that still covers
+    # the classifier input
+    ML_DETECTION_SIZE: int = 640
+    ML_DETECTION_TIERS: dict[str, int] = {"fast": 416, "standard": 640, "precise": 960}
+    ML_FAST_DECODE: bool = True
+
+    # Cheap quality gate in front of detection. Sharpness is the Laplacian
+    # variance of the frame scaled to 512 px, brightness is the mean gray
+    # level, clipped = share of pixels below 16 or above 239; face size is
+    # the shorter bbox side in original pixels. Off by default: with it
+    # uploads that analyse fine today can get 422, tune the thresholds on
+    # real traffic before enabling. Faces below ML_QUALITY_MIN_FACE are
+    # reported in filtered_faces, not silently dropped
+    ML_QUALITY_GATE: bool = False
+    ML_QUALITY_MIN_RESOLUTION: int = 480
+    ML_QUALITY_MIN_SHARPNESS: float = 30.0
+    ML_QUALITY_MIN_BRIGHTNESS: float = 40.0
+    ML_QUALITY_MAX_BRIGHTNESS: float = 220.0
+    ML_QUALITY_MAX_CLIPPED: float = 0.5
+    ML_QUALITY_MIN_FACE: int = 96
+
+    # JSON manifest with path, version, sha256, precision and threads per
+    # model (see app.services.model_registry); empty = bundled weights.
+    # ML_MODEL_WATCH_INTERVAL > 0 polls the manifest and weights every N
+    # seconds and hot-reloads on change. With ML_INFERENCE_SERVER_URL the
+    # server watches the files and API workers poll it for the versions
+    ML_MODEL_REGISTRY: str = ""
+    ML_MODEL_WATCH_INTERVAL: float = 0.0
+
+    # Background analysis jobs (/analyses/jobs): worker count, queue bound
+    # (full queue = 503) and how long finished jobs stay pollable, seconds
+    ANALYSIS_JOB_WORKERS: int = 2
+    ANALYSIS_JOB_QUEUE_SIZE: int = 64
+    ANALYSIS_JOB_TTL: float = 3600.0
+
+    # Internal bulk analysis (/analyses/batch): images analysed at once per
+    # request, the most images one request may carry and the largest
+    # accepted image, bytes
+    ANALYSIS_BATCH_CONCURRENCY: int = 4
+    ANALYSIS_BATCH_MAX_ITEMS: int = 5000
+    ANALYSIS_BATCH_MAX_IMAGE_BYTES: int = 20_000_000
+
+    # Live camera analysis over /ws/frames. YOLO runs on every
+    # ML_STREAM_DETECT_EVERY-th processed frame, tracked boxes are
+    # extrapolated in between; a face is re-classified when its crop changed
+    # by more than ML_STREAM_CHANGE_THRESHOLD (mean abs difference of a 32x32
+    # gray thumbnail, 0-255) or after ML_STREAM_MAX_CLASSIFY_INTERVAL frames.
+    # ML_STREAM_SMOOTHING is the EMA weight of a new classification
+    ML_STREAM_DETECT_EVERY: int = 5
+    ML_STREAM_CHANGE_THRESHOLD: float = 12.0
+    ML_STREAM_MAX_CLASSIFY_INTERVAL: int = 30
+    ML_STREAM_SMOOTHING: float = 0.3
+    ML_STREAM_MAX_SESSIONS: int = 8
+    ML_STREAM_MAX_FRAME_BYTES: int = 2_000_000
+
+    # Out-of-process inference server shared by all API workers, e.g.
+    # "unix:///tmp/inference.sock" or "http://127.0.0.1:8100".
+    # Empty = load the models inside this process.
+    ML_INFERENCE_SERVER_URL: str = ""
+    ML_INFERENCE_SERVER_TIMEOUT: float = 60.0
+
+
+    @model_validator(mode="after")
+    def check_fused_heads_and_cascade(self):
+        # model_copy() skips validation, ModelPipeline calls this again
+        if self.ML_FUSED_HEADS and self.ML_CASCADE:
+            raise ValueError(
+                "ML_FUSED_HEADS and ML_CASCADE cannot be enabled together: "
+                "the fused heads compute every classifier, nothing can be skipped"
+            )
+        return self
+
+
+ml_settings = MLSettings()
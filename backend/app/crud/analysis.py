@@ -1,6 +1,7 @@
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.metrics import STAGE_SECONDS
 from app.db import models
 from app.schemas.analysis import AnalysisCreate, AnalysisUpdate
 
@@ -12,7 +13,8 @@ async def create_analysis(
     analysis_data = analysis_in.model_dump()
     db_obj = models.Analysis(**analysis_data)
     db.add(db_obj)
-    await db.commit()
+    with STAGE_SECONDS.time(stage="db_commit"):
+        await db.commit()
     await db.refresh(db_obj)
     return db_obj
 
@@ -43,6 +45,40 @@ async def update_analysis(
     for field, value in update_data.items():
         setattr(db_obj, field, value)
     db.add(db_obj)
-    await db.commit()
+    with STAGE_SECONDS.time(stage="db_commit"):
+        await db.commit()
     await db.refresh(db_obj)
     return db_obj
+
+
+async def get_analyses_page(
+    db: AsyncSession, *, after_id: int, limit: int, exclude_model_version: str | None = None
+) -> list[tuple[int, str]]:
+    """
+    (id, image_path) of the next `limit` analyses with id > after_id.
+    Keyset paging, so every page costs the same however deep the scan is.
+    Rows without an image (NULL or empty image_path) have nothing to
+    reanalyse and are skipped.
+    """
+    query = (
+        select(models.Analysis.id, models.Analysis.image_path)
+        .where(models.Analysis.id > after_id)
+        .where(models.Analysis.image_path.is_not(None), models.Analysis.image_path != "")
+        .order_by(models.Analysis.id)
+        .limit(limit)
+    )
+    if exclude_model_version is not None:
+        query = query.where(
+            models.Analysis.model_version.is_distinct_from(exclude_model_version)
+        )
+    result = await db.execute(query)
+    return [tuple(row) for row in result.all()]
+
+
+async def bulk_update_analyses(db: AsyncSession, *, rows: list[dict]) -> None:
+    """Update many analyses in one executemany; each row holds `id` and the new values."""
+    if not rows:
+        return
+    await db.execute(update(models.Analysis), rows)
+    with STAGE_SECONDS.time(stage="db_commit"):
+        await db.commit()
@@ -31,6 +31,7 @@ class Analysis(Base):
     skin_condition: Mapped[str | None] = mapped_column(sa.Text, nullable=True)
     eyes_health: Mapped[int | None] = mapped_column(sa.Integer, nullable=True)
     skin_health: Mapped[int | None] = mapped_column(sa.Integer, nullable=True)
+    model_version: Mapped[str | None] = mapped_column(sa.String(64), nullable=True)
     created_at: Mapped[sa.DateTime] = mapped_column(
         sa.DateTime(timezone=True), default=sa.func.now()
     )
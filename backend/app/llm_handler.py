@@ -1,13 +1,45 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
+
+from app.core.metrics import CACHE_REQUESTS, STAGE_SECONDS
+from app.core.ml_config import ml_settings
+
 load_dotenv() 
 
-CLIENT = AsyncOpenAI(
-    api_key="sk-RhHJlk2AXoYLcBjwQTxaGm7R8ynjQ8r7",
-    base_url="https://openai.api.proxyapi.ru/v1",
-)
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailableError(RuntimeError):
+    """LLM_API_KEY не задан, рекомендации не генерируются"""
+
+
+# Без ключа LLM отключён: анализ работает, запросы за рекомендациями падают сразу
+LLM_API_KEY = os.getenv("LLM_API_KEY")
+CLIENT = None
+if LLM_API_KEY:
+    CLIENT = AsyncOpenAI(
+        api_key=LLM_API_KEY,
+        base_url=os.getenv("LLM_BASE_URL", "https://openai.api.proxyapi.ru/v1"),
+    )
+else:
+    logger.warning("LLM_API_KEY is not set, LLM recommendations are disabled.")
+
+
+def get_client() -> AsyncOpenAI:
+    if CLIENT is None:
+        raise LLMUnavailableError("LLM_API_KEY is not set")
+    return CLIENT
+
 
-async def llm_response(analysis_results: str) -> str:
+def build_messages(analysis_results: str, metrics: dict | None = None) -> list[dict]:
     
     instr = f'''Ты - ведущий дерматокосметолог и специалист по превентивной медицине с 20-летним опытом. Ты видишь не просто цифры, а понимаешь глубинные взаимосвязи между различными параметрами состояния кожи и здоровья.
 
@@ -95,17 +127,180 @@ async def llm_response(analysis_results: str) -> str:
     [Конкретные триггеры для визита к дерматологу/терапевту]
 
     **Помни**: Ты не ставишь диагнозы, а даешь экспертные рекомендации на основе данных. Будь эмпатичен, но объективен. Раскрой свой ответ, не сдерживайся в словах и относись к человеку, как к дорогому пациенту.
+    '''
+
+    if metrics is not None:
+        # Диаграмма уже посчитана локально (app.services.scoring), LLM нужен только текст
+        instr += f'''
+    Итоговые показатели уже рассчитаны системой по формулам выше. Не пересчитывай их и не выводи JSON-диаграмму, опирайся на эти значения в заключении:
+    {json.dumps(metrics, ensure_ascii=False)}
+    '''
+        return [
+            {"role": "system", "content": instr},
+            {"role": "user", "content": analysis_results}
+        ]
 
+    instr += f'''
     Вот так нужно выдать диаграмму состояний в конце твоего ответа:
     Посчитай все итоговые значения для состояний. Для eyes_darkcircles бери то значение, которое получилось наибольшим.
     {{"tireness": <расчетный_процент>, "eyes_health": <процент>, "swelling": <процент>, "eyes_darkcircles": <light_darkcircles>, "skin_health": <процент>, "acne": <процент>, "stress": <tireness * 0.4 + eyes_darkcircles * 0.25 + swelling * 0.2>, "balance": <100 - (tireness * 0.35 + acne * 0.1 + swelling * 0.2 + eyes_darkcircles * 0.15 + stress * 0.35>}}
     '''
 
-    chat_completion = await CLIENT.chat.completions.create(
-        model="openai/gpt-4o",
-        messages=[
-            {"role": "system", "content": instr},
-            {"role": "user", "content": analysis_results}
-        ]
-    )
+    return [
+        {"role": "system", "content": instr},
+        {"role": "user", "content": analysis_results}
+    ]
+
+
+async def llm_response(analysis_results: str, metrics: dict | None = None) -> str:
+    with STAGE_SECONDS.time(stage="llm_response"):
+        chat_completion = await get_client().chat.completions.create(
+            model="openai/gpt-4o",
+            messages=build_messages(analysis_results, metrics)
+        )
     return chat_completion.choices[0].message.content
+
+
+async def llm_response_stream(analysis_results: str, metrics: dict | None = None):
+    """Потоковый вариант llm_response: отдаёт текст по мере генерации"""
+    # Время до последнего токена, как у непотокового llm_response
+    with STAGE_SECONDS.time(stage="llm_response"):
+        stream = await get_client().chat.completions.create(
+            model="openai/gpt-4o",
+            messages=build_messages(analysis_results, metrics),
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+def recommendation_key(results, bucket_width):
+    """
+    Канонический ключ профиля лица: вероятности каждой модели, округлённые
+    до корзин ширины bucket_width. BBox и уверенность детекции не влияют
+    на рекомендации и в ключ не входят.
+    """
+    profile = []
+    for result in sorted(results, key=lambda r: r['face_id']):
+        face = []
+        for classification in sorted(result['classification_results'], key=lambda c: c['model']):
+            if 'all_probabilities' in classification:
+                buckets = [int(round(float(p) / bucket_width)) for p in classification['all_probabilities']]
+            else:
+                buckets = None
+            face.append([classification['model'], buckets])
+        profile.append(face)
+    payload = json.dumps(profile, separators=(',', ':')).encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+class RecommendationCache:
+    """LRU кэш разобранных ответов LLM с ограничением по времени жизни"""
+
+    def __init__(self, max_entries=1024, ttl=86400.0, bucket_width=0.1):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bucket_width = bucket_width
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            self._entries.pop(key, None)
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache="recommendation", result="miss")
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        CACHE_REQUESTS.inc(cache="recommendation", result="hit")
+        return copy.deepcopy(entry[1])
+
+    def put(self, key, parsed):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.time(), copy.deepcopy(parsed))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+
+def is_complete_answer(parsed, metrics):
+    """В кэш попадают только ответы с текстом и, если LLM считал её сам, с диаграммой"""
+    if not parsed.get("analysis_text"):
+        return False
+    return metrics is not None or bool(parsed.get("parameters"))
+
+
+recommendation_cache = RecommendationCache(
+    max_entries=ml_settings.LLM_CACHE_SIZE,
+    ttl=ml_settings.LLM_CACHE_TTL,
+    bucket_width=ml_settings.LLM_CACHE_BUCKET_WIDTH,
+)
+
+
+async def get_recommendations(pipeline, results, metrics=None) -> dict:
+    """
+    Рекомендации LLM для результатов пайплайна: из кэша по квантованному
+    профилю классификаторов или новым запросом к LLM.
+    metrics - локально рассчитанная диаграмма; с ней LLM пишет только текст.
+    Возвращает {"analysis_text": ..., "parameters": {...}}.
+    """
+    key = None
+    if recommendation_cache.max_entries > 0:
+        key = recommendation_key(results, recommendation_cache.bucket_width)
+        cached = recommendation_cache.get(key)
+        if cached is not None:
+            logger.info("LLM recommendations served from cache")
+            return cached
+
+    text = pipeline.print_results(results)
+    llm_answer = await llm_response(text, metrics)
+    logger.info(f"LLM answer: {llm_answer}")
+    with STAGE_SECONDS.time(stage="parse_llm_response"):
+        parsed = await pipeline.parse_llm_response(llm_answer)
+
+    if key is not None and is_complete_answer(parsed, metrics):
+        recommendation_cache.put(key, parsed)
+    return parsed
+
+
+async def stream_recommendations(pipeline, results, metrics=None):
+    """
+    Потоковые рекомендации: события ("token", текст) по мере генерации и
+    в конце ("result", {"analysis_text": ..., "parameters": {...}}).
+    При попадании в кэш весь текст отдаётся одним токеном.
+    """
+    key = None
+    if recommendation_cache.max_entries > 0:
+        key = recommendation_key(results, recommendation_cache.bucket_width)
+        cached = recommendation_cache.get(key)
+        if cached is not None:
+            logger.info("LLM recommendations served from cache")
+            yield "token", cached["analysis_text"]
+            yield "result", cached
+            return
+
+    chunks = []
+    async for delta in llm_response_stream(pipeline.print_results(results), metrics):
+        chunks.append(delta)
+        yield "token", delta
+
+    llm_answer = "".join(chunks)
+    logger.info(f"LLM answer: {llm_answer}")
+    with STAGE_SECONDS.time(stage="parse_llm_response"):
+        parsed = await pipeline.parse_llm_response(llm_answer)
+    if key is not None and is_complete_answer(parsed, metrics):
+        recommendation_cache.put(key, parsed)
+    yield "result", parsed
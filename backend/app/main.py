@@ -5,20 +5,23 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-import torch
-import torch.nn as nn
-from torchvision.models import mobilenet_v3_small
-import torchvision.transforms as transforms
-from ultralytics import YOLO
 import asyncio
-import time
+import logging
 
 from app.api.api import api_router
 from app.core.logging_config import setup_logging
-from app.services.ml_pipeline import pipeline
+from app.core.metrics import REGISTRY
+from app.llm_handler import recommendation_cache
+from app.core.ml_config import ml_settings
+from app.services.jobs import job_manager
+from app.services.model_registry import watch_models
+from app.services.ml_pipeline import RemotePipeline, pipeline
+from app.services.result_cache import result_cache
 
 setup_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="AI Vision Hakaton",
@@ -42,17 +45,69 @@ app.add_middleware(
 
 app.include_router(api_router)
 
+async def load_models():
+    try:
+        await pipeline.load_all_models()
+        print("🚀 Модели загружены, сервер готов к анализу")
+    except Exception as e:
+        logger.error(f"Model loading failed: {e}")
+        return
+    if ml_settings.ML_MODEL_WATCH_INTERVAL > 0:
+        if isinstance(pipeline, RemotePipeline):
+            # Файлы моделей отслеживает сервер инференса, воркеры только сверяют версии
+            await pipeline.watch_model_versions(ml_settings.ML_MODEL_WATCH_INTERVAL)
+        else:
+            await watch_models(pipeline, ml_settings.ML_MODEL_WATCH_INTERVAL)
+
+
 @app.on_event("startup")
 async def startup_event():
-    """Загрузка моделей при старте приложения"""
-    await pipeline.load_all_models()
-    print("🚀 FastAPI сервер запущен с загруженными моделями")
+    """
+    Загрузка моделей в фоне: auth и история анализов доступны сразу,
+    ML эндпоинты отвечают 503, пока /ready не вернёт 200.
+    Затем, если включено, та же задача следит за файлами моделей
+    """
+    app.state.model_loading = asyncio.create_task(load_models())
+    job_manager.start()
+    print("🚀 FastAPI сервер запущен, модели загружаются")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.model_loading.cancel()
+    await job_manager.stop()
+    if pipeline.scheduler is not None:
+        await pipeline.scheduler.stop()
+    pipeline.executor.shutdown()
+    if isinstance(pipeline, RemotePipeline):
+        await pipeline.close()
 
 @app.get("/health")
 async def health_check():
     """Проверка статуса сервера и моделей"""
     return {
         "status": "healthy",
-        "models_loaded": bool(pipeline and pipeline.models),
-        "loaded_models": list(pipeline.models.keys()) if pipeline else []
-    }
\ No newline at end of file
+        "models_loaded": bool(pipeline and pipeline.ready),
+        "loaded_models": list(pipeline.models.keys()) if pipeline else [],
+        "micro_batching": pipeline.scheduler.stats() if pipeline.scheduler else None,
+        "result_cache": result_cache.stats(),
+        "recommendation_cache": recommendation_cache.stats(),
+        "analysis_jobs": job_manager.stats(),
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    """Готовность к ML запросам: все модели загружены и прогреты"""
+    body = {"ready": pipeline.ready, "load_seconds": pipeline.load_seconds}
+    if pipeline.ready:
+        return body
+    if app.state.model_loading.done():
+        body["error"] = "Model loading failed"
+    return JSONResponse(status_code=503, content=body)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Метрики в формате Prometheus: задержки этапов, моделей, попадания в кэши.
+    При ML_INFERENCE_SERVER_URL этапы инференса отдаёт /metrics сервера инференса
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
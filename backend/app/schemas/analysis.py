@@ -12,9 +12,25 @@ class AnalysisBase(BaseModel):
     skin_condition: str | None = None
     eyes_health: int | None = None
     skin_health: int | None = None
+    model_version: str | None = None
+
+
+class FilteredFace(BaseModel):
+    """A detected face the quality gate left out of the analysis."""
+
+    bbox: tuple[int, int, int, int]
+    detection_confidence: float
+    reason: str
 
 
 class AnalysisResult(BaseModel):
+    """
+    Diagram columns describe the primary face only: the first face in the
+    pipeline results, i.e. the detection YOLO is most confident about.
+    Other faces in the photo are not scored. `filtered_faces` lists faces
+    that were detected but dropped by the quality gate.
+    """
+
     recommendations: str
     puffiness: int
     dark_circles: int
@@ -23,6 +39,19 @@ class AnalysisResult(BaseModel):
     skin_condition: str
     eyes_health: int
     skin_health: int
+    model_version: str | None = None
+    filtered_faces: list[FilteredFace] = []
+
+
+class AnalysisJob(BaseModel):
+    job_id: str
+    status: str
+    stage: str
+    data: dict = {}
+    result: AnalysisResult | None = None
+    error: str | dict | None = None
+    created_at: datetime
+    updated_at: datetime
 
 
 class AnalysisCreate(AnalysisBase):
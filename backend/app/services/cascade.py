@@ -0,0 +1,155 @@
+from typing import Literal
+
+import torch.nn.functional as F
+from pydantic import BaseModel
+
+from app.core.metrics import CASCADE_DECISIONS, CASCADE_SAVED_RUNS
+
+
+class CascadeRule(BaseModel):
+    """
+    Правило каскада: какие модели пропустить ("skip") или прогнать на
+    уменьшенном входе ("downgrade").
+
+    Правило срабатывает, когда выполнены все заданные условия:
+    max_detection_confidence - уверенность YOLO не выше порога,
+    max_crop_size - короткая сторона кропа лица в пикселях меньше порога,
+    when_model/when_classes/min_confidence - более ранняя модель предсказала
+    один из классов с уверенностью не ниже порога.
+    """
+
+    models: list[str]
+    action: Literal['skip', 'downgrade']
+    max_detection_confidence: float | None = None
+    max_crop_size: int | None = None
+    when_model: str | None = None
+    when_classes: list[str] = []
+    min_confidence: float = 0.0
+    reason: str = ''
+
+    def matches(self, face, results):
+        """face - {'detection_confidence', 'crop_size'}, results - уже посчитанные модели лица"""
+        if self.max_detection_confidence is not None:
+            confidence = face.get('detection_confidence')
+            if confidence is None or confidence > self.max_detection_confidence:
+                return False
+        if self.max_crop_size is not None and face['crop_size'] >= self.max_crop_size:
+            return False
+        if self.when_model is not None:
+            earlier = next(
+                (result for result in results
+                 if result['model'] == self.when_model and 'class_name' in result),
+                None,
+            )
+            if earlier is None or earlier['confidence'] < self.min_confidence:
+                return False
+            if self.when_classes and earlier['class_name'] not in self.when_classes:
+                return False
+        return True
+
+
+# Правила по умолчанию: на маленьком кропе область глаз - пара десятков
+# пикселей, а кроп меньше входа классификатора всё равно растягивается,
+# как и размытые лица с низкой уверенностью детекции
+DEFAULT_RULES = [
+    CascadeRule(
+        models=['mobilenet_eyes_darkcircles', 'mobilenet_eyes_pupils'],
+        action='skip',
+        max_crop_size=144,
+        reason='eyes_too_small',
+    ),
+    CascadeRule(
+        models=['mobilenet_skin', 'mobilenet_age', 'mobilenet_eyes_darkcircles',
+                'mobilenet_eyes_pupils', 'mobilenet_general'],
+        action='downgrade',
+        max_crop_size=192,
+        reason='small_face',
+    ),
+    CascadeRule(
+        models=['mobilenet_skin', 'mobilenet_age', 'mobilenet_eyes_darkcircles',
+                'mobilenet_eyes_pupils', 'mobilenet_general'],
+        action='downgrade',
+        max_detection_confidence=0.8,
+        reason='low_detection_confidence',
+    ),
+]
+
+
+class CascadePolicy:
+    """
+    Ранний выход по классификаторам: для каждого лица и каждой модели
+    решает, прогнать её полностью, на уменьшенном входе или пропустить.
+
+    Модели идут в порядке classifier_names, поэтому правило может опираться
+    только на модели, стоящие раньше своих целей. Уменьшенный вход -
+    тот же тензор, сжатый до reduced_size; MobileNet заканчивается
+    адаптивным пулингом, а стоимость свёрток пропорциональна площади входа.
+
+    С ML_FUSED_HEADS каскад несовместим: объединённая сеть всегда считает
+    все головы, пропускать нечего, а record учитывал бы не сделанную
+    экономию. MLSettings отклоняет такую комбинацию.
+    """
+
+    def __init__(self, rules, classifier_names, input_size=224, reduced_size=160,
+                 allow_downgrade=True):
+        self.rules = [
+            rule if isinstance(rule, CascadeRule) else CascadeRule(**rule) for rule in rules
+        ]
+        self.classifier_names = list(classifier_names)
+        self.reduced_size = reduced_size
+        self.allow_downgrade = allow_downgrade
+        self.reduced_cost = (reduced_size / input_size) ** 2
+        self._validate()
+
+    def _validate(self):
+        order = {model_name: i for i, model_name in enumerate(self.classifier_names)}
+        for rule in self.rules:
+            unknown = [name for name in rule.models + [rule.when_model] if name and name not in order]
+            if unknown:
+                raise ValueError(f"Unknown models in cascade rule: {unknown}")
+            if rule.when_model is not None and any(
+                order[model_name] <= order[rule.when_model] for model_name in rule.models
+            ):
+                raise ValueError(
+                    f"Cascade rule on {rule.when_model} can only affect later models, got {rule.models}"
+                )
+
+    def decide(self, model_name, face, results):
+        """Возвращает (решение, причина): 'full', 'downgrade' или 'skip'"""
+        downgrade = None
+        for rule in self.rules:
+            if model_name not in rule.models or not rule.matches(face, results):
+                continue
+            if rule.action == 'skip':
+                return 'skip', rule.reason
+            if downgrade is None and self.allow_downgrade:
+                downgrade = rule
+        if downgrade is not None:
+            return 'downgrade', downgrade.reason
+        return 'full', None
+
+    def reduce(self, input_tensor):
+        """Уменьшенный вход для дешёвого варианта модели"""
+        return F.interpolate(
+            input_tensor,
+            size=(self.reduced_size, self.reduced_size),
+            mode='bilinear',
+            antialias=True,
+            align_corners=False,
+        )
+
+    def record(self, model_name, decisions):
+        """Учёт решений по одной модели в метриках; возвращает сэкономленные прогоны"""
+        for decision in ('full', 'downgrade', 'skip'):
+            count = decisions.count(decision)
+            if count:
+                CASCADE_DECISIONS.inc(count, model=model_name, decision=decision)
+        saved = decisions.count('skip') + decisions.count('downgrade') * (1 - self.reduced_cost)
+        if saved:
+            CASCADE_SAVED_RUNS.inc(saved, model=model_name)
+        return saved
+
+
+def skipped_result(model_name, reason):
+    """Явная отметка модели, пропущенной каскадом"""
+    return {'model': model_name, 'skipped': True, 'reason': reason}
@@ -0,0 +1,281 @@
+import asyncio
+import time
+
+import cv2
+import numpy as np
+
+from app.core.metrics import STAGE_SECONDS, STREAM_FRAMES
+from app.services.ml_pipeline import decode_image
+from app.services.quality import QualityRejection
+from app.services.scoring import METRICS, classifier_class_names, score_batch, stack_probabilities
+
+# Сторона серого эскиза кропа, по которому определяется, изменилось ли лицо
+THUMBNAIL_SIZE = 32
+# Минимальное перекрытие детекции с предсказанной рамкой трека
+TRACK_IOU = 0.3
+# Сколько детекций подряд трек может не подтверждаться, прежде чем исчезнет
+TRACK_MAX_MISSED = 2
+
+
+def box_iou(a, b):
+    """IoU двух рамок (x1, y1, x2, y2)"""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    intersection = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class Track:
+    """Лицо, которое ведётся между детекциями"""
+
+    def __init__(self, track_id, bbox, confidence, timestamp):
+        self.id = track_id
+        self.detected_bbox = np.asarray(bbox, dtype=np.float64)
+        self.detected_at = timestamp
+        self.bbox = self.detected_bbox.copy()
+        # Скорость сторон рамки в пикселях в секунду
+        self.velocity = np.zeros(4)
+        self.confidence = confidence
+        self.missed = 0
+        # Эскиз кропа и номер кадра последней классификации
+        self.thumbnail = None
+        self.classified_frame = None
+        # Сглаженные вероятности по моделям
+        self.probabilities = {}
+
+    def predict(self, timestamp):
+        self.bbox = self.detected_bbox + self.velocity * (timestamp - self.detected_at)
+
+    def correct(self, bbox, confidence, timestamp):
+        bbox = np.asarray(bbox, dtype=np.float64)
+        elapsed = timestamp - self.detected_at
+        if elapsed > 0:
+            self.velocity = (bbox - self.detected_bbox) / elapsed
+        self.detected_bbox, self.detected_at = bbox, timestamp
+        self.bbox = bbox.copy()
+        self.confidence = confidence
+        self.missed = 0
+
+
+class FaceTracker:
+    """
+    IoU-трекер с постоянной скоростью: между детекциями рамки сдвигаются
+    со скоростью, измеренной по двум последним детекциям, а на кадре с
+    детекцией жадно сопоставляются с найденными лицами по IoU
+    """
+
+    def __init__(self, iou_threshold=TRACK_IOU, max_missed=TRACK_MAX_MISSED):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks = []
+        self._next_id = 1
+
+    def predict(self, timestamp):
+        for track in self.tracks:
+            track.predict(timestamp)
+
+    def update(self, detections, timestamp):
+        """detections - список (bbox, confidence) кадра, на котором работал YOLO"""
+        self.predict(timestamp)
+        pairs = sorted(
+            (
+                (box_iou(track.bbox, bbox), track_index, detection_index)
+                for track_index, track in enumerate(self.tracks)
+                for detection_index, (bbox, _) in enumerate(detections)
+            ),
+            reverse=True,
+        )
+        matched_tracks, matched_detections = set(), set()
+        for overlap, track_index, detection_index in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if track_index in matched_tracks or detection_index in matched_detections:
+                continue
+            bbox, confidence = detections[detection_index]
+            self.tracks[track_index].correct(bbox, confidence, timestamp)
+            matched_tracks.add(track_index)
+            matched_detections.add(detection_index)
+
+        tracks = []
+        for track_index, track in enumerate(self.tracks):
+            if track_index not in matched_tracks:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    continue
+            tracks.append(track)
+        for detection_index, (bbox, confidence) in enumerate(detections):
+            if detection_index not in matched_detections:
+                tracks.append(Track(self._next_id, bbox, confidence, timestamp))
+                self._next_id += 1
+        self.tracks = tracks
+
+
+class FrameStreamSession:
+    """
+    Анализ потока кадров одного WebSocket соединения.
+
+    Кадры попадают в слот на один кадр: пока идёт анализ, новый кадр
+    вытесняет ещё не взятый в работу, так что ни медленный клиент, ни
+    занятый сервер не копят очередь. YOLO работает на каждом
+    ML_STREAM_DETECT_EVERY-м обработанном кадре, между ними рамки ведёт
+    FaceTracker. Классификаторы перезапускаются только для лиц, кроп
+    которых заметно изменился, их вероятности сглаживаются EMA.
+    """
+
+    def __init__(self, pipeline, settings, imgsz=None):
+        self.pipeline = pipeline
+        self.settings = settings
+        self.imgsz = imgsz
+        self.tracker = FaceTracker()
+        self.class_names = classifier_class_names(pipeline)
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+        # None - детекция нужна на ближайшем кадре
+        self.frames_since_detection = None
+        self._pending = None
+        self._frame_ready = asyncio.Event()
+
+    def submit(self, frame_bytes):
+        """Кладёт кадр в слот; кадр, который ещё не начали анализировать, отбрасывается"""
+        if self._pending is not None:
+            self.dropped += 1
+            STREAM_FRAMES.inc(outcome='dropped')
+        self.received += 1
+        self._pending = (self.received, time.monotonic(), frame_bytes)
+        self._frame_ready.set()
+
+    async def next_frame(self):
+        """Самый свежий кадр: (номер, время получения, байты)"""
+        await self._frame_ready.wait()
+        self._frame_ready.clear()
+        frame, self._pending = self._pending, None
+        return frame
+
+    def crop(self, frame, bbox):
+        """RGB кроп рамки трека, обрезанной по границам кадра"""
+        height, width = frame.shape[:2]
+        x1, y1 = max(0, int(bbox[0])), max(0, int(bbox[1]))
+        x2, y2 = min(width, int(bbox[2])), min(height, int(bbox[3]))
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return None
+        return cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2RGB)
+
+    def needs_classification(self, track, crop):
+        """Изменилось ли лицо с последней классификации; возвращает и новый эскиз"""
+        gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+        thumbnail = cv2.resize(
+            gray, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA
+        ).astype(np.int16)
+        if (
+            track.thumbnail is None
+            or self.processed - track.classified_frame >= self.settings.ML_STREAM_MAX_CLASSIFY_INTERVAL
+        ):
+            return True, thumbnail
+        difference = np.abs(thumbnail - track.thumbnail).mean()
+        return difference > self.settings.ML_STREAM_CHANGE_THRESHOLD, thumbnail
+
+    def smooth(self, track, classification_results):
+        """Экспоненциальное сглаживание вероятностей каждой модели"""
+        alpha = self.settings.ML_STREAM_SMOOTHING
+        for classification in classification_results:
+            if 'all_probabilities' not in classification:
+                continue
+            probabilities = np.asarray(classification['all_probabilities'], dtype=np.float32)
+            previous = track.probabilities.get(classification['model'])
+            if previous is not None:
+                probabilities = alpha * probabilities + (1 - alpha) * previous
+            track.probabilities[classification['model']] = probabilities
+
+    def describe(self):
+        """Треки с хотя бы одной классификацией: классы и показатели по сглаженным вероятностям"""
+        tracks = [track for track in self.tracker.tracks if track.probabilities]
+        if not tracks:
+            return []
+        faces = [
+            [{'model': model_name, 'all_probabilities': probabilities}
+             for model_name, probabilities in track.probabilities.items()]
+            for track in tracks
+        ]
+        scores = score_batch(stack_probabilities(faces, self.class_names), self.class_names)
+        return [
+            {
+                'track_id': track.id,
+                'bbox': [round(coord, 1) for coord in track.bbox.tolist()],
+                'classes': {
+                    model_name: {
+                        'class_name': self.class_names[model_name][int(probabilities.argmax())],
+                        'confidence': float(probabilities.max()),
+                    }
+                    for model_name, probabilities in track.probabilities.items()
+                },
+                'diagram': {metric: int(round(float(scores[metric][i]))) for metric in METRICS},
+            }
+            for i, track in enumerate(tracks)
+        ]
+
+    async def process(self, sequence, timestamp, frame_bytes):
+        """
+        Анализ одного кадра, возвращает сообщение для клиента. Детекция и
+        классификация кадра идут на одном наборе моделей
+        """
+        with self.pipeline.model_set.use() as model_set:
+            return await self._process(model_set, sequence, timestamp, frame_bytes)
+
+    async def _process(self, model_set, sequence, timestamp, frame_bytes):
+        start = time.perf_counter()
+        frame = await asyncio.to_thread(decode_image, frame_bytes)
+
+        detect = (
+            not self.tracker.tracks
+            or self.frames_since_detection is None
+            or self.frames_since_detection + 1 >= self.settings.ML_STREAM_DETECT_EVERY
+        )
+        filtered = []
+        if detect:
+            try:
+                faces, filtered = await self.pipeline.run_models(
+                    model_set, 'yolo_detect_faces', frame, self.imgsz
+                )
+            except QualityRejection as e:
+                # Детекция повторится на следующем кадре
+                STREAM_FRAMES.inc(outcome='rejected')
+                return {'type': 'quality', 'frame': sequence, **e.to_dict()}
+            self.tracker.update([(face['bbox'], face['confidence']) for face in faces], timestamp)
+            self.frames_since_detection = 0
+        else:
+            self.tracker.predict(timestamp)
+            self.frames_since_detection += 1
+        self.processed += 1
+
+        changed, crops, confidences = [], [], []
+        for track in self.tracker.tracks:
+            crop = self.crop(frame, track.bbox)
+            if crop is None:
+                continue
+            needed, thumbnail = self.needs_classification(track, crop)
+            if needed:
+                changed.append((track, thumbnail))
+                crops.append(crop)
+                confidences.append(track.confidence)
+
+        if crops:
+            batch_results = await self.pipeline.process_faces_batch(crops, confidences, model_set)
+            for (track, thumbnail), classification_results in zip(changed, batch_results):
+                self.smooth(track, classification_results)
+                track.thumbnail, track.classified_frame = thumbnail, self.processed
+
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage='stream_frame')
+        STREAM_FRAMES.inc(outcome='detected' if detect else 'tracked')
+        return {
+            'type': 'frame',
+            'frame': sequence,
+            'detected': detect,
+            'classified': [track.id for track, _ in changed],
+            'dropped': self.dropped,
+            'filtered_faces': filtered,
+            'processing_ms': round(elapsed * 1000, 1),
+            'faces': self.describe(),
+        }
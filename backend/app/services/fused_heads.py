@@ -0,0 +1,137 @@
+import copy
+
+import torch
+import torch.nn as nn
+
+
+class GroupedLinear(nn.Module):
+    """
+    G независимых nn.Linear, выполняемых одним batched matmul.
+
+    Вход и выход имеют плоскую раскладку [N, G * features], как после
+    flatten сгруппированной свёртки. Если у голов разное число выходов,
+    веса дополняются нулями до максимума (срез делает вызывающий код).
+    """
+
+    def __init__(self, linears):
+        super().__init__()
+        self.groups = len(linears)
+        self.in_features = linears[0].in_features
+        self.out_features = max(linear.out_features for linear in linears)
+
+        weight = torch.zeros(self.groups, self.in_features, self.out_features)
+        bias = torch.zeros(self.groups, 1, self.out_features)
+        for g, linear in enumerate(linears):
+            weight[g, :, :linear.out_features] = linear.weight.detach().t()
+            if linear.bias is not None:
+                bias[g, 0, :linear.out_features] = linear.bias.detach()
+
+        self.weight = nn.Parameter(weight, requires_grad=False)
+        self.bias = nn.Parameter(bias, requires_grad=False)
+
+    def forward(self, x):
+        batch = x.shape[0]
+        x = x.view(batch, self.groups, self.in_features).transpose(0, 1)
+        out = torch.baddbmm(self.bias, x, self.weight)
+        return out.transpose(0, 1).reshape(batch, self.groups * self.out_features)
+
+
+def _fuse_conv(convs, shared_input):
+    """Склеивает свёртки G моделей в одну групповую свёртку"""
+    conv = convs[0]
+    groups = len(convs)
+
+    if shared_input:
+        # Первая свёртка читает общий RGB вход: веса просто стакаются по выходам
+        if conv.groups != 1:
+            raise ValueError("Общий вход поддерживается только для groups=1")
+        in_channels, conv_groups = conv.in_channels, 1
+    else:
+        in_channels, conv_groups = conv.in_channels * groups, conv.groups * groups
+
+    fused = nn.Conv2d(
+        in_channels,
+        conv.out_channels * groups,
+        kernel_size=conv.kernel_size,
+        stride=conv.stride,
+        padding=conv.padding,
+        dilation=conv.dilation,
+        groups=conv_groups,
+        bias=conv.bias is not None,
+        padding_mode=conv.padding_mode,
+    )
+    with torch.no_grad():
+        fused.weight.copy_(torch.cat([c.weight for c in convs], dim=0))
+        if conv.bias is not None:
+            fused.bias.copy_(torch.cat([c.bias for c in convs], dim=0))
+    return fused
+
+
+def _fuse_batchnorm(norms):
+    """Склеивает BatchNorm2d G моделей по каналам"""
+    norm = norms[0]
+    fused = nn.BatchNorm2d(
+        norm.num_features * len(norms),
+        eps=norm.eps,
+        momentum=norm.momentum,
+        affine=norm.affine,
+        track_running_stats=norm.track_running_stats,
+    )
+    with torch.no_grad():
+        if norm.affine:
+            fused.weight.copy_(torch.cat([n.weight for n in norms]))
+            fused.bias.copy_(torch.cat([n.bias for n in norms]))
+        if norm.track_running_stats:
+            fused.running_mean.copy_(torch.cat([n.running_mean for n in norms]))
+            fused.running_var.copy_(torch.cat([n.running_var for n in norms]))
+    return fused
+
+
+def _fuse_children(fused_parent, sources, state):
+    """Рекурсивно заменяет слои с весами на их сгруппированные версии"""
+    for name, child in list(fused_parent.named_children()):
+        source_children = [getattr(source, name) for source in sources]
+
+        if isinstance(child, nn.Conv2d):
+            fused = _fuse_conv(source_children, state['shared_input'])
+            state['shared_input'] = False
+        elif isinstance(child, nn.BatchNorm2d):
+            fused = _fuse_batchnorm(source_children)
+        elif isinstance(child, nn.Linear):
+            fused = GroupedLinear(source_children)
+        elif any(True for _ in child.children()):
+            _fuse_children(child, source_children, state)
+            continue
+        elif any(True for _ in child.parameters(recurse=False)):
+            raise TypeError(f"Слой {type(child).__name__} не поддерживает слияние")
+        else:
+            # Активации, пулинг, dropout работают поканально - оставляем как есть
+            continue
+
+        setattr(fused_parent, name, fused)
+
+
+class FusedMobileNetHeads(nn.Module):
+    """
+    Несколько классификаторов одной архитектуры, объединённые в одну сеть.
+
+    Каналы всех моделей лежат рядом, каждая свёртка становится групповой,
+    поэтому один forward на общем входе [N, 3, H, W] даёт логиты всех голов.
+    """
+
+    def __init__(self, models):
+        super().__init__()
+        self.head_names = list(models.keys())
+        sources = [models[name] for name in self.head_names]
+        self.num_classes = [source.classifier[-1].out_features for source in sources]
+
+        self.body = copy.deepcopy(sources[0])
+        _fuse_children(self.body, sources, {'shared_input': True})
+        self.eval()
+
+    def forward(self, x):
+        logits = self.body(x).view(x.shape[0], len(self.head_names), -1)
+        return [
+            logits[:, g, :num_classes]
+            for g, num_classes in enumerate(self.num_classes)
+        ]
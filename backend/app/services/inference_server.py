@@ -0,0 +1,116 @@
+"""
+Standalone inference server.
+
+Owns a single copy of the models and serves every API worker over a local
+socket or HTTP, so the web tier and the compute tier scale separately.
+Crops from all connected workers go through one micro-batching scheduler.
+
+Run:
+    python -m app.services.inference_server --uds /tmp/inference.sock
+    python -m app.services.inference_server --host 0.0.0.0 --port 8100
+
+and point the API workers at it with ML_INFERENCE_SERVER_URL
+(unix:///tmp/inference.sock or http://host:8100).
+"""
+
+import argparse
+import asyncio
+from contextlib import asynccontextmanager
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from app.core.metrics import REGISTRY
+from app.core.ml_config import ml_settings
+from app.services.ml_pipeline import ModelPipeline, serialize_output
+from app.services.model_registry import watch_models
+from app.services.quality import QualityRejection
+
+pipeline = ModelPipeline(
+    ml_settings.model_copy(
+        update={'ML_MICRO_BATCHING': True, 'ML_INFERENCE_SERVER_URL': ''}
+    )
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await pipeline.load_all_models()
+    print("🚀 Сервер инференса запущен")
+    # The server owns the weights, so it watches them; API workers only
+    # poll /health for the versions
+    watcher = None
+    if ml_settings.ML_MODEL_WATCH_INTERVAL > 0:
+        watcher = asyncio.create_task(
+            watch_models(pipeline, ml_settings.ML_MODEL_WATCH_INTERVAL)
+        )
+    yield
+    if watcher is not None:
+        watcher.cancel()
+    await pipeline.scheduler.stop()
+    pipeline.executor.shutdown()
+
+
+app = FastAPI(title="AI Vision inference server", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health_check():
+    """Models owned by this server and scheduler state."""
+    return {
+        "status": "healthy",
+        "loaded_models": pipeline.loaded_model_names(),
+        "model_versions": pipeline.get_model_versions(),
+        "reloading": pipeline.reloading,
+        "last_reload": pipeline.last_reload,
+        "micro_batching": pipeline.scheduler.stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage and model latencies in the Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/process")
+async def process_image(request: Request, imgsz: int | None = None):
+    """Run the full pipeline on raw image bytes from the request body."""
+    image_bytes = await request.body()
+    try:
+        output = await pipeline.process_image(image_bytes, imgsz=imgsz)
+    except QualityRejection as e:
+        raise HTTPException(status_code=422, detail=e.to_dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return serialize_output(output)
+
+
+@app.post("/reload")
+async def reload_models():
+    """Hot-reload the models from the registry; each in-flight request finishes on the set it started with."""
+    if pipeline.reloading:
+        raise HTTPException(status_code=409, detail="Reload already in progress")
+    try:
+        model_versions = await pipeline.reload_models()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed: {e}")
+    return {"model_versions": model_versions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Standalone inference server")
+    parser.add_argument("--uds", help="Unix domain socket path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+
+    if args.uds:
+        uvicorn.run(app, uds=args.uds)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
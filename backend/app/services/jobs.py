@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+
+from fastapi import HTTPException
+
+from app.core.ml_config import ml_settings
+from app.websocket import connection_manager
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisJob:
+    """State of one background analysis, as seen by pollers and WebSocket clients."""
+
+    def __init__(self, handler, owner_id: int | None = None):
+        self.id = uuid.uuid4().hex
+        self.owner_id = owner_id
+        self.handler = handler
+        self.status = "queued"
+        self.stage = "queued"
+        self.data: dict = {}
+        self.result: dict | None = None
+        self.error: str | dict | None = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "data": self.data,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobManager:
+    """
+    Bounded pool of background workers for analysis jobs.
+
+    `submit` enqueues a handler coroutine and returns immediately; a fixed
+    number of workers drain the queue so a burst of uploads cannot start
+    more pipeline runs than the pool allows. Every stage change is stored
+    on the job for polling and pushed to the owner's `/ws` connection.
+    Finished jobs are kept for `ttl` seconds.
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 64, ttl: float = 3600.0):
+        self.workers = max(1, workers)
+        self.ttl = ttl
+        self._queue: asyncio.Queue | None = None
+        self._queue_size = queue_size
+        self._tasks: list[asyncio.Task] = []
+        self._jobs: OrderedDict[str, AnalysisJob] = OrderedDict()
+        self.running = 0
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} analysis job workers.")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def submit(self, handler, owner_id: int | None = None) -> AnalysisJob:
+        """
+        Queue `handler(job)`; its return value becomes the job result.
+
+        Raises asyncio.QueueFull when the backlog is at capacity.
+        """
+        self.start()
+        self._purge()
+        job = AnalysisJob(handler, owner_id)
+        self._queue.put_nowait(job)
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> AnalysisJob | None:
+        self._purge()
+        return self._jobs.get(job_id)
+
+    async def report(self, job: AnalysisJob, stage: str, data: dict | None = None) -> None:
+        """Record a stage change and push it to the job owner, if connected."""
+        job.stage = stage
+        job.data = data or {}
+        job.updated_at = time.time()
+        if job.owner_id is None:
+            return
+        message = {
+            "type": "analysis_job",
+            "job_id": job.id,
+            "status": job.status,
+            "stage": stage,
+            "data": job.data,
+        }
+        if job.finished:
+            message["result"] = job.result
+            message["error"] = job.error
+        await connection_manager.send_personal_message(message, job.owner_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self.running += 1
+            job.status = "running"
+            try:
+                result = await job.handler(job)
+            except asyncio.CancelledError:
+                raise
+            except HTTPException as e:
+                # Quality rejections carry a structured detail
+                job.status, job.error = "failed", e.detail
+            except Exception as e:
+                logger.error(f"Analysis job {job.id} failed: {e}")
+                job.status, job.error = "failed", "Analysis failed"
+            else:
+                job.status, job.result = "completed", result
+            finally:
+                self.running -= 1
+                self._queue.task_done()
+            # The handler is no longer needed and holds the uploaded image
+            job.handler = None
+            stage = "recommendations_ready" if job.status == "completed" else "failed"
+            await self.report(job, stage)
+
+    def _purge(self) -> None:
+        deadline = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and job.updated_at < deadline
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": self.running,
+            "tracked": len(self._jobs),
+        }
+
+
+job_manager = JobManager(
+    workers=ml_settings.ANALYSIS_JOB_WORKERS,
+    queue_size=ml_settings.ANALYSIS_JOB_QUEUE_SIZE,
+    ttl=ml_settings.ANALYSIS_JOB_TTL,
+)
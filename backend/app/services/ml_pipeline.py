@@ -1,10 +1,20 @@
 import asyncio
+import hashlib
+import multiprocessing
+import os
+import threading
 import time
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+import io
 import re
 import json
 
 import cv2
+import httpx
+import numpy as np
 import torch
 import torch.nn as nn
 import torchvision.transforms as transforms
@@ -12,47 +22,411 @@ from PIL import Image
 from ultralytics import YOLO
 from torchvision.models import mobilenet_v3_small
 
+from app.core.metrics import (
+    FACES_PER_IMAGE,
+    MODEL_ERRORS,
+    MODEL_SECONDS,
+    QUALITY_REJECTIONS,
+    REGISTRY,
+    STAGE_SECONDS,
+)
+from app.core.ml_config import MLSettings, ml_settings
+from app.services.cascade import DEFAULT_RULES, CascadePolicy, skipped_result
+from app.services.fused_heads import FusedMobileNetHeads
+from app.services.model_registry import ModelRegistry
+from app.services.onnx_backend import OnnxClassifier
+from app.services.precision import apply_precision, load_calibration_batches
+from app.services.preprocessing import CropPreprocessor
+from app.services.quality import QualityRejection, check_face_sizes, check_image
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+
+# Флаги OpenCV для декода JPEG сразу в уменьшенном масштабе (через DCT scaling libjpeg)
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Отступ вокруг найденного лица в пикселях исходного изображения
+FACE_MARGIN = 20
+
+
+def decode_image(image, scale=1):
+    """
+    Приводит изображение к BGR массиву numpy, декодируя его ровно один раз.
+    Принимает путь, байты файла (JPEG/PNG/...) или уже готовый BGR массив.
+    scale - во сколько раз уменьшить при декоде (1, 2, 4 или 8)
+    """
+    if isinstance(image, np.ndarray):
+        return image
+    flags = REDUCED_DECODE_FLAGS[scale]
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        decoded = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), flags)
+    else:
+        decoded = cv2.imread(str(image), flags)
+    if decoded is None:
+        raise ValueError("Не удалось декодировать изображение")
+    return decoded
+
+
+def jpeg_long_side(image):
+    """
+    Длинная сторона JPEG по заголовку, без декода пикселей.
+    None, если это не JPEG (уменьшенный декод выгоден только для JPEG)
+    """
+    if isinstance(image, np.ndarray):
+        return None
+    source = io.BytesIO(image) if isinstance(image, (bytes, bytearray, memoryview)) else image
+    try:
+        with Image.open(source) as header:
+            if header.format != 'JPEG':
+                return None
+            return max(header.size)
+    except (OSError, ValueError):
+        return None
+
+
+def reduced_scale(size, target):
+    """Наибольший масштаб декода, при котором size / scale не меньше target"""
+    for scale in (8, 4, 2):
+        if size / scale >= target:
+            return scale
+    return 1
+
+
+def file_version(path, *tags, version=None, expected_sha256=None):
+    """
+    Версия весов: версия из реестра, префикс sha256 файла и параметры исполнения.
+    Если в реестре указана контрольная сумма, файл с другой суммой не загружается
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    checksum = digest.hexdigest()
+    if expected_sha256 and checksum != expected_sha256.lower():
+        raise ValueError(f"Контрольная сумма {path} не совпадает с реестром моделей")
+    return '-'.join([part for part in (version, checksum[:12], *tags) if part])
+
+
+def describe_image(image):
+    """Короткое описание источника изображения для логов"""
+    if isinstance(image, (str, Path)):
+        return Path(image).name
+    if isinstance(image, np.ndarray):
+        return f"массив {image.shape[1]}x{image.shape[0]}"
+    return f"{len(image)} байт в памяти"
+
+# Пайплайн внутри процесса-воркера (ML_EXECUTOR=process)
+_worker_pipeline = None
+
+
+def _init_worker(settings_data):
+    """Инициализация процесса-воркера: собственный пайплайн с моделями"""
+    global _worker_pipeline
+    settings = MLSettings(**settings_data).model_copy(
+        update={'ML_EXECUTOR': 'inline', 'ML_MICRO_BATCHING': False}
+    )
+    if settings.ML_TORCH_THREADS > 0:
+        torch.set_num_threads(settings.ML_TORCH_THREADS)
+    _worker_pipeline = ModelPipeline(settings)
+    asyncio.run(_worker_pipeline.load_all_models())
+
+
+def _call_worker(method_name, *args):
+    """Результат вызова и метрики, накопленные в воркере с прошлого вызова"""
+    return getattr(_worker_pipeline, method_name)(*args), REGISTRY.drain()
+
+
+def _merge_worker_metrics(reply):
+    result, snapshot = reply
+    REGISTRY.merge(snapshot)
+    return result
+
+
+class InferenceExecutor:
+    """
+    Выполняет блокирующий инференс вне event loop.
+
+    thread - пул потоков над моделями текущего процесса, размер пула
+    подбирается под число intra-op потоков torch; process - пул процессов,
+    каждый со своей копией моделей; inline - прямо в event loop.
+    Число одновременных инференсов ограничено семафором.
+    """
+
+    def __init__(self, pipeline, kind='thread', workers=0, max_concurrency=0, torch_threads=0):
+        self.pipeline = pipeline
+        self.kind = kind
+        if torch_threads > 0 and kind != 'process':
+            torch.set_num_threads(torch_threads)
+        self.workers = workers or max(1, (os.cpu_count() or 1) // (torch_threads or torch.get_num_threads()))
+        self.max_concurrency = max_concurrency or self.workers
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._pool = None
+
+    def _ensure_pool(self):
+        if self._pool is None:
+            if self.kind == 'process':
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.pipeline.settings.model_dump(),),
+                )
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix='inference',
+                )
+        return self._pool
+
+    async def run(self, method_name, *args):
+        """Вызывает синхронный метод пайплайна в пуле"""
+        if self.kind == 'inline':
+            return getattr(self.pipeline, method_name)(*args)
+
+        pool = self._ensure_pool()
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            if self.kind == 'process':
+                return _merge_worker_metrics(
+                    await loop.run_in_executor(pool, _call_worker, method_name, *args)
+                )
+            return await loop.run_in_executor(pool, getattr(self.pipeline, method_name), *args)
+
+    async def start_workers(self):
+        """Запускает процессы-воркеры и ждёт загрузки в них моделей"""
+        pool = self._ensure_pool()
+        loop = asyncio.get_running_loop()
+        replies = await asyncio.gather(*[
+            loop.run_in_executor(pool, _call_worker, 'get_model_versions')
+            for _ in range(self.workers)
+        ])
+        return [_merge_worker_metrics(reply) for reply in replies][0]
+
+    def shutdown(self, drain=False):
+        """drain=True дожидается уже отправленных задач вместо их отмены"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=drain, cancel_futures=not drain)
+            self._pool = None
+
+
+class ModelSet:
+    """
+    Одно поколение моделей: объекты моделей, их версии и объединённый
+    классификатор. Перезагрузка не меняет набор, а подменяет его целиком,
+    поэтому запрос, взявший набор в начале, от детекции до классификации
+    считается на одних и тех же весах.
+
+    executor - где исполняются модели набора. В режиме process веса живут
+    в его процессах-воркерах, а здесь только имена классов и версии; такой
+    пул закрывается, когда набор отпустят все запросы.
+    """
+
+    def __init__(self, executor, models=None, model_versions=None, fused_heads=None):
+        self.executor = executor
+        self.models = models if models is not None else {}
+        self.model_versions = model_versions if model_versions is not None else {}
+        self.fused_heads = fused_heads
+        self.users = 0
+        self._idle = None
+
+    def version_key(self):
+        """Общая версия набора моделей: меняется при замене любых весов"""
+        payload = json.dumps(self.model_versions, sort_keys=True).encode()
+        return hashlib.sha256(payload).hexdigest()[:16]
+
+    @contextmanager
+    def use(self):
+        """Набор занят запросом до выхода из блока"""
+        self.users += 1
+        try:
+            yield self
+        finally:
+            self.users -= 1
+            if not self.users and self._idle is not None:
+                self._idle.set()
+
+    async def wait_idle(self):
+        """Ждёт, пока набор отпустят все запросы"""
+        while self.users:
+            self._idle = asyncio.Event()
+            await self._idle.wait()
+
+
+class MicroBatchScheduler:
+    """
+    Собирает лица из параллельных запросов в общие батчи классификаторов.
+
+    Батч отправляется, когда набралось max_batch_size лиц или прошло
+    max_wait_ms с момента прихода первого лица. Каждый запрос получает
+    через свой future только результаты своих лиц. Лица запросов,
+    начатых на разных наборах моделей (до и после перезагрузки), в один
+    батч не попадают.
+    """
+
+    def __init__(self, pipeline, max_batch_size=8, max_wait_ms=5.0):
+        self.pipeline = pipeline
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batch_size_histogram = Counter()
+        self.max_queue_depth = 0
+        self._queue = None
+        self._task = None
+        self._dispatches = set()
+
+    def start(self):
+        """Запуск фонового цикла в текущем event loop"""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановка фонового цикла"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, input_tensor, faces=None, model_set=None):
+        """
+        Ставит лица [N, 3, 224, 224] в очередь и ждёт их результаты.
+        faces - описания лиц для каскада, по одному на лицо;
+        model_set - набор моделей запроса, по умолчанию текущий
+        """
+        self.start()
+        model_set = model_set or self.pipeline.model_set
+        loop = asyncio.get_running_loop()
+        futures = []
+        for face_tensor, face in zip(input_tensor.split(1), faces or [None] * len(input_tensor)):
+            future = loop.create_future()
+            self._queue.put_nowait((face_tensor, face, model_set, future))
+            futures.append(future)
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return list(await asyncio.gather(*futures))
+
+    async def _collect_batch(self):
+        """Ждёт первое лицо, затем добирает батч до размера или дедлайна"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            groups = {}
+            for entry in batch:
+                groups.setdefault(id(entry[2]), []).append(entry)
+
+            for group in groups.values():
+                self.batch_size_histogram[len(group)] += 1
+                # Пока батч считается в executor, продолжаем собирать следующий
+                task = asyncio.create_task(self._dispatch(group))
+                self._dispatches.add(task)
+                task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch):
+        try:
+            input_tensor = torch.cat([face_tensor for face_tensor, _, _, _ in batch])
+            faces = [face for _, face, _, _ in batch]
+            if any(face is None for face in faces):
+                faces = None
+            batch_results = await self.pipeline.run_models(
+                batch[0][2], 'classify_batch', input_tensor, faces
+            )
+        except Exception as e:
+            print(f"❌ Ошибка микробатча: {e}")
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, _, future), face_results in zip(batch, batch_results):
+            if not future.done():
+                future.set_result(face_results)
+
+    def stats(self):
+        """Глубина очереди и гистограмма размеров батчей для настройки"""
+        batches = sum(self.batch_size_histogram.values())
+        faces = sum(size * count for size, count in self.batch_size_histogram.items())
+        return {
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'batches': batches,
+            'avg_batch_size': faces / batches if batches else 0.0,
+            'batch_size_histogram': dict(sorted(self.batch_size_histogram.items())),
+        }
+
+
 class ModelPipeline:
-    def __init__(self):
-        self.models = {}
+    # Порядок обработки лица классификаторами
+    classifier_names = [
+        'mobilenet_skin',
+        'mobilenet_age',
+        'mobilenet_eyes_darkcircles',
+        'mobilenet_eyes_pupils',
+        'mobilenet_general'
+    ]
+
+    def __init__(self, settings: MLSettings | None = None):
+        self.settings = (settings or ml_settings).check_fused_heads_and_cascade()
+        self._calibration_batches = None
+        self._calibration_lock = threading.Lock()
+        self.yolo_lock = threading.Lock()
+        # Модели загружены и прогреты, можно принимать запросы
+        self.ready = False
+        self.load_seconds = None
+        self._reload_lock = asyncio.Lock()
+        self.last_reload = None
+        # Текущее поколение моделей, при перезагрузке подменяется целиком
+        self.model_set = ModelSet(InferenceExecutor(
+            self,
+            kind=self.settings.ML_EXECUTOR,
+            workers=self.settings.ML_EXECUTOR_WORKERS,
+            max_concurrency=self.settings.ML_MAX_CONCURRENT_INFERENCES,
+            torch_threads=self.settings.ML_TORCH_THREADS,
+        ))
+        self.scheduler = None
+        if self.settings.ML_MICRO_BATCHING:
+            self.scheduler = MicroBatchScheduler(
+                self,
+                max_batch_size=self.settings.ML_MICRO_BATCH_SIZE,
+                max_wait_ms=self.settings.ML_MICRO_BATCH_WAIT_MS,
+            )
         self.device = torch.device('cpu')
-        print(f"Using device: {self.device}")
+        self.onnx_dir = Path(self.settings.ML_ONNX_DIR or BASE_DIR / 'onnx')
+        print(f"Using device: {self.device}, backend: {self.settings.ML_BACKEND}")
         
-        # Конфигурация моделей
-        self.model_configs = {
-            'yolo': {
-                'path': str(BASE_DIR / 'model.pt'),
-                'type': 'yolo'
-            },
-            'mobilenet_skin': {
-                'path': str(BASE_DIR / 'skin_m.pth'),
-                'num_classes': 2,
-                'class_names': ['acne', 'healthy']
-            },
-            'mobilenet_age': {
-                'path': str(BASE_DIR / 'mobilenet_age.pth'), 
-                'num_classes': 6,
-                'class_names': ['adult', 'baby', 'child', 'middle', 'pensioner', 'teenage']
-            },
-            'mobilenet_eyes_darkcircles': {
-                'path': str(BASE_DIR / 'mobilenet_darkcircles.pth'),
-                'num_classes': 3, 
-                'class_names': ['darkcircles', 'healthy', 'light_darkcircles']
-            },
-            'mobilenet_eyes_pupils': {
-                'path': str(BASE_DIR / 'mobilenet_eyes_pupils.pth'),
-                'num_classes': 3,
-                'class_names': ['conjunctivitis', 'healthy', 'yellowness']
-            },
-            'mobilenet_general': {
-                'path': str(BASE_DIR / 'general2.pth'),
-                'num_classes': 2,
-                'class_names': ['edema', 'healthy'] 
-            }
-        }
+        # Конфигурация моделей: пути, версии и параметры исполнения из реестра
+        self.registry = ModelRegistry(self.settings.ML_MODEL_REGISTRY)
+        self.model_configs = self.registry.model_configs()
         
+        # Эталонная PIL-предобработка обучения; в инференсе не используется,
+        # по ней сверяется CropPreprocessor (app.tools.preprocess_parity)
         self.transform = transforms.Compose([
             transforms.Resize(256),
             transforms.CenterCrop(224),
@@ -60,23 +434,120 @@ class ModelPipeline:
             transforms.Normalize(mean=[0.485, 0.456, 0.406], 
                                std=[0.229, 0.224, 0.225])
         ])
+        # Векторизованный эквивалент self.transform без PIL
+        self.preprocessor = CropPreprocessor()
+
+        self.cascade = None
+        if self.settings.ML_CASCADE:
+            # ONNX-графы экспортированы с фиксированным входом 224
+            self.cascade = CascadePolicy(
+                self.settings.ML_CASCADE_RULES or DEFAULT_RULES,
+                self.classifier_names,
+                input_size=self.preprocessor.crop_size,
+                reduced_size=self.settings.ML_CASCADE_REDUCED_SIZE,
+                allow_downgrade=self.settings.ML_BACKEND == 'torch',
+            )
+
+    @property
+    def models(self):
+        return self.model_set.models
+
+    @property
+    def model_versions(self):
+        return self.model_set.model_versions
+
+    @property
+    def fused_heads(self):
+        return self.model_set.fused_heads
+
+    @property
+    def executor(self):
+        return self.model_set.executor
+
+    async def run_models(self, model_set, method_name, *args):
+        """
+        Вызывает синхронный метод пайплайна на моделях набора. В режиме
+        process набор - это сами процессы-воркеры его executor, в остальных
+        набор передаётся методу последним аргументом
+        """
+        if model_set.executor.kind == 'process':
+            return await model_set.executor.run(method_name, *args)
+        return await model_set.executor.run(method_name, *args, model_set)
+
+    def calibration_batches(self):
+        """Калибровочные батчи для int8, загружаются один раз"""
+        # Модели грузятся параллельно в потоках, батчи нужны нескольким сразу
+        with self._calibration_lock:
+            if self._calibration_batches is None:
+                self._calibration_batches = load_calibration_batches(
+                    self,
+                    self.settings.ML_CALIBRATION_DIR,
+                    limit=self.settings.ML_CALIBRATION_IMAGES,
+                )
+        return self._calibration_batches
+
+    def onnx_path(self, model_name):
+        """Путь к ONNX-графу модели, созданному app.tools.onnx_export"""
+        return str(self.onnx_dir / f'{model_name}.onnx')
 
     async def load_yolo_model(self):
-        """Асинхронная загрузка YOLO модели"""
+        """Асинхронная загрузка и прогрев YOLO модели в отдельном потоке"""
+        await asyncio.to_thread(self._load_yolo_model)
+        await asyncio.to_thread(self.warm_up_model, 'yolo')
+
+    def _load_yolo_model(self):
         print("🔄 Загрузка YOLO модели...")
         try:
-            self.models['yolo'] = YOLO(self.model_configs['yolo']['path'])
+            config = self.model_configs['yolo']
+            if self.settings.ML_BACKEND == 'onnx':
+                path = self.onnx_path('yolo')
+                version = file_version(path, 'onnx', version=config.get('version'))
+                self.models['yolo'] = YOLO(path, task='detect')
+            else:
+                path = config['path']
+                version = file_version(
+                    path, 'torch',
+                    version=config.get('version'),
+                    expected_sha256=config.get('sha256'),
+                )
+                self.models['yolo'] = YOLO(path)
+            self.model_versions['yolo'] = version
             print("✅ YOLO модель загружена")
         except Exception as e:
             print(f"❌ Ошибка загрузки YOLO: {e}")
             raise
 
     async def load_mobilenet_model(self, model_name):
-        """Асинхронная загрузка MobileNet модели"""
+        """Асинхронная загрузка и прогрев MobileNet модели в отдельном потоке"""
+        await asyncio.to_thread(self._load_mobilenet_model, model_name)
+        await asyncio.to_thread(self.warm_up_model, model_name)
+
+    def _load_mobilenet_model(self, model_name):
         print(f"🔄 Загрузка {model_name}...")
         try:
             config = self.model_configs[model_name]
+
+            if self.settings.ML_BACKEND == 'onnx':
+                self.models[model_name] = {
+                    'model': OnnxClassifier(
+                        self.onnx_path(model_name),
+                        num_threads=config['threads'] or self.settings.ML_TORCH_THREADS,
+                    ),
+                    'class_names': config['class_names']
+                }
+                self.model_versions[model_name] = file_version(
+                    self.onnx_path(model_name), 'onnx', version=config.get('version')
+                )
+                print(f"✅ {model_name} загружена (ONNX)")
+                return
             
+            precision = self.model_precision(model_name)
+            version = file_version(
+                config['path'], 'torch', precision,
+                version=config.get('version'),
+                expected_sha256=config.get('sha256'),
+            )
+
             model = mobilenet_v3_small(weights=None)
             model.classifier[3] = nn.Linear(
                 model.classifier[3].in_features, 
@@ -92,11 +563,16 @@ class ModelPipeline:
             
             model.to(self.device)
             model.eval()
+
+            if precision != 'fp32':
+                model = apply_precision(model, precision, self.calibration_batches())
+                print(f"   ⚙️ {model_name}: точность {precision}")
             
             self.models[model_name] = {
                 'model': model,
                 'class_names': config['class_names']
             }
+            self.model_versions[model_name] = version
             print(f"✅ {model_name} загружена")
             
         except Exception as e:
@@ -107,144 +583,489 @@ class ModelPipeline:
         """Асинхронная загрузка всех моделей"""
         print("🚀 Начало загрузки всех моделей...")
         start_time = time.time()
+
+        if self.executor.kind == 'process':
+            # Веса живут в процессах-воркерах, здесь остаются только метаданные
+            model_versions = await self.executor.start_workers()
+            self.model_set = ModelSet(
+                self.executor, self.model_metadata(model_versions), model_versions
+            )
+            self.load_seconds = time.time() - start_time
+            self.ready = True
+            print(f"🎉 Модели загружены в {self.executor.workers} процессах за {self.load_seconds:.2f} секунд")
+            return True
         
         # Создаем задачи для параллельной загрузки
         tasks = []
         tasks.append(self.load_yolo_model())
         
-        mobilenet_models = [
-            'mobilenet_skin', 'mobilenet_age', 'mobilenet_eyes_darkcircles',
-            'mobilenet_eyes_pupils', 'mobilenet_general'
-        ]
-        
-        for model_name in mobilenet_models:
+        for model_name in self.classifier_names:
             tasks.append(self.load_mobilenet_model(model_name))
         
-        # Запускаем все задачи параллельно
+        # torch.load, сборка YOLO и прогрев идут в потоках и отпускают GIL,
+        # поэтому модели действительно грузятся одновременно
         await asyncio.gather(*tasks)
+
+        if self.settings.ML_FUSED_HEADS:
+            all_fp32 = all(
+                self.model_precision(model_name) == 'fp32'
+                for model_name in self.classifier_names
+            )
+            if self.settings.ML_BACKEND == 'torch' and all_fp32:
+                await asyncio.to_thread(self.build_fused_heads)
+                await asyncio.to_thread(self.warm_up_model, 'fused_heads')
+            else:
+                print("⚠️ Объединённый классификатор доступен только для torch бэкенда в fp32")
         
-        loading_time = time.time() - start_time
-        print(f"🎉 Все модели загружены за {loading_time:.2f} секунд")
+        self.load_seconds = time.time() - start_time
+        self.ready = True
+        print(f"🎉 Все модели загружены за {self.load_seconds:.2f} секунд")
         return True
+
+    def warm_up_model(self, model_name):
+        """
+        Один холостой прогон модели, чтобы первый запрос пользователя не платил
+        за ленивую инициализацию (выделение памяти, выбор ядер, fuse в YOLO)
+        """
+        start_time = time.time()
+        with torch.no_grad():
+            if model_name == 'yolo':
+                with self.yolo_lock:
+                    self.models['yolo'].predict(
+                        source=np.zeros((640, 640, 3), dtype=np.uint8),
+                        conf=0.7,
+                        imgsz=self.settings.ML_DETECTION_SIZE,
+                        save=False,
+                        verbose=False
+                    )
+            else:
+                size = self.preprocessor.crop_size
+                dummy = torch.zeros(1, 3, size, size, device=self.device)
+                if model_name == 'fused_heads':
+                    self.fused_heads(dummy)
+                else:
+                    self.models[model_name]['model'](dummy)
+        print(f"   🔥 {model_name} прогрета за {time.time() - start_time:.2f} секунд")
+
+    def model_precision(self, model_name):
+        """Точность модели: из реестра, иначе из ML_PRECISION"""
+        return (
+            self.model_configs[model_name].get('precision')
+            or self.settings.ML_PRECISION.get(model_name, 'fp32')
+        )
+
+    @property
+    def reloading(self):
+        return self._reload_lock.locked()
+
+    async def reload_models(self):
+        """
+        Горячая замена моделей по текущему реестру без остановки сервиса.
+
+        Новые веса загружаются и прогреваются рядом со старыми, затем
+        подменяется весь ModelSet. Запрос в полёте держит набор, взятый в
+        начале, и дорабатывает на старых весах целиком, новые запросы идут
+        в новые модели. При ошибке загрузки остаются старые.
+        """
+        async with self._reload_lock:
+            start_time = time.time()
+            print("🔁 Перезагрузка моделей...")
+            try:
+                if self.executor.kind == 'process':
+                    await self._reload_workers()
+                else:
+                    staging = ModelPipeline(self.settings.model_copy(
+                        update={'ML_EXECUTOR': 'inline', 'ML_MICRO_BATCHING': False}
+                    ))
+                    await staging.load_all_models()
+                    self.registry, self.model_configs = staging.registry, staging.model_configs
+                    self.model_set = ModelSet(
+                        self.executor, staging.models,
+                        staging.model_versions, staging.fused_heads,
+                    )
+            except Exception as e:
+                self.last_reload = {'finished_at': time.time(), 'error': str(e)}
+                print(f"❌ Ошибка перезагрузки, остаются прежние модели: {e}")
+                raise
+
+            self.last_reload = {'finished_at': time.time(), 'error': None}
+            print(f"🎉 Модели перезагружены за {time.time() - start_time:.2f} секунд")
+            return self.get_model_versions()
+
+    async def _reload_workers(self):
+        """Поднимает новый пул процессов с новыми весами и гасит старый"""
+        executor = InferenceExecutor(
+            self,
+            kind='process',
+            workers=self.settings.ML_EXECUTOR_WORKERS,
+            max_concurrency=self.settings.ML_MAX_CONCURRENT_INFERENCES,
+            torch_threads=self.settings.ML_TORCH_THREADS,
+        )
+        try:
+            model_versions = await executor.start_workers()
+        except Exception:
+            executor.shutdown()
+            raise
+
+        registry = ModelRegistry(self.settings.ML_MODEL_REGISTRY)
+        old_set = self.model_set
+        self.registry, self.model_configs = registry, registry.model_configs()
+        self.model_set = ModelSet(executor, self.model_metadata(model_versions), model_versions)
+        # Старый пул дорабатывает запросы, взявшие его набор, и закрывается
+        await old_set.wait_idle()
+        await asyncio.to_thread(old_set.executor.shutdown, True)
+
+    def model_metadata(self, model_versions):
+        """Описания моделей без весов, когда сами модели в другом процессе"""
+        return {
+            model_name: {'class_names': self.model_configs[model_name].get('class_names')}
+            for model_name in model_versions
+        }
+
+    def loaded_model_names(self):
+        return list(self.models.keys())
+
+    def get_model_versions(self):
+        return dict(self.model_versions)
+
+    def model_version_key(self):
+        """Версия текущего набора моделей"""
+        return self.model_set.version_key()
+
+    def build_fused_heads(self):
+        """Объединяет загруженные MobileNet модели в одну групповую сеть"""
+        print("🔄 Сборка объединённого классификатора...")
+        self.model_set.fused_heads = FusedMobileNetHeads({
+            model_name: self.models[model_name]['model']
+            for model_name in self.classifier_names
+        }).to(self.device)
+        print(f"✅ Объединённый классификатор: {len(self.classifier_names)} голов")
     
-    def yolo_detect_faces(self, image_path):
-        """Детекция лиц с помощью YOLO"""
+    def yolo_detect_faces(self, image, imgsz=None, model_set=None):
+        """
+        Детекция лиц с помощью YOLO (путь, байты или BGR массив).
+        model_set - набор моделей запроса, по умолчанию текущий.
+        Возвращает (лица, отсеянные лица): отсеянные - найденные, но слишком
+        мелкие для проверки качества, с bbox, уверенностью и причиной.
+
+        Большие JPEG для детекции декодируются сразу уменьшенными в 2/4/8 раз,
+        YOLO всё равно сожмёт их до imgsz. Лица затем вырезаются из декода
+        с таким масштабом, чтобы короткая сторона кропа не была меньше
+        стороны ресайза классификатора. bbox всегда в координатах оригинала.
+        """
         print("🔍 YOLO: детекция лиц...")
-        results = self.models['yolo'].predict(
-            source=image_path,
-            conf=0.7,
-            imgsz=640,
-            save=False
-        )
-        
-        faces = []
-        image = cv2.imread(image_path)
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        for i, result in enumerate(results):
-            for j, box in enumerate(result.boxes):
+        imgsz = imgsz or self.settings.ML_DETECTION_SIZE
+        model_set = model_set or self.model_set
+
+        long_side = jpeg_long_side(image) if self.settings.ML_FAST_DECODE else None
+        detect_scale = reduced_scale(long_side, imgsz) if long_side else 1
+        # При detect_scale == 1 один декод используется и для детекции, и для вырезания лиц
+        with STAGE_SECONDS.time(stage='decode'):
+            detect_image = decode_image(image, detect_scale)
+
+        if self.settings.ML_QUALITY_GATE:
+            # Непригодные фото отсекаются до YOLO, классификаторов и LLM
+            with STAGE_SECONDS.time(stage='quality_gate'):
+                try:
+                    check_image(detect_image, self.settings, detect_scale)
+                except QualityRejection as e:
+                    QUALITY_REJECTIONS.inc(reason=e.reason)
+                    raise
+
+        # Предиктор ultralytics хранит состояние и не потокобезопасен
+        with self.yolo_lock, STAGE_SECONDS.time(stage='yolo'):
+            results = model_set.models['yolo'].predict(
+                source=detect_image,
+                conf=0.7,
+                imgsz=imgsz,
+                save=False
+            )
+
+        # Рамки лиц в координатах оригинала (с точностью до масштаба декода)
+        boxes = []
+        for result in results:
+            for box in result.boxes:
                 if int(box.cls[0].item()) == 0:  # класс 'face'
-                    x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                    confidence = box.conf[0].item()
-                    
-                    # Вырезаем лицо с запасом
-                    margin = 20
-                    h, w = image_rgb.shape[:2]
-                    x1 = max(0, x1 - margin)
-                    y1 = max(0, y1 - margin)
-                    x2 = min(w, x2 + margin)
-                    y2 = min(h, y2 + margin)
-                    
-                    face_crop = image_rgb[y1:y2, x1:x2]
-                    
-                    if face_crop.size > 0:
-                        faces.append({
-                            'crop': face_crop,
-                            'bbox': (x1, y1, x2, y2),
-                            'confidence': confidence
-                        })
-                        print(f"   ✅ Обнаружено лицо {len(faces)} (уверенность: {confidence:.3f})")
-        
-        return faces
+                    x1, y1, x2, y2 = (coord * detect_scale for coord in box.xyxy[0].tolist())
+                    boxes.append(((x1, y1, x2, y2), box.conf[0].item()))
 
-    async def process_with_mobilenet(self, model_name, face_crop):
-        """Обработка вырезанного лица MobileNet моделью"""
-        try:
-            model_data = self.models[model_name]
-            model = model_data['model']
-            class_names = model_data['class_names']
-            
-            # Преобразуем в PIL Image и применяем трансформы
-            pil_image = Image.fromarray(face_crop)
-            input_tensor = self.transform(pil_image).unsqueeze(0).to(self.device)
-            
-            with torch.no_grad():
-                outputs = model(input_tensor)
-                probabilities = torch.nn.functional.softmax(outputs, dim=1)
-                confidence, predicted_class = torch.max(probabilities, 1)
-            
-            result = {
-                'model': model_name,
-                'predicted_class': predicted_class.item(),
-                'class_name': class_names[predicted_class.item()],
-                'confidence': confidence.item(),
-                'all_probabilities': probabilities.cpu().numpy()[0]
-            }
-            
-            return result
-            
-        except Exception as e:
-            print(f"❌ Ошибка в {model_name}: {e}")
-            return {
-                'model': model_name,
-                'error': str(e)
-            }
+        filtered = []
+        if self.settings.ML_QUALITY_GATE:
+            try:
+                boxes, small = check_face_sizes(boxes, self.settings)
+            except QualityRejection as e:
+                QUALITY_REJECTIONS.inc(reason=e.reason)
+                raise
+            filtered = [
+                {
+                    'bbox': tuple(int(v) for v in bbox),
+                    'detection_confidence': confidence,
+                    'reason': 'face_too_small',
+                }
+                for bbox, confidence in small
+            ]
 
-    async def process_face_pipeline(self, face_crop):
-        """Обработка одного лица через весь пайплайн MobileNet моделей"""
-        print("🔄 Запуск пайплайна классификации...")
-        
-        # Определяем порядок обработки
-        pipeline_order = [
-            'mobilenet_skin',
-            'mobilenet_age', 
-            'mobilenet_eyes_darkcircles',
-            'mobilenet_eyes_pupils',
-            'mobilenet_general'
+        if not boxes:
+            return [], filtered
+
+        # Масштаб для кропов выбирается по самому маленькому лицу
+        crop_scale = 1
+        if detect_scale > 1:
+            min_side = min(
+                min(x2 - x1, y2 - y1) + 2 * FACE_MARGIN
+                for (x1, y1, x2, y2), _ in boxes
+            )
+            crop_scale = min(detect_scale, reduced_scale(min_side, self.preprocessor.resize_size))
+        if crop_scale == detect_scale:
+            crop_image = detect_image
+        else:
+            with STAGE_SECONDS.time(stage='decode'):
+                crop_image = decode_image(image, crop_scale)
+
+        faces = []
+        h, w = crop_image.shape[:2]
+        margin = FACE_MARGIN / crop_scale
+
+        for (x1, y1, x2, y2), confidence in boxes:
+            # Вырезаем лицо с запасом
+            x1 = max(0, int(x1 / crop_scale - margin))
+            y1 = max(0, int(y1 / crop_scale - margin))
+            x2 = min(w, int(x2 / crop_scale + margin))
+            y2 = min(h, int(y2 / crop_scale + margin))
+
+            if x2 <= x1 or y2 <= y1:
+                continue
+
+            # В RGB переводится только кроп; это копия, большой декод можно освободить
+            face_crop = cv2.cvtColor(crop_image[y1:y2, x1:x2], cv2.COLOR_BGR2RGB)
+
+            if face_crop.size > 0:
+                faces.append({
+                    'crop': face_crop,
+                    'bbox': (x1 * crop_scale, y1 * crop_scale, x2 * crop_scale, y2 * crop_scale),
+                    'confidence': confidence
+                })
+                print(f"   ✅ Обнаружено лицо {len(faces)} (уверенность: {confidence:.3f})")
+
+        if filtered:
+            print(f"   ⚠️ Отсеяно слишком мелких лиц: {len(filtered)}")
+        return faces, filtered
+
+    def preprocess_crop(self, face_crop):
+        """Преобразует вырезанное лицо во входной тензор [1, 3, 224, 224]"""
+        return self.preprocessor([face_crop]).to(self.device)
+
+    def build_classification_result(self, model_name, probabilities, model_set=None):
+        """Формирует словарь результата по вектору вероятностей одной модели"""
+        model_set = model_set or self.model_set
+        confidence, predicted_class = torch.max(probabilities, 0)
+        return {
+            'model': model_name,
+            'predicted_class': predicted_class.item(),
+            'class_name': model_set.models[model_name]['class_names'][predicted_class.item()],
+            'confidence': confidence.item(),
+            'all_probabilities': probabilities.cpu().numpy()
+        }
+
+    def preprocess_crops(self, face_crops):
+        """Собирает все вырезанные лица изображения в один тензор [N, 3, 224, 224]"""
+        with STAGE_SECONDS.time(stage='preprocess'):
+            return self.preprocessor(face_crops).to(self.device)
+
+    def classify_batch(self, input_tensor, faces=None, model_set=None):
+        """
+        Прогоняет батч лиц через все классификаторы, по одному вызову на модель.
+        Возвращает список результатов классификации для каждого лица батча.
+        faces - описания лиц ({'detection_confidence', 'crop_size'}) для каскада,
+        model_set - набор моделей запроса, по умолчанию текущий.
+
+        Объединённый классификатор быстрее пяти моделей только на маленьких
+        батчах (на CPU: 0.68 времени при 1 лице, 1.3-1.7 при 2-8 лицах),
+        поэтому используется до ML_FUSED_HEADS_MAX_BATCH лиц
+        """
+        # Все модели батча берутся из одного набора, даже если его уже подменили
+        model_set = model_set or self.model_set
+        batch_size = input_tensor.shape[0]
+        use_fused = (
+            model_set.fused_heads is not None
+            and batch_size <= self.settings.ML_FUSED_HEADS_MAX_BATCH
+        )
+        if self.cascade is not None and faces is not None:
+            return self.classify_cascade(input_tensor, faces, model_set)
+
+        face_results = [[] for _ in range(batch_size)]
+
+        if use_fused:
+            try:
+                with torch.no_grad(), MODEL_SECONDS.time(model='fused_heads'):
+                    outputs = dict(zip(
+                        model_set.fused_heads.head_names, model_set.fused_heads(input_tensor)
+                    ))
+            except Exception as e:
+                print(f"❌ Ошибка объединённого классификатора: {e}")
+                outputs = {model_name: e for model_name in self.classifier_names}
+        else:
+            outputs = {}
+            for model_name in self.classifier_names:
+                try:
+                    with torch.no_grad(), MODEL_SECONDS.time(model=model_name):
+                        outputs[model_name] = model_set.models[model_name]['model'](input_tensor)
+                except Exception as e:
+                    print(f"❌ Ошибка в {model_name}: {e}")
+                    outputs[model_name] = e
+
+        for model_name in self.classifier_names:
+            logits = outputs[model_name]
+            if isinstance(logits, Exception):
+                MODEL_ERRORS.inc(model=model_name)
+                for results in face_results:
+                    results.append({'model': model_name, 'error': str(logits)})
+                continue
+
+            probabilities = torch.nn.functional.softmax(logits, dim=1)
+            for results, face_probabilities in zip(face_results, probabilities):
+                results.append(
+                    self.build_classification_result(model_name, face_probabilities, model_set)
+                )
+
+        return face_results
+
+    def classify_cascade(self, input_tensor, faces, model_set):
+        """
+        Классификация с ранним выходом: модели идут по порядку, и для каждой
+        лица делятся на полный прогон, уменьшенный вход и пропуск по правилам
+        self.cascade. Пропущенные модели отмечаются 'skipped', упрощённые -
+        'downgraded'.
+        """
+        face_results = [[] for _ in faces]
+        saved = 0.0
+
+        for model_name in self.classifier_names:
+            groups = {'full': [], 'downgrade': []}
+            decisions = []
+            for i, (face, results) in enumerate(zip(faces, face_results)):
+                decision, reason = self.cascade.decide(model_name, face, results)
+                decisions.append(decision)
+                if decision == 'skip':
+                    results.append(skipped_result(model_name, reason))
+                else:
+                    groups[decision].append(i)
+            saved += self.cascade.record(model_name, decisions)
+
+            for decision, indices in groups.items():
+                if not indices:
+                    continue
+                batch = input_tensor[indices] if len(indices) < len(faces) else input_tensor
+                label = model_name
+                if decision == 'downgrade':
+                    batch = self.cascade.reduce(batch)
+                    label = f'{model_name}@{self.cascade.reduced_size}'
+                try:
+                    with torch.no_grad(), MODEL_SECONDS.time(model=label):
+                        logits = model_set.models[model_name]['model'](batch)
+                except Exception as e:
+                    print(f"❌ Ошибка в {model_name}: {e}")
+                    MODEL_ERRORS.inc(model=model_name)
+                    for i in indices:
+                        face_results[i].append({'model': model_name, 'error': str(e)})
+                    continue
+
+                probabilities = torch.nn.functional.softmax(logits, dim=1)
+                for i, face_probabilities in zip(indices, probabilities):
+                    result = self.build_classification_result(model_name, face_probabilities, model_set)
+                    if decision == 'downgrade':
+                        result['downgraded'] = True
+                    face_results[i].append(result)
+
+        if saved:
+            total = len(faces) * len(self.classifier_names)
+            print(f"   ⏩ Каскад: сэкономлено {saved:.1f} из {total} прогонов классификаторов ({saved / total:.0%})")
+        return face_results
+
+    def classify_crops(self, face_crops, faces=None, model_set=None):
+        """Предобработка и классификация лиц одним синхронным вызовом"""
+        # Тензор используется сразу в этом же потоке, поэтому можно писать в его буфер
+        with STAGE_SECONDS.time(stage='preprocess'):
+            input_tensor = self.preprocessor(face_crops, reuse_buffer=True).to(self.device)
+        return self.classify_batch(input_tensor, faces, model_set)
+
+    def describe_faces(self, face_crops, detection_confidences=None):
+        """Описания лиц для каскада: уверенность детекции и короткая сторона кропа"""
+        if self.cascade is None:
+            return None
+        detection_confidences = detection_confidences or [None] * len(face_crops)
+        return [
+            {'detection_confidence': confidence, 'crop_size': min(face_crop.shape[:2])}
+            for face_crop, confidence in zip(face_crops, detection_confidences)
         ]
-        
-        # Создаем задачи для параллельной обработки
-        tasks = []
-        for model_name in pipeline_order:
-            task = self.process_with_mobilenet(model_name, face_crop)
-            tasks.append(task)
-        
-        # Запускаем все модели параллельно
-        results = await asyncio.gather(*tasks)
-        
-        return results
 
-    async def process_image(self, image_path):
-        """Основной метод обработки изображения"""
-        print(f"\n🎯 Начало обработки изображения: {Path(image_path).name}")
+    async def process_faces_batch(self, face_crops, detection_confidences=None, model_set=None):
+        """
+        Обработка всех лиц изображения одним батчем через пайплайн MobileNet моделей.
+        detection_confidences - уверенности YOLO по лицам, нужны правилам каскада;
+        model_set - набор моделей запроса, по умолчанию текущий
+        """
+        print(f"🔄 Запуск пайплайна классификации для {len(face_crops)} лиц...")
+        model_set = model_set or self.model_set
+        faces = self.describe_faces(face_crops, detection_confidences)
+        if self.scheduler is not None:
+            input_tensor = await model_set.executor.run('preprocess_crops', face_crops)
+            return await self.scheduler.submit(input_tensor, faces, model_set)
+        return await self.run_models(model_set, 'classify_crops', face_crops, faces)
+
+    async def process_face_pipeline(self, face_crop, detection_confidence=None):
+        """
+        Обработка одного лица через весь пайплайн MobileNet моделей.
+        При ML_CASCADE часть моделей может быть пропущена или упрощена
+        """
+        face_results = await self.process_faces_batch([face_crop], [detection_confidence])
+        return face_results[0]
+
+    async def process_image(self, image, on_faces_detected=None, imgsz=None):
+        """
+        Основной метод обработки изображения (путь, байты или BGR массив).
+        on_faces_detected - необязательный async callback(число лиц),
+        вызывается между детекцией и классификацией.
+        imgsz - размер входа детектора, по умолчанию ML_DETECTION_SIZE.
+
+        Возвращает {'results': [результат по каждому лицу], 'model_version':
+        версия набора моделей, посчитавшего результат, 'filtered_faces':
+        лица, отсеянные проверкой качества}; results пуст, если лица не
+        найдены. Весь запрос идёт на одном наборе моделей, даже если
+        во время него модели перезагрузили
+        """
+        with self.model_set.use() as model_set:
+            return await self._process_image(model_set, image, on_faces_detected, imgsz)
+
+    async def _process_image(self, model_set, image, on_faces_detected, imgsz):
+        print(f"\n🎯 Начало обработки изображения: {describe_image(image)}")
         start_time = time.time()
-        
         # Шаг 1: Детекция лиц YOLO
-        faces = self.yolo_detect_faces(image_path)
+        faces, filtered = await self.run_models(model_set, 'yolo_detect_faces', image, imgsz)
+        output = {
+            'results': [],
+            'model_version': model_set.version_key(),
+            'filtered_faces': filtered,
+        }
         
+        FACES_PER_IMAGE.observe(len(faces))
         if not faces:
             print("❌ Лица не обнаружены")
-            return None
+            return output
+
+        if on_faces_detected is not None:
+            await on_faces_detected(len(faces))
         
-        all_results = []
+        all_results = output['results']
         
-        # Шаг 2: Обработка каждого лица через пайплайн
-        for i, face in enumerate(faces):
-            print(f"\n👤 Обработка лица {i+1}/{len(faces)}...")
-            
-            # Запускаем пайплайн для текущего лица
-            face_results = await self.process_face_pipeline(face['crop'])
-            
+        # Шаг 2: Обработка всех лиц одним батчем через пайплайн
+        batch_results = await self.process_faces_batch(
+            [face['crop'] for face in faces],
+            [face['confidence'] for face in faces],
+            model_set,
+        )
+
+        for i, (face, face_results) in enumerate(zip(faces, batch_results)):
             result = {
                 'face_id': i + 1,
                 'bbox': face['bbox'],
@@ -255,9 +1076,10 @@ class ModelPipeline:
             all_results.append(result)
         
         total_time = time.time() - start_time
+        STAGE_SECONDS.observe(total_time, stage='process_image')
         print(f"\n✅ Обработка завершена за {total_time:.2f} секунд")
         
-        return all_results
+        return output
 
     def print_results(self, results):
         if not results:
@@ -273,6 +1095,8 @@ class ModelPipeline:
             for classification in result['classification_results']:
                 if 'error' in classification:
                     analysis_text += f"❌ {classification['model']}: {classification['error']}\n"
+                elif classification.get('skipped'):
+                    analysis_text += f"⏩ {classification['model']}: пропущена ({classification['reason']})\n"
                 else:
                     analysis_text += f"✅ {classification['model']}:\n"
                     analysis_text += f"   🏷️  Класс: {classification['class_name']}\n"
@@ -280,7 +1104,7 @@ class ModelPipeline:
                     
                     # Топ предсказания
                     probs = classification['all_probabilities']
-                    class_names = self.models[classification['model']]['class_names']
+                    class_names = self.model_configs[classification['model']]['class_names']
                     
                     prob_indices = [(prob, idx) for idx, prob in enumerate(probs)]
                     prob_indices.sort(reverse=True, key=lambda x: x[0])
@@ -337,7 +1161,170 @@ class ModelPipeline:
                 "parameters": {}
             }
 
-pipeline = ModelPipeline()
+def serialize_output(output):
+    """Переводит ответ process_image в JSON-совместимый вид"""
+    return {**output, 'results': serialize_results(output['results'])}
+
+
+def deserialize_output(data):
+    """Обратное преобразование к формату ответа process_image"""
+    return {**data, 'results': deserialize_results(data['results'])}
+
+
+def serialize_results(results):
+    """Переводит результаты по лицам в JSON-совместимый вид"""
+    return [
+        {
+            **result,
+            'bbox': list(result['bbox']),
+            'classification_results': [
+                {
+                    **classification,
+                    'all_probabilities': classification['all_probabilities'].tolist(),
+                } if 'all_probabilities' in classification else classification
+                for classification in result['classification_results']
+            ],
+        }
+        for result in results
+    ]
+
+
+def deserialize_results(data):
+    """Обратное преобразование результатов по лицам"""
+    for result in data:
+        result['bbox'] = tuple(result['bbox'])
+        for classification in result['classification_results']:
+            if 'all_probabilities' in classification:
+                classification['all_probabilities'] = np.asarray(
+                    classification['all_probabilities'], dtype=np.float32
+                )
+    return data
+
+
+class RemotePipeline(ModelPipeline):
+    """
+    Тонкий клиент к отдельному серверу инференса (app.services.inference_server).
+
+    Модели загружены только в сервере, API-воркеры отправляют ему изображения.
+    Форматирование и парсинг ответов LLM наследуются от ModelPipeline.
+    """
+
+    def __init__(self, server_url, settings: MLSettings | None = None):
+        settings = (settings or ml_settings).model_copy(
+            update={'ML_EXECUTOR': 'inline', 'ML_MICRO_BATCHING': False}
+        )
+        super().__init__(settings)
+        self.server_url = server_url
+
+        if server_url.startswith('unix://'):
+            transport = httpx.AsyncHTTPTransport(uds=server_url[len('unix://'):])
+            base_url = 'http://inference'
+        else:
+            transport = None
+            base_url = server_url
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            transport=transport,
+            timeout=self.settings.ML_INFERENCE_SERVER_TIMEOUT,
+        )
+
+    async def fetch_server_state(self):
+        """Версии моделей сервера; возвращает ответ /health"""
+        response = await self.client.get('/health')
+        response.raise_for_status()
+        health = response.json()
+        model_versions = health['model_versions']
+        self.model_set = ModelSet(self.executor, self.model_metadata(model_versions), model_versions)
+        return health
+
+    async def load_all_models(self):
+        """Проверяет доступность сервера и получает список его моделей"""
+        print(f"🔌 Подключение к серверу инференса {self.server_url}...")
+        await self.fetch_server_state()
+        self.ready = True
+        print(f"✅ Сервер инференса доступен, моделей: {len(self.models)}")
+        return True
+
+    async def process_image(self, image, on_faces_detected=None, imgsz=None):
+        """
+        Отправляет изображение на сервер инференса. Сервер отвечает одним
+        запросом, поэтому промежуточного события детекции здесь нет.
+        model_version в ответе - версия моделей сервера, посчитавших результат
+        """
+        if isinstance(image, np.ndarray):
+            image_bytes = cv2.imencode('.png', image)[1].tobytes()
+        elif isinstance(image, (bytes, bytearray, memoryview)):
+            image_bytes = bytes(image)
+        else:
+            image_bytes = Path(image).read_bytes()
+        response = await self.client.post(
+            '/process',
+            params={'imgsz': imgsz} if imgsz else None,
+            content=image_bytes,
+            headers={'Content-Type': 'application/octet-stream'},
+        )
+        if response.status_code == 422:
+            detail = response.json()['detail']
+            raise QualityRejection(detail['reason'], detail['message'], detail['metrics'])
+        if response.status_code == 400:
+            raise ValueError(response.json()['detail'])
+        response.raise_for_status()
+        return deserialize_output(response.json())
+
+    async def reload_models(self):
+        """
+        Перезагрузка моделей выполняется на сервере инференса. Если её уже
+        запустил другой воркер (409), ждём её окончания и берём новые версии
+        """
+        async with self._reload_lock:
+            response = await self.client.post('/reload')
+            if response.status_code == 409:
+                health = await self.wait_server_reload()
+                self.last_reload = health['last_reload']
+            else:
+                response.raise_for_status()
+                model_versions = response.json()['model_versions']
+                self.model_set = ModelSet(
+                    self.executor, self.model_metadata(model_versions), model_versions
+                )
+                self.last_reload = {'finished_at': time.time(), 'error': None}
+            return self.get_model_versions()
+
+    async def wait_server_reload(self, poll_interval=0.5):
+        """Ждёт, пока сервер закончит перезагрузку, и обновляет версии"""
+        deadline = time.monotonic() + self.settings.ML_INFERENCE_SERVER_TIMEOUT
+        while (health := await self.fetch_server_state())['reloading']:
+            if time.monotonic() > deadline:
+                raise TimeoutError("Сервер инференса слишком долго перезагружает модели")
+            await asyncio.sleep(poll_interval)
+        return health
+
+    async def watch_model_versions(self, interval):
+        """
+        Файлы моделей отслеживает сам сервер инференса, воркер только
+        периодически сверяет с ним версии, чтобы ключи кэша и model_version
+        анализов не устаревали после перезагрузки
+        """
+        while True:
+            await asyncio.sleep(interval)
+            previous = self.model_version_key()
+            try:
+                await self.fetch_server_state()
+            except httpx.HTTPError as e:
+                print(f"⚠️ Не удалось получить версии моделей сервера: {e}")
+                continue
+            if self.model_version_key() != previous:
+                self.last_reload = {'finished_at': time.time(), 'error': None}
+                print("🔁 Сервер инференса сменил модели, версии обновлены")
+
+    async def close(self):
+        await self.client.aclose()
+
+
+if ml_settings.ML_INFERENCE_SERVER_URL:
+    pipeline = RemotePipeline(ml_settings.ML_INFERENCE_SERVER_URL)
+else:
+    pipeline = ModelPipeline()
 
 def get_pipeline() -> ModelPipeline:
     return pipeline
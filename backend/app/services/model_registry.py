@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Literal
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+class ModelSpec(BaseModel):
+    """
+    One entry of the model registry.
+
+    `sha256`, when set, is verified before the weights are loaded.
+    `precision` overrides ML_PRECISION for this model. `threads` sizes the
+    ONNX Runtime session; torch intra-op threads are process-wide, so
+    torch models keep using ML_TORCH_THREADS.
+    """
+
+    path: str
+    version: str | None = None
+    sha256: str | None = None
+    precision: Literal['fp32', 'bf16', 'int8'] | None = None
+    threads: int = 0
+    num_classes: int | None = None
+    class_names: list[str] | None = None
+
+
+# Weights shipped next to the app, used when no manifest is configured
+DEFAULT_MODELS = {
+    'yolo': ModelSpec(path='model.pt'),
+    'mobilenet_skin': ModelSpec(
+        path='skin_m.pth',
+        num_classes=2,
+        class_names=['acne', 'healthy'],
+    ),
+    'mobilenet_age': ModelSpec(
+        path='mobilenet_age.pth',
+        num_classes=6,
+        class_names=['adult', 'baby', 'child', 'middle', 'pensioner', 'teenage'],
+    ),
+    'mobilenet_eyes_darkcircles': ModelSpec(
+        path='mobilenet_darkcircles.pth',
+        num_classes=3,
+        class_names=['darkcircles', 'healthy', 'light_darkcircles'],
+    ),
+    'mobilenet_eyes_pupils': ModelSpec(
+        path='mobilenet_eyes_pupils.pth',
+        num_classes=3,
+        class_names=['conjunctivitis', 'healthy', 'yellowness'],
+    ),
+    'mobilenet_general': ModelSpec(
+        path='general2.pth',
+        num_classes=2,
+        class_names=['edema', 'healthy'],
+    ),
+}
+
+
+class ModelRegistry:
+    """
+    Weights, versions and execution settings of every model in the pipeline.
+
+    Read from a JSON manifest (ML_MODEL_REGISTRY) of the form
+    {"models": {"mobilenet_skin": {"path": "...", "version": "...", ...}}};
+    relative paths resolve against the manifest's folder. Models missing
+    from the manifest keep their defaults.
+    """
+
+    def __init__(self, manifest_path: str = ""):
+        self.manifest_path = Path(manifest_path) if manifest_path else None
+        entries = {}
+        if self.manifest_path is not None:
+            manifest = json.loads(self.manifest_path.read_text(encoding='utf-8'))
+            entries = manifest.get('models', {})
+
+        self.specs = {}
+        for name, default in DEFAULT_MODELS.items():
+            entry = entries.pop(name, {})
+            spec = ModelSpec(**{**default.model_dump(), **entry})
+            base_dir = self.manifest_path.resolve().parent if 'path' in entry else BASE_DIR
+            spec.path = str(base_dir / spec.path)
+            self.specs[name] = spec
+
+        if entries:
+            raise ValueError(f"Unknown models in {self.manifest_path}: {sorted(entries)}")
+
+    def model_configs(self) -> dict:
+        """Specs in the `model_configs` layout used by ModelPipeline."""
+        configs = {}
+        for name, spec in self.specs.items():
+            config = spec.model_dump(exclude_none=True)
+            config['type'] = 'yolo' if name == 'yolo' else 'mobilenet'
+            configs[name] = config
+        return configs
+
+    def watched_files(self) -> list[str]:
+        files = [spec.path for spec in self.specs.values()]
+        if self.manifest_path is not None:
+            files.append(str(self.manifest_path))
+        return files
+
+
+def files_fingerprint(paths) -> tuple:
+    """Cheap change marker for the watcher: mtime and size of every file."""
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            fingerprint.append((path, None, None))
+    return tuple(fingerprint)
+
+
+async def watch_models(pipeline, interval: float) -> None:
+    """
+    Poll the manifest and weight files and hot-reload the pipeline when
+    they change. A change is acted on once it has been stable for one
+    interval, so a half-copied file is not loaded.
+    """
+    fingerprint = files_fingerprint(pipeline.registry.watched_files())
+    pending = None
+    while True:
+        await asyncio.sleep(interval)
+        # A new manifest can point at new weight files
+        try:
+            current = files_fingerprint(ModelRegistry(pipeline.settings.ML_MODEL_REGISTRY).watched_files())
+        except (OSError, ValueError) as e:
+            logger.error(f"Model registry is unreadable: {e}")
+            continue
+
+        if current == fingerprint:
+            pending = None
+            continue
+        if current != pending:
+            pending = current
+            continue
+
+        logger.info("Model files changed, reloading models.")
+        try:
+            await pipeline.reload_models()
+        except Exception as e:
+            logger.error(f"Model reload failed, keeping current models: {e}")
+        fingerprint, pending = current, None
@@ -0,0 +1,48 @@
+import torch
+
+
+class OnnxClassifier:
+    """
+    Сессия ONNX Runtime с интерфейсом torch-модели классификатора:
+    принимает тензор [N, 3, H, W] и возвращает тензор логитов [N, C].
+    """
+
+    def __init__(self, path, num_threads=0):
+        # onnxruntime нужен только для этого бэкенда
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            path, sess_options=options, providers=['CPUExecutionProvider']
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, input_tensor):
+        outputs = self.session.run(
+            None, {self.input_name: input_tensor.contiguous().numpy()}
+        )
+        return torch.from_numpy(outputs[0])
+
+    def to(self, device):
+        return self
+
+    def eval(self):
+        return self
+
+
+def export_classifier(model, path, input_size=224, opset_version=17):
+    """Экспорт MobileNet классификатора в ONNX с динамическим размером батча"""
+    model.eval()
+    dummy_input = torch.randn(1, 3, input_size, input_size)
+    torch.onnx.export(
+        model,
+        (dummy_input,),
+        path,
+        input_names=['input'],
+        output_names=['logits'],
+        dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+        opset_version=opset_version,
+        dynamo=False,
+    )
@@ -0,0 +1,82 @@
+from pathlib import Path
+
+import cv2
+import torch
+import torch.nn as nn
+
+PRECISIONS = ('fp32', 'bf16', 'int8')
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+
+
+class BFloat16Classifier(nn.Module):
+    """Классификатор в bfloat16: вход приводится к bf16, логиты возвращаются в fp32"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model.to(torch.bfloat16)
+
+    def forward(self, x):
+        return self.model(x.to(torch.bfloat16)).float()
+
+
+def load_calibration_batches(pipeline, images_dir, limit=64, batch_size=16):
+    """
+    Готовит батчи для калибровки int8 из папки с фотографиями лиц.
+    Каждое изображение считается уже вырезанным лицом и проходит
+    ту же предобработку, что и при инференсе.
+    """
+    if not images_dir:
+        return []
+
+    paths = sorted(
+        path for path in Path(images_dir).iterdir()
+        if path.suffix.lower() in IMAGE_SUFFIXES
+    )[:limit]
+
+    tensors = []
+    for path in paths:
+        image = cv2.imread(str(path))
+        if image is None:
+            continue
+        tensors.append(pipeline.preprocess_crop(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)))
+
+    return [
+        torch.cat(tensors[i:i + batch_size])
+        for i in range(0, len(tensors), batch_size)
+    ]
+
+
+def quantize_int8(model, calibration_batches):
+    """
+    Статическая int8 квантизация (FX graph mode) с калибровкой активаций.
+    Без калибровочных данных - динамическая квантизация только Linear слоёв.
+    """
+    if not calibration_batches:
+        return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = 'x86' if 'x86' in torch.backends.quantized.supported_engines else 'qnnpack'
+    torch.backends.quantized.engine = engine
+
+    prepared = prepare_fx(
+        model.eval(),
+        get_default_qconfig_mapping(engine),
+        (calibration_batches[0][:1],),
+    )
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def apply_precision(model, precision, calibration_batches=None):
+    """Возвращает вариант fp32 модели в нужной точности"""
+    if precision == 'fp32':
+        return model
+    if precision == 'bf16':
+        return BFloat16Classifier(model).eval()
+    if precision == 'int8':
+        return quantize_int8(model, calibration_batches or []).eval()
+    raise ValueError(f"Неизвестная точность {precision}, ожидается одна из {PRECISIONS}")
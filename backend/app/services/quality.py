@@ -0,0 +1,120 @@
+import cv2
+import numpy as np
+
+# Сторона, к которой приводится кадр перед оценкой резкости: дисперсия
+# лапласиана зависит от масштаба, порог должен значить одно и то же
+# для фото 12 Мп и для скриншота
+SHARPNESS_SIZE = 512
+
+
+class QualityRejection(ValueError):
+    """
+    Фото непригодно для анализа. reason - машинный код причины,
+    message - текст для пользователя, metrics - измеренные значения и пороги
+    """
+
+    def __init__(self, reason, message, metrics=None):
+        super().__init__(reason, message, metrics)
+        self.reason = reason
+        self.message = message
+        self.metrics = metrics or {}
+
+    def __str__(self):
+        return self.message
+
+    def to_dict(self):
+        return {'reason': self.reason, 'message': self.message, 'metrics': self.metrics}
+
+
+def measure_image(image, scale=1):
+    """
+    Дешёвые метрики кадра по (возможно уменьшенному) BGR декоду.
+    scale - во сколько раз декод меньше оригинала.
+    """
+    height, width = image.shape[:2]
+    # Очень большие кадры (не JPEG или без уменьшенного декода) сначала
+    # прореживаются шагом, чтобы итоговое уменьшение было не больше чем
+    # вдвое и билинейная интерполяция не давала заметного алиасинга
+    step = max(height, width) // (2 * SHARPNESS_SIZE)
+    if step > 1:
+        image = image[::step, ::step]
+    factor = SHARPNESS_SIZE / max(image.shape[:2])
+    if factor < 1:
+        image = cv2.resize(image, None, fx=factor, fy=factor, interpolation=cv2.INTER_LINEAR)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    histogram = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel() / gray.size
+    _, laplacian_std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F))
+    return {
+        'width': width * scale,
+        'height': height * scale,
+        'sharpness': float(laplacian_std[0, 0] ** 2),
+        'brightness': float(histogram @ np.arange(256)),
+        'dark_fraction': float(histogram[:16].sum()),
+        'bright_fraction': float(histogram[240:].sum()),
+    }
+
+
+def check_image(image, settings, scale=1):
+    """
+    Проверка кадра до детекции: разрешение, экспозиция и резкость.
+    Бросает QualityRejection с первой найденной причиной.
+    """
+    metrics = measure_image(image, scale)
+
+    short_side = min(metrics['width'], metrics['height'])
+    if short_side < settings.ML_QUALITY_MIN_RESOLUTION:
+        raise QualityRejection(
+            'low_resolution',
+            f"Image is too small: {metrics['width']}x{metrics['height']}, "
+            f"the shorter side must be at least {settings.ML_QUALITY_MIN_RESOLUTION} px",
+            metrics,
+        )
+
+    if (
+        metrics['brightness'] < settings.ML_QUALITY_MIN_BRIGHTNESS
+        or metrics['dark_fraction'] > settings.ML_QUALITY_MAX_CLIPPED
+    ):
+        raise QualityRejection(
+            'too_dark', "The photo is too dark, retake it in better light", metrics
+        )
+
+    if (
+        metrics['brightness'] > settings.ML_QUALITY_MAX_BRIGHTNESS
+        or metrics['bright_fraction'] > settings.ML_QUALITY_MAX_CLIPPED
+    ):
+        raise QualityRejection(
+            'overexposed', "The photo is overexposed, avoid direct light or flash", metrics
+        )
+
+    if metrics['sharpness'] < settings.ML_QUALITY_MIN_SHARPNESS:
+        raise QualityRejection(
+            'blurry', "The photo is blurry, hold the camera still and refocus", metrics
+        )
+
+    return metrics
+
+
+def check_face_sizes(boxes, settings):
+    """
+    Проверка после детекции: делит лица на те, короткая сторона рамки
+    которых (в пикселях оригинала) не меньше ML_QUALITY_MIN_FACE, и
+    отсеянные. boxes - список ((x1, y1, x2, y2), confidence); возвращает
+    (подходящие, отсеянные) в том же виде. Если лица есть, но все слишком
+    мелкие, бросает QualityRejection.
+    """
+    def face_size(box):
+        (x1, y1, x2, y2), _ = box
+        return min(x2 - x1, y2 - y1)
+
+    large, small = [], []
+    for box in boxes:
+        (large if face_size(box) >= settings.ML_QUALITY_MIN_FACE else small).append(box)
+    if boxes and not large:
+        largest = max(face_size(box) for box in boxes)
+        raise QualityRejection(
+            'face_too_small',
+            "The face is too small in the frame, move the camera closer",
+            {'face_size': int(largest), 'min_face_size': settings.ML_QUALITY_MIN_FACE},
+        )
+    return large, small
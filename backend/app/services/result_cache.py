@@ -0,0 +1,244 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from app.core.metrics import CACHE_REQUESTS
+from app.core.ml_config import ml_settings
+from app.services.ml_pipeline import deserialize_output, serialize_output
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the shape of the stored process_image output changes
+RESULT_FORMAT = 2
+
+# Settings that change what process_image returns for the same image and
+# weights; precision and backend are already part of the model versions
+RESULT_SETTINGS = (
+    "ML_FAST_DECODE",
+    "ML_CASCADE",
+    "ML_CASCADE_RULES",
+    "ML_CASCADE_REDUCED_SIZE",
+    "ML_QUALITY_GATE",
+    "ML_QUALITY_MIN_RESOLUTION",
+    "ML_QUALITY_MIN_SHARPNESS",
+    "ML_QUALITY_MIN_BRIGHTNESS",
+    "ML_QUALITY_MAX_BRIGHTNESS",
+    "ML_QUALITY_MAX_CLIPPED",
+    "ML_QUALITY_MIN_FACE",
+)
+
+
+def settings_key(settings, imgsz: int | None = None) -> str:
+    """Short hash of the output format, the detection size actually used and RESULT_SETTINGS."""
+    values = {name: getattr(settings, name) for name in RESULT_SETTINGS}
+    values["detection_size"] = imgsz or settings.ML_DETECTION_SIZE
+    values["format"] = RESULT_FORMAT
+    payload = json.dumps(values, sort_keys=True).encode()
+    return hashlib.sha256(payload).hexdigest()[:12]
+
+
+class ResultCache:
+    """
+    Content-addressed cache of `process_image` outputs.
+
+    Keys are the SHA-256 of the image bytes plus the pipeline's model version
+    key and a hash of the detection size and RESULT_SETTINGS, so swapping
+    weights or changing e.g. the cascade or the quality gate naturally
+    invalidates old entries. Outputs are kept as JSON in an in-process LRU
+    tier (size + TTL eviction) and, optionally, in a persistent SQLite tier
+    shared by every worker on the host. Concurrent requests for the same
+    image share one computation.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0, path: str = ""):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, created_at REAL, payload TEXT)"
+            )
+            self._db.commit()
+            logger.info(f"Persistent result cache at '{path}'.")
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self._db is not None
+
+    @staticmethod
+    def make_key(image_bytes: bytes, version_key: str, config_key: str) -> str:
+        return f"{hashlib.sha256(image_bytes).hexdigest()}:{version_key}:{config_key}"
+
+    def _get_memory(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created_at, payload = entry
+        if time.time() - created_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return payload
+
+    def _put_memory(self, key: str, payload: str, created_at: float) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (created_at, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _get_persistent(self, key: str) -> tuple[float, str] | None:
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT created_at, payload FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[0] > self.ttl:
+            return None
+        return row
+
+    def _put_persistent(self, key: str, payload: str, created_at: float) -> None:
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, created_at, payload) VALUES (?, ?, ?)",
+                (key, created_at, payload),
+            )
+            self._db.execute(
+                "DELETE FROM results WHERE created_at < ?", (created_at - self.ttl,)
+            )
+            self._db.commit()
+
+    async def get(self, key: str) -> str | None:
+        """
+        Look up a serialized result in the memory, then persistent tier.
+        SQLite calls run in a thread so a busy database does not block the loop.
+        """
+        payload = self._get_memory(key)
+        if payload is not None:
+            self.memory_hits += 1
+            CACHE_REQUESTS.inc(cache="result", result="memory_hit")
+            return payload
+
+        row = None
+        if self._db is not None:
+            row = await asyncio.to_thread(self._get_persistent, key)
+        if row is not None:
+            self.persistent_hits += 1
+            CACHE_REQUESTS.inc(cache="result", result="persistent_hit")
+            self._put_memory(key, row[1], row[0])
+            return row[1]
+
+        self.misses += 1
+        CACHE_REQUESTS.inc(cache="result", result="miss")
+        return None
+
+    async def put(self, key: str, payload: str) -> None:
+        """
+        Best-effort store: a failing persistent tier (e.g. "database is
+        locked" with several workers on one file) is logged, not raised.
+        """
+        created_at = time.time()
+        self._put_memory(key, payload, created_at)
+        if self._db is None:
+            return
+        try:
+            await asyncio.to_thread(self._put_persistent, key, payload, created_at)
+        except Exception as e:
+            logger.error(f"Failed to store result in the persistent cache: {e}")
+
+    async def get_or_process(
+        self, pipeline, image_bytes: bytes, on_faces_detected=None, imgsz: int | None = None
+    ):
+        """
+        Return the cached output for the image or run `process_image` once.
+
+        The output carries the `model_version` of the models that produced
+        it; a computation that started before a reload is stored under the
+        key of the old version, not the current one. `on_faces_detected` and `imgsz` are forwarded to `process_image`; the
+        callback is not called on a cache hit or when joining another
+        request's computation. Each detection size is cached separately;
+        an explicit size equal to ML_DETECTION_SIZE shares the default entry.
+        """
+        if not self.enabled:
+            return await pipeline.process_image(image_bytes, on_faces_detected, imgsz)
+
+        config_key = settings_key(pipeline.settings, imgsz)
+        key = self.make_key(image_bytes, pipeline.model_version_key(), config_key)
+        payload = await self.get(key)
+        if payload is not None:
+            return deserialize_output(json.loads(payload))
+
+        while (inflight := self._inflight.get(key)) is not None:
+            try:
+                return deserialize_output(json.loads(await asyncio.shield(inflight)))
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    # This request itself was cancelled
+                    raise
+                # The request computing the result went away, take over from it
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            try:
+                output = await pipeline.process_image(image_bytes, on_faces_detected, imgsz)
+                payload = json.dumps(serialize_output(output))
+            except Exception as e:
+                future.set_exception(e)
+                # Nobody may be waiting on the shared future
+                future.exception()
+                raise
+            except BaseException:
+                # Cancelled (e.g. the client disconnected): waiting requests retry
+                future.cancel()
+                raise
+            future.set_result(payload)
+            # Models reloaded mid-request leave the output under the old version
+            await self.put(self.make_key(image_bytes, output["model_version"], config_key), payload)
+            return output
+        finally:
+            del self._inflight[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        if self._db is not None:
+            with self._lock:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.persistent_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
+
+
+result_cache = ResultCache(
+    max_entries=ml_settings.ML_RESULT_CACHE_SIZE,
+    ttl=ml_settings.ML_RESULT_CACHE_TTL,
+    path=ml_settings.ML_RESULT_CACHE_PATH,
+)
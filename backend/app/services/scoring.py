@@ -0,0 +1,180 @@
+"""
+Локальный расчёт диаграммы, которую раньше считал LLM по промпту
+(app.llm_handler.build_messages).
+
+Явные формулы промпта перенесены как есть: tireness, stress и balance.
+Остальное в промпте задано диапазонами ("edema 30-50% = отечность 30-40%")
+или словами ("у детей кожа должна быть идеальной"); такие места ниже
+помечены "подобрано" - это наши константы, выбранные так, чтобы типичные
+входы попадали в диапазоны промпта. Значения на характерных входах
+закреплены в tests/test_scoring.py.
+"""
+
+import numpy as np
+
+# Показатели диаграммы в том же виде, в каком их раньше считал LLM
+METRICS = (
+    'tireness', 'swelling', 'eyes_darkcircles', 'eyes_health',
+    'skin_health', 'acne', 'stress', 'balance'
+)
+
+# Класс, подставляемый вместо результата модели, которая упала или была пропущена
+DEFAULT_CLASSES = {
+    'mobilenet_skin': 'healthy',
+    'mobilenet_age': 'adult',
+    'mobilenet_eyes_darkcircles': 'healthy',
+    'mobilenet_eyes_pupils': 'healthy',
+    'mobilenet_general': 'healthy',
+}
+
+# "возрастной_коэффициент" промпта, подобрано. Точка отсчёта - adult (1.0,
+# "акне >20% требует коррекции"); teenage 0.6 ~ 20% / 30-40%, при которых
+# промпт считает акне подростка нормой; baby/child > 1 - "кожа должна быть
+# идеальной"; сами 1.5 и 1.3, как и 1.1 для middle и 0.8 для pensioner
+# (про них промпт чисел не даёт), - наш выбор
+AGE_ACNE_COEFFICIENTS = {
+    'baby': 1.5, 'child': 1.3, 'teenage': 0.6,
+    'adult': 1.0, 'middle': 1.1, 'pensioner': 0.8,
+}
+# "youth_bonus" промпта, подобрано: возвращает в диапазон "healthy + young
+# age = 80-95%" кожу с акне на границе нормы для возраста (подросток с 30%
+# акне -> 90, взрослый с 20% -> 85)
+AGE_YOUTH_BONUS = {
+    'baby': 10.0, 'child': 10.0, 'teenage': 8.0,
+    'adult': 5.0, 'middle': 0.0, 'pensioner': 0.0,
+}
+
+
+def _column(probabilities, class_names, model_name, class_name):
+    return probabilities[model_name][:, class_names[model_name].index(class_name)]
+
+
+def _age_weights(probabilities, class_names, table):
+    weights = np.array([table[name] for name in class_names['mobilenet_age']])
+    return probabilities['mobilenet_age'] @ weights
+
+
+def score_batch(probabilities, class_names):
+    """
+    Векторизованный расчёт показателей диаграммы по формулам и диапазонам промпта.
+
+    probabilities: {имя модели: массив [N, число классов]} в порядке
+    class_names[имя модели]. Возвращает {показатель: массив [N]} в процентах 0-100.
+    """
+    p_acne = _column(probabilities, class_names, 'mobilenet_skin', 'acne')
+    p_dark = _column(probabilities, class_names, 'mobilenet_eyes_darkcircles', 'darkcircles')
+    p_light = _column(probabilities, class_names, 'mobilenet_eyes_darkcircles', 'light_darkcircles')
+    p_no_circles = _column(probabilities, class_names, 'mobilenet_eyes_darkcircles', 'healthy')
+    p_eyes_healthy = _column(probabilities, class_names, 'mobilenet_eyes_pupils', 'healthy')
+    p_edema = _column(probabilities, class_names, 'mobilenet_general', 'edema')
+
+    # Отечность по диапазонам промпта: 30-50% уверенности -> 30-40, >50% -> 45-65;
+    # ниже 30% промпт ничего не говорит, линейно от нуля (подобрано)
+    base_swelling = np.interp(p_edema, [0.0, 0.3, 0.5, 0.5001, 1.0], [0.0, 30.0, 40.0, 45.0, 65.0])
+
+    # Усталость: формула base_tireness промпта плюс "swelling * 0.45"
+    tireness = (
+        p_light * 0.7 * 100
+        + p_dark * 0.9 * 100
+        + np.where(p_edema > 0.3, p_edema * 0.6 * 100, 0.0)
+        + base_swelling * 0.45
+    )
+    tireness = np.clip(tireness, 0, 100)
+
+    # "Чем выше tireness, тем выше swelling (+10-30)": линейно 10-30 по
+    # tireness, начиная с 25 - нижней границы усталости 1-й степени из
+    # раздела 1 промпта (подобрано); "круги под глазами - штраф +10-15":
+    # до 15 по вероятности кругов любой степени
+    tireness_bonus = np.where(tireness > 25, 10 + 20 * tireness / 100, 0.0)
+    swelling = np.clip(base_swelling + tireness_bonus + 15 * (1 - p_no_circles), 0, 100)
+
+    # Круги под глазами по степеням промпта (light 25-40, darkcircles >40% ->
+    # 50-70, >60% -> 70-85), берём наибольшую из оценок
+    eyes_darkcircles = np.maximum(
+        np.interp(p_dark, [0.0, 0.4, 0.6, 1.0], [0.0, 50.0, 70.0, 85.0]),
+        np.interp(p_light, [0.0, 0.5, 1.0], [0.0, 25.0, 40.0]),
+    )
+
+    # "eyes_pupils healthy = здоровье глаз 90-100%": 90-100 при уверенности
+    # от 50%, ниже линейно до 10 (подобрано)
+    eyes_health = np.interp(p_eyes_healthy, [0.0, 0.5, 1.0], [10.0, 90.0, 100.0])
+
+    acne = p_acne * 100
+    # edema_impact промпта - доля отечности 0.2 (подобрано)
+    skin_health = 100 - (
+        acne * _age_weights(probabilities, class_names, AGE_ACNE_COEFFICIENTS)
+        + swelling * 0.2
+        - _age_weights(probabilities, class_names, AGE_YOUTH_BONUS)
+    )
+    skin_health = np.clip(skin_health, 0, 100)
+
+    # stress и balance - формулы из JSON-шаблона промпта
+    stress = np.clip(tireness * 0.4 + eyes_darkcircles * 0.25 + swelling * 0.2, 0, 100)
+    balance = np.clip(
+        100 - (
+            tireness * 0.35 + acne * 0.1 + swelling * 0.2
+            + eyes_darkcircles * 0.15 + stress * 0.35
+        ),
+        0, 100,
+    )
+
+    return {
+        'tireness': tireness,
+        'swelling': swelling,
+        'eyes_darkcircles': eyes_darkcircles,
+        'eyes_health': eyes_health,
+        'skin_health': skin_health,
+        'acne': acne,
+        'stress': stress,
+        'balance': balance,
+    }
+
+
+def stack_probabilities(faces, class_names):
+    """
+    Собирает classification_results нескольких лиц в массивы [N, C] по моделям.
+    Упавшие или пропущенные модели заменяются one-hot вектором DEFAULT_CLASSES.
+    """
+    probabilities = {}
+    for model_name, names in class_names.items():
+        default = np.zeros(len(names), dtype=np.float32)
+        default[names.index(DEFAULT_CLASSES[model_name])] = 1.0
+
+        rows = []
+        for classification_results in faces:
+            row = default
+            for classification in classification_results:
+                if classification['model'] == model_name and 'all_probabilities' in classification:
+                    row = np.asarray(classification['all_probabilities'], dtype=np.float32)
+            rows.append(row)
+        probabilities[model_name] = np.stack(rows)
+    return probabilities
+
+
+def classifier_class_names(pipeline):
+    return {
+        model_name: pipeline.model_configs[model_name]['class_names']
+        for model_name in pipeline.classifier_names
+    }
+
+
+def score_faces(pipeline, results):
+    """Показатели для каждого лица результата process_image"""
+    class_names = classifier_class_names(pipeline)
+    probabilities = stack_probabilities(
+        [result['classification_results'] for result in results], class_names
+    )
+    scores = score_batch(probabilities, class_names)
+    return [
+        {metric: int(round(float(scores[metric][i]))) for metric in METRICS}
+        for i in range(len(results))
+    ]
+
+
+def score_results(pipeline, results):
+    """
+    Показатели диаграммы для основного лица. Основное - первое в results:
+    YOLO отдаёт рамки по убыванию уверенности. Остальные лица в диаграмму
+    не входят, для них есть score_faces
+    """
+    return score_faces(pipeline, results[:1])[0]
@@ -1,3 +1,5 @@
+import io
+import threading
 import uuid
 from datetime import timedelta
 from urllib.parse import urlparse, urlunparse
@@ -9,13 +11,61 @@ from minio import Minio
 from minio.error import S3Error
 
 from app.core.config import settings
+from app.core.metrics import STAGE_SECONDS
 
 logger = logging.getLogger(__name__)
 
 
+class InMemoryObjectStore:
+    """
+    The subset of the Minio client used by StorageService, kept in a dict.
+
+    Selected with STORAGE_BACKEND=memory so the API can run without MinIO.
+    """
+
+    def __init__(self):
+        self._buckets: dict[str, dict[str, tuple[bytes, str | None]]] = {}
+        self._lock = threading.Lock()
+
+    def bucket_exists(self, bucket_name: str) -> bool:
+        return bucket_name in self._buckets
+
+    def make_bucket(self, bucket_name: str) -> None:
+        with self._lock:
+            self._buckets.setdefault(bucket_name, {})
+
+    def put_object(self, bucket_name, object_name, data, length=-1, part_size=0, content_type=None):
+        payload = data.read() if length < 0 else data.read(length)
+        with self._lock:
+            self._buckets[bucket_name][object_name] = (payload, content_type)
+
+    def get_object(self, bucket_name, object_name):
+        try:
+            payload, _ = self._buckets[bucket_name][object_name]
+        except KeyError:
+            raise FileNotFoundError(object_name)
+        return _MemoryObject(payload)
+
+    def presigned_get_object(self, bucket_name, object_name, expires=None) -> str:
+        return f"memory://{bucket_name}/{object_name}"
+
+
+class _MemoryObject(io.BytesIO):
+    """Mirrors the urllib3 response returned by Minio.get_object."""
+
+    def release_conn(self) -> None:
+        pass
+
+
 class StorageService:
     def __init__(self):
         logger.info("Initializing StorageService...")
+        if settings.STORAGE_BACKEND == "memory":
+            self.client = self.public_client = InMemoryObjectStore()
+            self.bucket_name = settings.MINIO_BUCKET
+            self._ensure_bucket_exists()
+            return
+
         self.client = Minio(
             settings.MINIO_ENDPOINT,
             access_key=settings.MINIO_ACCESS_KEY,
@@ -47,22 +97,24 @@ class StorageService:
                 logger.error(f"Error creating bucket: {exc}")
                 raise
 
+    @staticmethod
+    def object_name(object_name_or_url: str) -> str:
+        """Object name of a stored image path, which may be a full URL."""
+        parsed_url = urlparse(object_name_or_url)
+        if parsed_url.scheme and parsed_url.netloc:
+            # Looks like a URL, extract the path part.
+            # The path might be /bucket_name/object_name, so we get the last part.
+            return parsed_url.path.split('/')[-1]
+        # Assumed to be just the object name
+        return object_name_or_url
+
     async def get_presigned_url(self, object_name_or_url: str) -> str | None:
         """
         Generate a presigned URL for an object.
         Handles both an object name and a full URL.
         """
         try:
-            # If a full URL is passed, extract just the object name.
-            parsed_url = urlparse(object_name_or_url)
-            if parsed_url.scheme and parsed_url.netloc:
-                # Looks like a URL, extract the path part.
-                # The path might be /bucket_name/object_name, so we get the last part.
-                object_name = parsed_url.path.split('/')[-1]
-            else:
-                # Assumed to be just the object name
-                object_name = object_name_or_url
-
+            object_name = self.object_name(object_name_or_url)
             presigned_url = self.public_client.presigned_get_object(
                 self.bucket_name,
                 object_name,
@@ -83,18 +135,38 @@ class StorageService:
         )
         try:
             file.file.seek(0)
-            self.client.put_object(
-                self.bucket_name,
-                file_name,
-                file.file,
-                length=-1,
-                part_size=10 * 1024 * 1024,
-                content_type=file.content_type,
-            )
+            with STAGE_SECONDS.time(stage="minio_upload"):
+                self.client.put_object(
+                    self.bucket_name,
+                    file_name,
+                    file.file,
+                    length=-1,
+                    part_size=10 * 1024 * 1024,
+                    content_type=file.content_type,
+                )
         except S3Error as exc:
             logger.error(f"Error uploading to MinIO: {exc}")
             raise
         return file_name
 
+    def download_file(self, object_name: str) -> bytes:
+        """
+        Read an object from the bucket. Blocking; callers on the event loop
+        run it in a thread. Raises FileNotFoundError for a missing object.
+        """
+        try:
+            with STAGE_SECONDS.time(stage="minio_download"):
+                response = self.client.get_object(self.bucket_name, object_name)
+                try:
+                    return response.read()
+                finally:
+                    response.close()
+                    response.release_conn()
+        except S3Error as exc:
+            if exc.code in ("NoSuchKey", "NoSuchObject"):
+                raise FileNotFoundError(object_name) from exc
+            logger.error(f"Error downloading {object_name} from MinIO: {exc}")
+            raise
+
 
 storage_service = StorageService()
@@ -0,0 +1,2 @@
+# This file makes the tools directory a Python package
+
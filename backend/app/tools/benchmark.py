@@ -0,0 +1,444 @@
+"""
+Offline latency/throughput benchmark of ModelPipeline.process_image.
+
+    python -m app.tools.benchmark [--weights-dir DIR] [--faces DIR]
+        [--resolutions 640x480 1920x1080 4032x3024] [--face-counts 1 3]
+        [--concurrency 1 4] [--requests 24] [--json out.json]
+        [--baseline old.json] [--tolerance 0.15]
+
+Models are randomly initialised copies of the registry architectures
+(written once to --weights-dir and loaded through a registry manifest), so
+no checkpoints, network, GPU or LLM are needed. Images are synthetic
+scenes with planted faces at every resolution and face count; --faces
+pastes real face photos into the planted boxes. Random YOLO weights detect
+nothing, so the detector still runs its full forward pass but the boxes
+come from the planted positions.
+
+For every scenario and concurrency level the report shows p50/p95/p99
+latency, throughput and peak RSS, and the p50/p95/p99 of every pipeline
+stage and classifier. Pipeline settings (ML_EXECUTOR, ML_FUSED_HEADS,
+ML_MICRO_BATCHING, ML_PRECISION, ...) come from the environment as in the
+app. With --baseline the run exits with status 1 if a p95 latency or a
+throughput is worse than the baseline by more than --tolerance.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+from torchvision.models import mobilenet_v3_small
+
+from app.core.metrics import MODEL_SECONDS, STAGE_SECONDS
+from app.core.ml_config import ml_settings
+from app.services.ml_pipeline import ModelPipeline
+from app.services.model_registry import DEFAULT_MODELS
+from app.services.quality import QualityRejection
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+
+# Цвет нарисованных лиц (BGR). В фоне красный канал не выше 140, поэтому
+# лица можно найти по цвету (детектор-заменитель в app.tools.loadtest)
+FACE_COLOR = (120, 160, 215)
+BACKGROUND_MAX_RED = 140
+
+# Рамки лиц, заложенных в изображение, которое сейчас детектируется в этом потоке
+_planted = threading.local()
+
+
+def yolo_results(boxes):
+    """Рамки (x1, y1, x2, y2) в пикселях в виде, который читает yolo_detect_faces"""
+    return [SimpleNamespace(boxes=[
+        SimpleNamespace(
+            cls=torch.zeros(1),
+            xyxy=torch.tensor([box], dtype=torch.float32),
+            conf=torch.tensor([0.99]),
+        )
+        for box in boxes
+    ])]
+
+
+class PlantedImage(bytes):
+    """JPEG байты синтетической сцены; boxes - рамки лиц в долях ширины/высоты"""
+
+    boxes: list
+
+
+class PlantedFaceDetector:
+    """
+    Замена YOLO для случайных весов: полный прогон сети ради честного времени,
+    но рамки берутся из заложенных в сцену лиц
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, source, **kwargs):
+        results = self.model.predict(source=source, **{**kwargs, 'verbose': False})
+        boxes = getattr(_planted, 'boxes', None)
+        if boxes is None:
+            return results
+        height, width = source.shape[:2]
+        return yolo_results([
+            [x1 * width, y1 * height, x2 * width, y2 * height] for x1, y1, x2, y2 in boxes
+        ])
+
+
+class BenchmarkPipeline(ModelPipeline):
+    """ModelPipeline, детектор которого находит заложенные в сцену лица"""
+
+    def _load_yolo_model(self):
+        super()._load_yolo_model()
+        self.models['yolo'] = PlantedFaceDetector(self.models['yolo'])
+
+    def yolo_detect_faces(self, image, imgsz=None, model_set=None):
+        _planted.boxes = getattr(image, 'boxes', None)
+        try:
+            return super().yolo_detect_faces(image, imgsz, model_set)
+        finally:
+            _planted.boxes = None
+
+
+def write_synthetic_weights(out_dir, yolo_cfg='yolov8n.yaml', seed=0):
+    """
+    Случайно инициализированные веса с архитектурами из реестра и манифест
+    к ним. Уже записанные файлы переиспользуются. Возвращает путь манифеста
+    """
+    from ultralytics import YOLO
+    from ultralytics.nn.tasks import DetectionModel
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    torch.manual_seed(seed)
+    manifest = {}
+    for model_name, spec in DEFAULT_MODELS.items():
+        path = out_dir / Path(spec.path).name
+        if not path.exists():
+            if model_name == 'yolo':
+                detector = YOLO(yolo_cfg)
+                args = detector.model.args
+                detector.model = DetectionModel(yolo_cfg, nc=1, verbose=False)
+                detector.model.args, detector.model.task = args, 'detect'
+                detector.model.names = {0: 'face'}
+                detector.save(path)
+            else:
+                model = mobilenet_v3_small(weights=None)
+                model.classifier[3] = nn.Linear(model.classifier[3].in_features, spec.num_classes)
+                torch.save(model.state_dict(), path)
+        manifest[model_name] = {'path': path.name, 'version': f'synthetic-{seed}'}
+
+    manifest_path = out_dir / 'models.json'
+    manifest_path.write_text(json.dumps({'models': manifest}, indent=2), encoding='utf-8')
+    return manifest_path
+
+
+def load_face_images(folder):
+    """Фото лиц (BGR) для вставки в сцены"""
+    faces = []
+    for path in sorted(Path(folder).iterdir()):
+        if path.suffix.lower() in IMAGE_SUFFIXES:
+            image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+            if image is not None:
+                faces.append(image)
+    return faces
+
+
+def synthetic_scene(width, height, face_count, rng, face_images=()):
+    """
+    Сцена с лицами по сетке: текстурированный фон, чтобы пройти проверку
+    качества, и лица в рамках с соотношением сторон 1:1.3
+    """
+    coarse = rng.integers(60, 200, (max(height // 64, 2), max(width // 64, 2), 3), dtype=np.uint8)
+    coarse[..., 2] = np.minimum(coarse[..., 2], BACKGROUND_MAX_RED)
+    image = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+
+    columns = math.ceil(math.sqrt(face_count))
+    rows = math.ceil(face_count / columns)
+    cell_w, cell_h = width / columns, height / rows
+    face_h = 0.7 * min(cell_h, cell_w * 1.3)
+    face_w = face_h / 1.3
+
+    boxes = []
+    for i in range(face_count):
+        cx = (i % columns + 0.5) * cell_w
+        cy = (i // columns + 0.5) * cell_h
+        x1, y1 = int(cx - face_w / 2), int(cy - face_h / 2)
+        x2, y2 = int(cx + face_w / 2), int(cy + face_h / 2)
+        if face_images:
+            face = face_images[(i + int(rng.integers(len(face_images)))) % len(face_images)]
+            image[y1:y2, x1:x2] = cv2.resize(face, (x2 - x1, y2 - y1), interpolation=cv2.INTER_AREA)
+        else:
+            center = (int(cx), int(cy))
+            cv2.ellipse(image, center, (int(face_w / 2), int(face_h / 2)), 0, 0, 360, FACE_COLOR, -1)
+            for side in (-1, 1):
+                eye = (int(cx + side * face_w / 5), int(cy - face_h / 8))
+                cv2.circle(image, eye, max(int(face_w / 14), 2), (50, 40, 40), -1)
+            cv2.ellipse(
+                image, (int(cx), int(cy + face_h / 4)), (int(face_w / 5), max(int(face_h / 20), 1)),
+                0, 0, 360, (90, 90, 170), -1,
+            )
+        boxes.append((x1 / width, y1 / height, x2 / width, y2 / height))
+
+    # Шум даёт резкость, как у настоящей фотографии
+    noise = rng.integers(0, 24, image.shape, dtype=np.uint8)
+    image = cv2.add(cv2.subtract(image, 12), noise)
+
+    encoded = PlantedImage(cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes())
+    encoded.boxes = boxes
+    return encoded
+
+
+@contextlib.contextmanager
+def record_samples(histogram, label):
+    """Сырые наблюдения гистограммы по значению метки, для перцентилей"""
+    samples = defaultdict(list)
+    observe = histogram.observe
+
+    def recording(value, **labels):
+        samples[labels[label]].append(value)
+        observe(value, **labels)
+
+    histogram.observe = recording
+    try:
+        yield samples
+    finally:
+        del histogram.observe
+
+
+def reset_peak_rss():
+    """Сбрасывает пик RSS процесса (VmHWM, Linux >= 4.0)"""
+    try:
+        Path('/proc/self/clear_refs').write_text('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    """Пик RSS с последнего сброса; без /proc - с начала процесса"""
+    try:
+        for line in Path('/proc/self/status').read_text().splitlines():
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def summarize(values):
+    """p50/p95/p99 и среднее в миллисекундах"""
+    values = np.asarray(values) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'p50': float(p50), 'p95': float(p95), 'p99': float(p99),
+        'mean': float(values.mean()), 'count': int(values.size),
+    }
+
+
+async def run_level(pipeline, images, concurrency, requests):
+    """requests вызовов process_image при concurrency одновременных клиентах"""
+    latencies = []
+    outcomes = Counter()
+    indices = iter(range(requests))
+
+    async def client():
+        for i in indices:
+            start = time.perf_counter()
+            try:
+                output = await pipeline.process_image(images[i % len(images)])
+                outcomes['ok' if output['results'] else 'no_faces'] += 1
+            except QualityRejection as e:
+                outcomes[e.reason] += 1
+            latencies.append(time.perf_counter() - start)
+
+    reset_peak_rss()
+    with record_samples(STAGE_SECONDS, 'stage') as stages, record_samples(MODEL_SECONDS, 'model') as models:
+        start = time.perf_counter()
+        await asyncio.gather(*[client() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'latency_ms': summarize(latencies),
+        'throughput': requests / elapsed,
+        'peak_rss_mb': peak_rss_mb(),
+        'outcomes': dict(outcomes),
+        'stages': {name: summarize(values) for name, values in sorted(stages.items())},
+        'models': {name: summarize(values) for name, values in sorted(models.items())},
+    }
+
+
+async def run_benchmark(pipeline, scenarios, concurrency_levels, requests, quiet):
+    report = []
+    with quiet():
+        await pipeline.load_all_models()
+    for scenario in scenarios:
+        with quiet():
+            # Прогон каждой картинки вне замеров: ленивые аллокации и кэши ядер
+            await run_level(pipeline, scenario['images'], 1, len(scenario['images']))
+            levels = [
+                await run_level(pipeline, scenario['images'], concurrency, requests)
+                for concurrency in concurrency_levels
+            ]
+        entry = {key: value for key, value in scenario.items() if key != 'images'}
+        entry['levels'] = levels
+        print_scenario(entry)
+        report.append(entry)
+    return report
+
+
+def print_scenario(entry):
+    print(f"\n{entry['scenario']}")
+    print(f"  {'conc':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'peak MB':>8}  outcomes")
+    for level in entry['levels']:
+        latency = level['latency_ms']
+        outcomes = ', '.join(f'{name}={count}' for name, count in sorted(level['outcomes'].items()))
+        print(
+            f"  {level['concurrency']:>4} {latency['p50']:>9.1f} {latency['p95']:>9.1f} "
+            f"{latency['p99']:>9.1f} {level['throughput']:>8.2f} {level['peak_rss_mb']:>8.0f}  {outcomes}"
+        )
+    # Этапы без конкуренции за CPU - на минимальном уровне параллелизма
+    level = entry['levels'][0]
+    print(f"  stages at concurrency {level['concurrency']}:")
+    for name, stats in [*level['stages'].items(), *level['models'].items()]:
+        print(
+            f"    {name:<28} {stats['p50']:>9.2f} {stats['p95']:>9.2f} {stats['p99']:>9.2f}"
+            f"  (n={stats['count']})"
+        )
+
+
+def find_regressions(report, baseline, tolerance):
+    """Сравнение p95 и пропускной способности с прошлым отчётом"""
+    previous = {
+        (entry['scenario'], level['concurrency']): level
+        for entry in baseline['scenarios'] for level in entry['levels']
+    }
+    regressions = []
+    for entry in report:
+        for level in entry['levels']:
+            old = previous.get((entry['scenario'], level['concurrency']))
+            if old is None:
+                continue
+            where = f"{entry['scenario']} @ {level['concurrency']}"
+            p95, old_p95 = level['latency_ms']['p95'], old['latency_ms']['p95']
+            if p95 > old_p95 * (1 + tolerance):
+                regressions.append(f"{where}: p95 {old_p95:.1f} -> {p95:.1f} ms")
+            if level['throughput'] < old['throughput'] * (1 - tolerance):
+                regressions.append(
+                    f"{where}: throughput {old['throughput']:.2f} -> {level['throughput']:.2f} req/s"
+                )
+    return regressions
+
+
+def parse_resolution(value):
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {value!r}")
+    return width, height
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of ModelPipeline.process_image")
+    parser.add_argument("--weights-dir", default="benchmark_weights", help="where synthetic weights are written")
+    parser.add_argument("--yolo-cfg", default="yolov8n.yaml", help="ultralytics architecture of the detector")
+    parser.add_argument("--faces", help="folder of face photos to paste into the scenes")
+    parser.add_argument("--resolutions", nargs="*", type=parse_resolution,
+                        default=[(640, 480), (1920, 1080), (4032, 3024)])
+    parser.add_argument("--face-counts", nargs="*", type=int, default=[1, 3])
+    parser.add_argument("--concurrency", nargs="*", type=int, default=[1, 4])
+    parser.add_argument("--requests", type=int, default=24, help="requests per concurrency level")
+    parser.add_argument("--variants", type=int, default=4, help="distinct images per scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--baseline", help="previous --json report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--verbose", action="store_true", help="keep the pipeline's own output")
+    args = parser.parse_args()
+
+    if ml_settings.ML_EXECUTOR == 'process':
+        parser.error("ML_EXECUTOR=process is not supported: workers would load a plain pipeline")
+
+    manifest = write_synthetic_weights(Path(args.weights_dir), args.yolo_cfg, args.seed)
+    settings = ml_settings.model_copy(update={
+        'ML_MODEL_REGISTRY': str(manifest),
+        'ML_MODEL_WATCH_INTERVAL': 0.0,
+        'ML_INFERENCE_SERVER_URL': '',
+    })
+
+    def quiet():
+        if args.verbose:
+            return contextlib.nullcontext()
+        return contextlib.redirect_stdout(open(os.devnull, 'w'))
+
+    with quiet():
+        pipeline = BenchmarkPipeline(settings)
+
+    face_images = load_face_images(args.faces) if args.faces else []
+    if args.faces and not face_images:
+        parser.error(f"no images found in {args.faces}")
+    rng = np.random.default_rng(args.seed)
+    scenarios = [
+        {
+            'scenario': f"{width}x{height} faces={face_count}",
+            'resolution': [width, height],
+            'faces': face_count,
+            'images': [
+                synthetic_scene(width, height, face_count, rng, face_images)
+                for _ in range(args.variants)
+            ],
+        }
+        for width, height in args.resolutions
+        for face_count in args.face_counts
+    ]
+
+    config = {
+        'executor': settings.ML_EXECUTOR,
+        'workers': pipeline.executor.workers,
+        'torch_threads': torch.get_num_threads(),
+        'backend': settings.ML_BACKEND,
+        'precision': settings.ML_PRECISION,
+        'fused_heads': settings.ML_FUSED_HEADS,
+        'micro_batching': settings.ML_MICRO_BATCHING,
+        'detection_size': settings.ML_DETECTION_SIZE,
+        'fast_decode': settings.ML_FAST_DECODE,
+        'quality_gate': settings.ML_QUALITY_GATE,
+        'pasted_faces': bool(face_images),
+    }
+    print(' '.join(f'{key}={value}' for key, value in config.items()))
+
+    report = asyncio.run(run_benchmark(
+        pipeline, scenarios, sorted(args.concurrency), args.requests, quiet
+    ))
+    pipeline.executor.shutdown()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': config, 'scenarios': report}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,526 @@
+"""
+Load test of the whole API (app.main:app) with local stand-ins.
+
+    python -m app.tools.loadtest [--rate 10] [--duration 60] [--users 10]
+        [--mix signup=0.05,login=0.1,process=0.25,stream=0.05,create=0.15,history=0.4]
+        [--llm-latency 2.0] [--llm-ttft 0.3] [--llm-tokens 120] [--json out.json]
+    python -m app.tools.loadtest --target http://host:8000 --images DIR [...]
+
+By default the app is started with uvicorn in a child process, with:
+  - a SQLite database in --work-dir (needs aiosqlite), or --database-url
+    (e.g. a local Postgres through asyncpg, for realistic database numbers);
+  - the in-memory object store (STORAGE_BACKEND=memory) instead of MinIO;
+  - a fake OpenAI-compatible LLM served by this process (LLM_BASE_URL),
+    with configurable latency, time to first token and streaming;
+  - randomly initialised models from app.tools.benchmark and a colour-keyed
+    face detector that finds the faces drawn into the synthetic uploads.
+Pipeline settings (ML_EXECUTOR, ML_FUSED_HEADS, ...) are passed through the
+environment. The recommendation cache is off unless --llm-cache is given:
+random classifiers give nearly identical profiles and would hit it.
+
+Requests arrive as a Poisson process at --rate per second and are split by
+--mix between signup, login, /analyses/process, /analyses/process/stream,
+POST /analyses/ and history listing (GET /analyses/). Arrivals beyond
+--max-in-flight are dropped and counted. The report shows, per endpoint,
+throughput, p50/p95/p99 latency, error rate and status codes.
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import cv2
+import httpx
+import numpy as np
+
+from app.tools.benchmark import (
+    BACKGROUND_MAX_RED,
+    FACE_COLOR,
+    IMAGE_SUFFIXES,
+    synthetic_scene,
+    write_synthetic_weights,
+    yolo_results,
+)
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+DEFAULT_MIX = "signup=0.05,login=0.1,process=0.25,stream=0.05,create=0.15,history=0.4"
+
+# Цвет лиц синтетических сцен с запасом на шум и JPEG; по красному каналу
+# диапазон не пересекается с фоном
+FACE_KEY_LOWER = np.array([max(c - 50, 0) for c in FACE_COLOR[:2]] + [BACKGROUND_MAX_RED + 40], np.uint8)
+FACE_KEY_UPPER = np.array([min(c + 50, 255) for c in FACE_COLOR], np.uint8)
+
+LLM_ANSWER = (
+    "Твоя кожа в целом в хорошем состоянии, признаки усталости выражены слабо. "
+    "Старайся спать не меньше восьми часов, пей достаточно воды и используй "
+    "увлажняющий крем утром и вечером. "
+)
+
+
+class KeyedFaceDetector:
+    """
+    Замена YOLO для случайных весов, работающая через HTTP: полный прогон
+    сети ради честного времени, а лица находятся по цвету, которым они
+    нарисованы в синтетических сценах
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, source, **kwargs):
+        self.model.predict(source=source, **{**kwargs, 'verbose': False})
+        mask = cv2.inRange(source, FACE_KEY_LOWER, FACE_KEY_UPPER)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+        min_area = 0.002 * mask.size
+        return yolo_results([
+            [x, y, x + w, y + h]
+            for x, y, w, h, area in stats[1:count]
+            if area >= min_area
+        ])
+
+
+def install_keyed_detector(pipeline):
+    """Подменяет YOLO пайплайна сразу после загрузки, до прогрева"""
+    load = pipeline._load_yolo_model
+
+    def load_with_keyed_detector():
+        load()
+        pipeline.models['yolo'] = KeyedFaceDetector(pipeline.models['yolo'])
+
+    pipeline._load_yolo_model = load_with_keyed_detector
+
+
+def fake_llm_app(latency, ttft, tokens):
+    """OpenAI-совместимый /v1/chat/completions с заданной задержкой"""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI()
+    words = (LLM_ANSWER.split() * (tokens // len(LLM_ANSWER.split()) + 1))[:tokens]
+
+    def chunk(body, delta, finish_reason=None):
+        return {
+            "id": "chatcmpl-loadtest",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "loadtest"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if body.get("stream"):
+            async def events():
+                await asyncio.sleep(ttft)
+                delay = max(latency - ttft, 0) / max(len(words), 1)
+                for i, word in enumerate(words):
+                    if i:
+                        await asyncio.sleep(delay)
+                    yield f"data: {json.dumps(chunk(body, {'content': word + ' '}))}\n\n"
+                yield f"data: {json.dumps(chunk(body, {}, 'stop'))}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(latency)
+        return {
+            "id": "chatcmpl-loadtest",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "loadtest"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(words)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)},
+        }
+
+    return app
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = 0
+        self.dropped = 0
+
+    def record(self, status, seconds):
+        self.latencies.append(seconds)
+        self.statuses[str(status)] += 1
+        if not isinstance(status, int) or status >= 400:
+            self.errors += 1
+
+    def summary(self, elapsed):
+        sent = len(self.latencies)
+        entry = {
+            'sent': sent,
+            'ok': sent - self.errors,
+            'errors': self.errors,
+            'dropped': self.dropped,
+            'error_rate': self.errors / sent if sent else 0.0,
+            'throughput': (sent - self.errors) / elapsed,
+            'statuses': dict(self.statuses),
+        }
+        if sent:
+            p50, p95, p99 = np.percentile(np.asarray(self.latencies) * 1000, [50, 95, 99])
+            entry['latency_ms'] = {'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+        return entry
+
+
+class LoadTest:
+    """Виртуальные пользователи и вызовы эндпоинтов с замером времени"""
+
+    def __init__(self, client, images, repeat_ratio, rng):
+        self.client = client
+        self.images = images
+        self.repeat_ratio = repeat_ratio
+        self.rng = rng
+        self.users = []
+        self.stats = defaultdict(EndpointStats)
+
+    def upload(self):
+        image = self.images[int(self.rng.integers(len(self.images)))]
+        if self.rng.random() >= self.repeat_ratio:
+            # Хвост после конца JPEG не мешает декоду, но даёт новый хэш,
+            # как у настоящих разных фото: кэш результатов промахивается
+            image = image + os.urandom(16)
+        return {'file': ('photo.jpg', image, 'image/jpeg')}
+
+    def user(self):
+        if not self.users:
+            return None
+        return self.users[int(self.rng.integers(len(self.users)))]
+
+    def auth(self, user):
+        return {'Authorization': f"Bearer {user['token']}"}
+
+    async def signup(self):
+        user = {'email': f"load-{uuid.uuid4().hex[:12]}@example.com", 'password': uuid.uuid4().hex}
+        response = await self.client.post(
+            '/auth/signup', json={'email': user['email'], 'password': user['password']}
+        )
+        if response.status_code == 200:
+            user['token'] = response.json()['access_token']
+            self.users.append(user)
+        return response.status_code
+
+    async def login(self):
+        user = self.user()
+        if user is None:
+            return 'no_user'
+        response = await self.client.post(
+            '/auth/login', json={'email': user['email'], 'password': user['password']}
+        )
+        if response.status_code == 200:
+            user['token'] = response.json()['access_token']
+        return response.status_code
+
+    async def process(self):
+        response = await self.client.post('/analyses/process', files=self.upload())
+        return response.status_code
+
+    async def stream(self):
+        async with self.client.stream('POST', '/analyses/process/stream', files=self.upload()) as response:
+            body = b''.join([chunk async for chunk in response.aiter_bytes()])
+        if response.status_code == 200 and b'event: error' in body:
+            return 'stream_error'
+        return response.status_code
+
+    async def create(self):
+        user = self.user()
+        if user is None:
+            return 'no_user'
+        response = await self.client.post(
+            '/analyses/',
+            headers=self.auth(user),
+            files=self.upload(),
+            data={
+                'recommendations': LLM_ANSWER,
+                'puffiness': 20, 'dark_circles': 30, 'fatigue': 25, 'acne': 10,
+                'skin_condition': 'normal', 'eyes_health': 80, 'skin_health': 75,
+            },
+        )
+        return response.status_code
+
+    async def history(self):
+        user = self.user()
+        if user is None:
+            return 'no_user'
+        response = await self.client.get('/analyses/', headers=self.auth(user))
+        return response.status_code
+
+    async def call(self, name):
+        start = time.perf_counter()
+        try:
+            status = await getattr(self, name)()
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        self.stats[name].record(status, time.perf_counter() - start)
+
+    async def drive(self, rate, duration, mix, max_in_flight):
+        """Открытая модель нагрузки: пуассоновский поток запросов"""
+        names = list(mix)
+        weights = np.array([mix[name] for name in names], dtype=float)
+        weights /= weights.sum()
+        loop = asyncio.get_running_loop()
+        tasks = set()
+        start = next_at = loop.time()
+        while True:
+            next_at += self.rng.exponential(1 / rate)
+            if next_at - start > duration:
+                break
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+            name = names[self.rng.choice(len(names), p=weights)]
+            if len(tasks) >= max_in_flight:
+                self.stats[name].dropped += 1
+                continue
+            task = asyncio.create_task(self.call(name))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        return loop.time() - start
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('signup', 'login', 'process', 'stream', 'create', 'history'):
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r}")
+        mix[name] = float(weight)
+    if sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError("mix weights must add up to more than 0")
+    return mix
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve(args):
+    """Дочерний процесс: таблицы в базе, подмена детектора и uvicorn"""
+    import uvicorn
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from app.db import models  # noqa: F401 - регистрирует таблицы в Base.metadata
+    from app.db.base import Base
+
+    async def create_tables():
+        engine = create_async_engine(os.environ['DATABASE_URL'])
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        await engine.dispose()
+
+    asyncio.run(create_tables())
+
+    from app.main import app
+    from app.services.ml_pipeline import pipeline
+    if args.keyed_detector:
+        install_keyed_detector(pipeline)
+    uvicorn.run(app, host='127.0.0.1', port=args.port, log_level='warning')
+
+
+def start_server(args, work_dir, llm_port):
+    """Запускает приложение в дочернем процессе, вывод пишется в server.log"""
+    (work_dir / 'media').mkdir(parents=True, exist_ok=True)
+    port = free_port()
+    env = dict(os.environ)
+    for name in (
+        'POSTGRES_SERVER', 'POSTGRES_USER', 'POSTGRES_PASSWORD', 'POSTGRES_DB',
+        'POSTGRES_PORT', 'PGDATA', 'SECRET_KEY', 'MINIO_ENDPOINT', 'MINIO_ACCESS_KEY',
+        'MINIO_SECRET_KEY', 'MINIO_BUCKET', 'MINIO_ROOT_PASSWORD', 'MINIO_ROOT_USER',
+        'INTERNAL_API_KEY',
+    ):
+        env.setdefault(name, 'loadtest')
+    env.setdefault('MINIO_PUBLIC_URL', '')
+    env.update({
+        'PYTHONPATH': os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get('PYTHONPATH')])),
+        'DATABASE_URL': args.database_url or f"sqlite+aiosqlite:///{(work_dir / 'loadtest.db').resolve()}",
+        'STORAGE_BACKEND': 'memory',
+        'LLM_BASE_URL': f'http://127.0.0.1:{llm_port}/v1',
+        'LLM_API_KEY': 'loadtest',
+        'ML_INFERENCE_SERVER_URL': '',
+        'ML_MODEL_WATCH_INTERVAL': '0',
+    })
+    if not args.llm_cache:
+        env['LLM_CACHE_SIZE'] = '0'
+    command = [sys.executable, '-m', 'app.tools.loadtest', '--serve', '--port', str(port)]
+    if not args.real_models:
+        env['ML_MODEL_REGISTRY'] = str(write_synthetic_weights(work_dir / 'weights').resolve())
+        command.append('--keyed-detector')
+
+    log = open(work_dir / 'server.log', 'w')
+    process = subprocess.Popen(command, cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return process, f'http://127.0.0.1:{port}'
+
+
+async def wait_ready(client, process, timeout):
+    """Ждёт, пока /ready ответит 200 (модели загружены и прогреты)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError("server exited during startup, see server.log")
+        try:
+            if (await client.get('/ready')).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"server not ready after {timeout:.0f} s")
+
+
+def load_images(args, rng):
+    if args.images:
+        images = [
+            path.read_bytes() for path in sorted(Path(args.images).iterdir())
+            if path.suffix.lower() in IMAGE_SUFFIXES
+        ]
+        if not images:
+            raise SystemExit(f"no images found in {args.images}")
+        return images
+    width, height = args.resolution
+    return [synthetic_scene(width, height, 1, rng) for _ in range(8)]
+
+
+async def run(args, base_url, process, llm_port):
+    import uvicorn
+
+    llm_server = None
+    if llm_port is not None:
+        llm_server = uvicorn.Server(uvicorn.Config(
+            fake_llm_app(args.llm_latency, args.llm_ttft, args.llm_tokens),
+            host='127.0.0.1', port=llm_port, log_level='warning',
+        ))
+        llm_task = asyncio.create_task(llm_server.serve())
+
+    rng = np.random.default_rng(args.seed)
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        await wait_ready(client, process, args.startup_timeout)
+        test = LoadTest(client, load_images(args, rng), args.repeat_ratio, rng)
+        await asyncio.gather(*[test.signup() for _ in range(args.users)])
+        print(f"{len(test.users)}/{args.users} users signed up, "
+              f"{args.rate} req/s for {args.duration:.0f} s")
+
+        elapsed = await test.drive(args.rate, args.duration, args.mix, args.max_in_flight)
+
+        server_metrics = None
+        if args.server_metrics:
+            server_metrics = (await client.get('/metrics')).text
+
+    if llm_server is not None:
+        llm_server.should_exit = True
+        await llm_task
+    return test, elapsed, server_metrics
+
+
+def print_report(report):
+    print(f"\n{'endpoint':<10} {'sent':>6} {'ok':>6} {'err %':>6} {'drop':>5} {'ok/s':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for name, entry in report['endpoints'].items():
+        latency = entry.get('latency_ms', {'p50': 0, 'p95': 0, 'p99': 0})
+        statuses = ', '.join(f'{status}={count}' for status, count in sorted(entry['statuses'].items()))
+        print(
+            f"{name:<10} {entry['sent']:>6} {entry['ok']:>6} {entry['error_rate']:>6.1%} "
+            f"{entry['dropped']:>5} {entry['throughput']:>7.2f} {latency['p50']:>8.0f} "
+            f"{latency['p95']:>8.0f} {latency['p99']:>8.0f}  {statuses}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the API with local stand-ins")
+    parser.add_argument("--target", help="base URL of a running deployment; no stand-ins are started")
+    parser.add_argument("--images", help="folder of photos to upload instead of synthetic scenes")
+    parser.add_argument("--real-models", action="store_true",
+                        help="use the configured checkpoints instead of synthetic weights")
+    parser.add_argument("--work-dir", default="loadtest_run", help="database, weights and server.log")
+    parser.add_argument("--database-url", help="async SQLAlchemy URL (default: SQLite in --work-dir)")
+    parser.add_argument("--rate", type=float, default=10.0, help="requests per second")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds")
+    parser.add_argument("--users", type=int, default=10, help="users signed up before the run")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--repeat-ratio", type=float, default=0.0,
+                        help="share of uploads that repeat earlier bytes (result cache hits)")
+    parser.add_argument("--resolution", type=lambda v: tuple(int(p) for p in v.split('x')), default=(1280, 960))
+    parser.add_argument("--llm-latency", type=float, default=2.0, help="seconds to the full answer")
+    parser.add_argument("--llm-ttft", type=float, default=0.3, help="seconds to the first streamed token")
+    parser.add_argument("--llm-tokens", type=int, default=120)
+    parser.add_argument("--llm-cache", action="store_true", help="keep the recommendation cache on")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--server-metrics", help="save the server's /metrics after the run")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--keyed-detector", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    process = llm_port = None
+    if args.target:
+        base_url = args.target.rstrip('/')
+    else:
+        from app.core.ml_config import ml_settings
+        if ml_settings.ML_EXECUTOR == 'process' and not args.real_models:
+            parser.error("ML_EXECUTOR=process needs --real-models: workers would load the plain detector")
+        if not args.database_url and importlib.util.find_spec("aiosqlite") is None:
+            parser.error("the default SQLite database needs aiosqlite: pip install aiosqlite, or pass --database-url")
+        work_dir = Path(args.work_dir)
+        llm_port = free_port()
+        process, base_url = start_server(args, work_dir, llm_port)
+
+    try:
+        test, elapsed, server_metrics = asyncio.run(run(args, base_url, process, llm_port))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    endpoints = {name: test.stats[name].summary(elapsed) for name in args.mix if name in test.stats}
+    total = EndpointStats()
+    for stats in test.stats.values():
+        total.latencies += stats.latencies
+        total.statuses.update(stats.statuses)
+        total.errors += stats.errors
+        total.dropped += stats.dropped
+    endpoints['total'] = total.summary(elapsed)
+    report = {
+        'config': {
+            'target': args.target, 'rate': args.rate, 'duration': args.duration,
+            'mix': args.mix, 'users': args.users, 'repeat_ratio': args.repeat_ratio,
+            'llm_latency': args.llm_latency, 'llm_ttft': args.llm_ttft, 'llm_cache': args.llm_cache,
+        },
+        'elapsed': elapsed,
+        'endpoints': endpoints,
+    }
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if server_metrics is not None:
+        Path(args.server_metrics).write_text(server_metrics)
+
+
+if __name__ == "__main__":
+    main()
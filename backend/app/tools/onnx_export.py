@@ -0,0 +1,138 @@
+"""
+Export YOLO and the MobileNet classifiers to ONNX and check parity.
+
+    python -m app.tools.onnx_export [--out-dir app/onnx] [--images DIR]
+
+Writes <model_name>.onnx for every entry of ModelPipeline.model_configs,
+then loads them through the ONNX Runtime backend (ML_BACKEND=onnx) and
+compares its outputs with eager torch on random inputs and, if given, on
+the face images in --images. Exits with status 1 if parity fails.
+
+Requires the `onnx` and `onnxruntime` packages.
+"""
+
+import argparse
+import asyncio
+import shutil
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+from app.core.ml_config import ml_settings
+from app.services.ml_pipeline import ModelPipeline
+from app.services.onnx_backend import export_classifier
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+
+
+def build_pipeline(backend, onnx_dir):
+    settings = ml_settings.model_copy(update={
+        'ML_BACKEND': backend,
+        'ML_ONNX_DIR': str(onnx_dir),
+        'ML_EXECUTOR': 'inline',
+        'ML_MICRO_BATCHING': False,
+        'ML_FUSED_HEADS': False,
+        # Parity samples are small crops, not photos the gate is meant for
+        'ML_QUALITY_GATE': False,
+    })
+    pipeline = ModelPipeline(settings)
+    asyncio.run(pipeline.load_all_models())
+    return pipeline
+
+
+def export_all(pipeline, out_dir, skip_yolo=False):
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    for model_name in pipeline.classifier_names:
+        path = pipeline.onnx_path(model_name)
+        export_classifier(pipeline.models[model_name]['model'], path)
+        print(f"✅ {model_name} -> {path}")
+
+    if not skip_yolo:
+        exported = pipeline.models['yolo'].export(format='onnx', imgsz=640)
+        shutil.move(exported, pipeline.onnx_path('yolo'))
+        print(f"✅ yolo -> {pipeline.onnx_path('yolo')}")
+
+
+def list_images(images_dir):
+    if not images_dir:
+        return []
+    return sorted(
+        path for path in Path(images_dir).iterdir()
+        if path.suffix.lower() in IMAGE_SUFFIXES
+    )
+
+
+def check_classifiers(torch_pipeline, onnx_pipeline, images, atol):
+    """Максимальное расхождение вероятностей и совпадение top-1 по каждой модели"""
+    generator = torch.Generator().manual_seed(0)
+    inputs = [torch.randn(4, 3, 224, 224, generator=generator)]
+    for path in images:
+        image = cv2.cvtColor(cv2.imread(str(path)), cv2.COLOR_BGR2RGB)
+        inputs.append(torch_pipeline.preprocess_crop(image))
+
+    ok = True
+    for model_name in torch_pipeline.classifier_names:
+        max_diff = 0.0
+        agree = total = 0
+        for input_tensor in inputs:
+            with torch.no_grad():
+                expected = torch.softmax(torch_pipeline.models[model_name]['model'](input_tensor), dim=1)
+            actual = torch.softmax(onnx_pipeline.models[model_name]['model'](input_tensor), dim=1)
+            max_diff = max(max_diff, (expected - actual).abs().max().item())
+            agree += (expected.argmax(1) == actual.argmax(1)).sum().item()
+            total += input_tensor.shape[0]
+
+        passed = max_diff <= atol and agree == total
+        ok = ok and passed
+        marker = "✅" if passed else "❌"
+        print(f"{marker} {model_name}: max |Δp| = {max_diff:.2e}, top-1 {agree}/{total}")
+    return ok
+
+
+def check_yolo(torch_pipeline, onnx_pipeline, images, pixel_tolerance=4):
+    """Число найденных лиц и сдвиг рамок на тестовых изображениях"""
+    ok = True
+    for path in images:
+        expected, _ = torch_pipeline.yolo_detect_faces(str(path))
+        actual, _ = onnx_pipeline.yolo_detect_faces(str(path))
+        max_shift = max(
+            (
+                np.abs(np.subtract(e['bbox'], a['bbox'])).max()
+                for e, a in zip(expected, actual)
+            ),
+            default=0,
+        )
+        passed = len(expected) == len(actual) and max_shift <= pixel_tolerance
+        ok = ok and passed
+        marker = "✅" if passed else "❌"
+        print(f"{marker} yolo {path.name}: faces {len(actual)}/{len(expected)}, max bbox shift {max_shift}px")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export models to ONNX and check parity")
+    parser.add_argument("--out-dir", type=Path, default=None, help="default: app/onnx")
+    parser.add_argument("--images", help="folder with sample face photos for the parity check")
+    parser.add_argument("--atol", type=float, default=1e-4, help="max allowed probability difference")
+    parser.add_argument("--skip-yolo", action="store_true")
+    args = parser.parse_args()
+
+    torch_pipeline = build_pipeline('torch', args.out_dir or '')
+    export_all(torch_pipeline, torch_pipeline.onnx_dir, skip_yolo=args.skip_yolo)
+
+    onnx_pipeline = build_pipeline('onnx', torch_pipeline.onnx_dir)
+    images = list_images(args.images)
+    ok = check_classifiers(torch_pipeline, onnx_pipeline, images, args.atol)
+    if not args.skip_yolo:
+        ok = check_yolo(torch_pipeline, onnx_pipeline, images) and ok
+
+    print("🎉 Паритет подтверждён" if ok else "❌ Паритет нарушен")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
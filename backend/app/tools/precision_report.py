@@ -0,0 +1,114 @@
+"""
+Compare reduced-precision classifier variants against fp32.
+
+    python -m app.tools.precision_report --calibration DIR [--images DIR]
+        [--models mobilenet_age ...] [--precisions bf16 int8] [--json out.json]
+
+For every classifier and precision the report shows top-1 class agreement
+with fp32, mean/max probability drift and the measured latency speedup on
+the evaluation images (--images, defaults to the calibration folder).
+Use it to pick ML_PRECISION per model.
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import time
+
+import torch
+
+from app.core.ml_config import ml_settings
+from app.services.ml_pipeline import ModelPipeline
+from app.services.precision import apply_precision, load_calibration_batches
+
+
+def measure_latency(model, batches, repeats=3):
+    """Среднее время на изображение в миллисекундах"""
+    with torch.no_grad():
+        model(batches[0])  # прогрев
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for batch in batches:
+                model(batch)
+        elapsed = time.perf_counter() - start
+    images = sum(batch.shape[0] for batch in batches) * repeats
+    return elapsed / images * 1000
+
+
+def compare(reference, candidate, batches):
+    """Совпадение top-1 и дрейф вероятностей относительно fp32"""
+    agree = total = 0
+    drifts = []
+    with torch.no_grad():
+        for batch in batches:
+            expected = torch.softmax(reference(batch), dim=1)
+            actual = torch.softmax(candidate(batch), dim=1)
+            agree += (expected.argmax(1) == actual.argmax(1)).sum().item()
+            total += batch.shape[0]
+            drifts.append((expected - actual).abs().amax(dim=1))
+    drift = torch.cat(drifts)
+    return {
+        'agreement': agree / total,
+        'mean_drift': drift.mean().item(),
+        'max_drift': drift.max().item(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy/latency report for reduced precision")
+    parser.add_argument("--calibration", required=True, help="folder of face photos for int8 calibration")
+    parser.add_argument("--images", help="evaluation folder (default: the calibration folder)")
+    parser.add_argument("--limit", type=int, default=256, help="max evaluation images")
+    parser.add_argument("--models", nargs="*", default=None)
+    parser.add_argument("--precisions", nargs="*", default=['bf16', 'int8'])
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    pipeline = ModelPipeline(ml_settings.model_copy(update={
+        'ML_BACKEND': 'torch',
+        'ML_PRECISION': {},
+        'ML_FUSED_HEADS': False,
+        'ML_EXECUTOR': 'inline',
+        'ML_MICRO_BATCHING': False,
+    }))
+    model_names = args.models or pipeline.classifier_names
+    for model_name in model_names:
+        asyncio.run(pipeline.load_mobilenet_model(model_name))
+
+    calibration = load_calibration_batches(pipeline, args.calibration, limit=args.limit)
+    evaluation = load_calibration_batches(pipeline, args.images or args.calibration, limit=args.limit)
+    if not evaluation:
+        parser.error("no images found for evaluation")
+
+    report = []
+    print(f"{'model':<28} {'precision':<9} {'top-1':>7} {'mean Δp':>9} {'max Δp':>9} {'ms/img':>8} {'speedup':>8}")
+    for model_name in model_names:
+        reference = pipeline.models[model_name]['model']
+        reference_ms = measure_latency(reference, evaluation)
+        print(f"{model_name:<28} {'fp32':<9} {1:>7.1%} {0:>9.4f} {0:>9.4f} {reference_ms:>8.2f} {1:>7.2f}x")
+
+        for precision in args.precisions:
+            # apply_precision может изменить модель на месте, поэтому берём копию
+            candidate = apply_precision(copy.deepcopy(reference), precision, calibration)
+            row = {
+                'model': model_name,
+                'precision': precision,
+                **compare(reference, candidate, evaluation),
+                'ms_per_image': measure_latency(candidate, evaluation),
+                'fp32_ms_per_image': reference_ms,
+            }
+            row['speedup'] = reference_ms / row['ms_per_image']
+            report.append(row)
+            print(
+                f"{'':<28} {precision:<9} {row['agreement']:>7.1%} {row['mean_drift']:>9.4f} "
+                f"{row['max_drift']:>9.4f} {row['ms_per_image']:>8.2f} {row['speedup']:>7.2f}x"
+            )
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
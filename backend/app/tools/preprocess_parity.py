@@ -0,0 +1,87 @@
+"""
+Check that CropPreprocessor matches the reference torchvision transform.
+
+    python -m app.tools.preprocess_parity [--images DIR] [--samples 50]
+
+Feeds random crops of many sizes (and, optionally, real face photos) through
+ModelPipeline.transform (PIL Resize -> CenterCrop -> ToTensor -> Normalize)
+and through the vectorized ModelPipeline.preprocessor. Pillow and torch use
+different fixed-point precision in the resize kernel, so on high-frequency
+content a pixel may differ by up to two uint8 steps; the mean difference
+must stay negligible. Exits with status 1 on
+mismatch.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.services.ml_pipeline import ModelPipeline
+from app.services.preprocessing import IMAGENET_STD
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+# Две ступени uint8 после нормализации самого узкого канала
+MAX_DIFF = 2.0 / (255.0 * min(IMAGENET_STD))
+
+
+def sample_crops(samples, images_dir=None):
+    rng = np.random.default_rng(0)
+    crops = []
+    for _ in range(samples):
+        height, width = rng.integers(48, 1600, size=2)
+        noise = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        # Размытие делает шум похожим на гладкие участки реальных фото
+        crops.append(cv2.GaussianBlur(noise, (0, 0), sigmaX=float(rng.uniform(0.5, 4))))
+
+    if images_dir:
+        crops.extend(load_images(images_dir))
+    return crops
+
+
+def load_images(images_dir):
+    """RGB изображения из папки"""
+    images = []
+    for path in sorted(Path(images_dir).iterdir()):
+        if path.suffix.lower() in IMAGE_SUFFIXES:
+            image = cv2.imread(str(path))
+            if image is not None:
+                images.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    return images
+
+
+def compare_preprocessing(pipeline, face_crops):
+    """Худшие max |Δ| и mean |Δ| между эталонным transform и preprocessor"""
+    worst_max = worst_mean = 0.0
+    for face_crop in face_crops:
+        expected = pipeline.transform(Image.fromarray(face_crop))
+        actual = pipeline.preprocessor([face_crop])[0]
+        diff = (expected - actual).abs()
+        worst_max = max(worst_max, diff.max().item())
+        worst_mean = max(worst_mean, diff.mean().item())
+    return worst_max, worst_mean
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocessing parity check")
+    parser.add_argument("--images", help="folder with face crops to include")
+    parser.add_argument("--samples", type=int, default=50, help="random crops to test")
+    parser.add_argument("--max-mean-diff", type=float, default=1e-3)
+    args = parser.parse_args()
+
+    pipeline = ModelPipeline()
+    worst_max, worst_mean = compare_preprocessing(
+        pipeline, sample_crops(args.samples, args.images)
+    )
+
+    ok = worst_max <= MAX_DIFF + 1e-5 and worst_mean <= args.max_mean_diff
+    print(f"max |Δ| = {worst_max:.5f} (допуск {MAX_DIFF:.5f}), max mean |Δ| = {worst_mean:.2e}")
+    print("✅ Предобработка совпадает с эталоном" if ok else "❌ Предобработка расходится с эталоном")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
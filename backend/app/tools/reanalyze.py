@@ -0,0 +1,236 @@
+"""
+Recompute the stored metrics of past analyses with the current models.
+
+    python -m app.tools.reanalyze [--page-size 128] [--prefetch 16]
+        [--executor process] [--workers 0] [--classify-batch 32] [--rate 0]
+        [--checkpoint reanalyze.checkpoint.json] [--restart] [--all] [--dry-run]
+
+Rows of the `analyses` table that have an image are read in
+keyset-paged batches in id order.
+While one page is analysed, the images of the next page are already being
+downloaded from settings.MINIO_BUCKET, --prefetch at a time. Detection and
+classification run on a pool of --workers processes (ML_EXECUTOR=process)
+and faces of concurrent images share classifier batches of up to
+--classify-batch (ML_MICRO_BATCHING). The diagram columns and
+model_version of each page are written back with one bulk UPDATE; the
+LLM text (recommendations, skin_condition) is left as it is.
+
+By default only rows whose model_version differs from the loaded models
+are recomputed; --all recomputes every row. After each committed page the
+last id is written to --checkpoint, and a restarted run resumes after it
+as long as the model version has not changed. --rate caps images per
+second (downloads and inference) to spare the bucket and the database.
+Rows that fail (missing object, undecodable, no faces) keep their old
+values and are listed in the log.
+
+Needs the same environment as the API (DATABASE_URL, MINIO_*).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
+from app.core.ml_config import ml_settings
+from app.crud import analysis as crud_analysis
+from app.db.session import async_session_maker, engine
+from app.services.ml_pipeline import ModelPipeline
+from app.services.scoring import score_results
+from app.services.storage import storage_service
+
+# Колонки таблицы analyses и показатели диаграммы, из которых они берутся
+COLUMN_METRICS = {
+    'puffiness': 'swelling',
+    'dark_circles': 'eyes_darkcircles',
+    'fatigue': 'tireness',
+    'acne': 'acne',
+    'eyes_health': 'eyes_health',
+    'skin_health': 'skin_health',
+}
+
+
+class RateLimiter:
+    """Равномерно распределяет события, не больше rate в секунду (0 - без ограничения)"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def load_checkpoint(path, model_version, restart):
+    """Состояние прошлого запуска, если он считал той же версией моделей"""
+    state = {'model_version': model_version, 'last_id': 0, 'updated': 0, 'failed': 0}
+    if restart or not path.exists():
+        return state
+    saved = json.loads(path.read_text())
+    if saved.get('model_version') != model_version:
+        print(f"⚠️ Чекпоинт {path} записан другой версией моделей, начинаем сначала")
+        return state
+    print(f"↩️ Продолжаем после id {saved['last_id']}")
+    return {**state, **saved}
+
+
+def save_checkpoint(path, state):
+    """Атомарная запись: прерванный запуск не оставит обрезанный файл"""
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_text(json.dumps({**state, 'saved_at': time.time()}, indent=2))
+    os.replace(tmp_path, path)
+
+
+async def download(image_path, limiter, semaphore):
+    """Байты изображения из бакета; ошибка возвращается, а не выбрасывается"""
+    async with semaphore:
+        await limiter.wait()
+        try:
+            return await asyncio.to_thread(
+                storage_service.download_file, storage_service.object_name(image_path)
+            )
+        except Exception as e:
+            return e
+
+
+def prefetch(rows, limiter, semaphore):
+    """Запускает загрузку изображений страницы, не дожидаясь её"""
+    return [
+        (analysis_id, asyncio.create_task(download(image_path, limiter, semaphore)))
+        for analysis_id, image_path in rows
+    ]
+
+
+async def analyse_row(pipeline, analysis_id, image_task):
+    """Новые значения колонок одной строки"""
+    image_bytes = await image_task
+    if isinstance(image_bytes, Exception):
+        raise image_bytes
+    output = await pipeline.process_image(image_bytes)
+    if not output['results']:
+        raise ValueError("лица не обнаружены")
+    metrics = score_results(pipeline, output['results'])
+    return {
+        'id': analysis_id,
+        'model_version': output['model_version'],
+        **{column: metrics[metric] for column, metric in COLUMN_METRICS.items()},
+    }
+
+
+async def fetch_page(after_id, args, model_version):
+    async with async_session_maker() as db:
+        return await crud_analysis.get_analyses_page(
+            db,
+            after_id=after_id,
+            limit=args.page_size,
+            exclude_model_version=None if args.all else model_version,
+        )
+
+
+def build_pipeline(args):
+    settings = ml_settings.model_copy(update={
+        'ML_EXECUTOR': args.executor,
+        'ML_EXECUTOR_WORKERS': args.workers or ml_settings.ML_EXECUTOR_WORKERS,
+        'ML_MICRO_BATCHING': True,
+        'ML_MICRO_BATCH_SIZE': args.classify_batch,
+        'ML_MICRO_BATCH_WAIT_MS': 20.0,
+        # Сохранённые анализы уже были приняты, повторно не отсеиваем
+        'ML_QUALITY_GATE': False,
+        'ML_INFERENCE_SERVER_URL': '',
+        'ML_MODEL_WATCH_INTERVAL': 0.0,
+    })
+    return ModelPipeline(settings)
+
+
+async def reanalyse(args):
+    pipeline = build_pipeline(args)
+    await pipeline.load_all_models()
+    model_version = pipeline.model_version_key()
+    print(f"🧬 Версия моделей: {model_version}")
+
+    checkpoint = Path(args.checkpoint)
+    state = load_checkpoint(checkpoint, model_version, args.restart)
+    limiter = RateLimiter(args.rate)
+    semaphore = asyncio.Semaphore(args.prefetch)
+    start = time.perf_counter()
+    processed = 0
+
+    try:
+        rows = await fetch_page(state['last_id'], args, model_version)
+        page = prefetch(rows, limiter, semaphore)
+        while page:
+            # Следующая страница качается, пока считается текущая
+            next_rows = await fetch_page(rows[-1][0], args, model_version)
+            next_page = prefetch(next_rows, limiter, semaphore)
+
+            outcomes = await asyncio.gather(
+                *(analyse_row(pipeline, analysis_id, task) for analysis_id, task in page),
+                return_exceptions=True,
+            )
+            updates = []
+            for (analysis_id, _), outcome in zip(page, outcomes):
+                if isinstance(outcome, Exception):
+                    print(f"   ❌ id {analysis_id}: {type(outcome).__name__}: {outcome}")
+                    state['failed'] += 1
+                else:
+                    updates.append(outcome)
+
+            if not args.dry_run:
+                async with async_session_maker() as db:
+                    await crud_analysis.bulk_update_analyses(db, rows=updates)
+            state['updated'] += len(updates)
+            state['last_id'] = rows[-1][0]
+            if not args.dry_run:
+                save_checkpoint(checkpoint, state)
+
+            processed += len(page)
+            elapsed = time.perf_counter() - start
+            print(
+                f"📦 до id {state['last_id']}: обновлено {state['updated']}, "
+                f"ошибок {state['failed']}, {processed / elapsed:.1f} изобр/с"
+            )
+            rows, page = next_rows, next_page
+    finally:
+        if pipeline.scheduler is not None:
+            await pipeline.scheduler.stop()
+        pipeline.executor.shutdown()
+        await engine.dispose()
+
+    print(f"🎉 Готово: обновлено {state['updated']}, ошибок {state['failed']}")
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--page-size', type=int, default=128,
+                        help='rows per keyset page and per bulk UPDATE')
+    parser.add_argument('--prefetch', type=int, default=16,
+                        help='concurrent object downloads')
+    parser.add_argument('--executor', choices=['process', 'thread'], default='process')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='inference workers, 0 = ML_EXECUTOR_WORKERS')
+    parser.add_argument('--classify-batch', type=int, default=32,
+                        help='faces per classifier batch')
+    parser.add_argument('--rate', type=float, default=0.0,
+                        help='max images per second, 0 = unlimited')
+    parser.add_argument('--checkpoint', default='reanalyze.checkpoint.json')
+    parser.add_argument('--restart', action='store_true',
+                        help='ignore the checkpoint and start from the first row')
+    parser.add_argument('--all', action='store_true',
+                        help='also recompute rows already at the current model version')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='analyse without writing rows or the checkpoint')
+    args = parser.parse_args()
+
+    asyncio.run(reanalyse(args))
+
+
+if __name__ == '__main__':
+    main()
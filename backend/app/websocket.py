@@ -2,9 +2,13 @@
 
 from fastapi import WebSocket, WebSocketDisconnect, Query, status
 from typing import Dict
+import asyncio
 import json
 
+from app.core.ml_config import ml_settings
 from app.db.models import User
+from app.services.frame_stream import FrameStreamSession
+from app.services.ml_pipeline import RemotePipeline, get_pipeline
 
 # ВНИМАНИЕ: В этой версии отсутствует какая-либо аутентификация.
 # Любой пользователь, знающий user_id, может подключиться к WebSocket.
@@ -72,3 +76,71 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int = Query(...)):
         # Любая другая ошибка
         print(f"Критическая ошибка WebSocket для пользователя {user_id}: {e}")
         connection_manager.disconnect(user_id)
+
+
+# Активные сессии потокового анализа кадров
+frame_stream_sessions: set = set()
+
+
+async def frame_stream_endpoint(websocket: WebSocket, detection_tier: str | None = Query(None)):
+    """
+    Потоковый анализ кадров камеры (/ws/frames).
+    Клиент шлёт кадры (JPEG) бинарными сообщениями, сервер отвечает на
+    каждый обработанный кадр JSON сообщением {"type": "frame", ...} с
+    треками лиц и сглаженными результатами или {"type": "quality", ...},
+    если кадр непригоден. Кадры, пришедшие во время анализа, кроме
+    последнего, отбрасываются.
+    """
+    pipeline = get_pipeline()
+    imgsz = None
+    if detection_tier is not None:
+        imgsz = ml_settings.ML_DETECTION_TIERS.get(detection_tier)
+        if imgsz is None:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+    if isinstance(pipeline, RemotePipeline):
+        # Трекинг и классификация отдельных лиц требуют моделей в этом процессе
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+        return
+    if not pipeline.ready or len(frame_stream_sessions) >= ml_settings.ML_STREAM_MAX_SESSIONS:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+
+    await websocket.accept()
+    session = FrameStreamSession(pipeline, ml_settings, imgsz)
+    frame_stream_sessions.add(session)
+
+    async def receive_frames():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                if len(message["bytes"]) > ml_settings.ML_STREAM_MAX_FRAME_BYTES:
+                    await websocket.send_text(json.dumps({"type": "error", "detail": "Frame is too large"}))
+                    continue
+                session.submit(message["bytes"])
+            elif message.get("text") == "ping":
+                await websocket.send_text("pong")
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while True:
+            next_frame = asyncio.create_task(session.next_frame())
+            await asyncio.wait({receiver, next_frame}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_frame.done():
+                # Клиент отключился
+                next_frame.cancel()
+                break
+            try:
+                message = await session.process(*next_frame.result())
+            except ValueError:
+                message = {"type": "error", "detail": "Could not decode the frame"}
+            await websocket.send_text(json.dumps(message, ensure_ascii=False))
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Ошибка потокового анализа кадров: {e}")
+    finally:
+        receiver.cancel()
+        frame_stream_sessions.discard(session)
@@ -0,0 +1,106 @@
+import os
+
+# app.core.config reads these at import time; the API tests only need them
+# to exist. Storage is in memory and no database is touched.
+for name in (
+    "POSTGRES_SERVER", "POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB",
+    "POSTGRES_PORT", "PGDATA", "SECRET_KEY", "MINIO_ENDPOINT", "MINIO_ACCESS_KEY",
+    "MINIO_SECRET_KEY", "MINIO_BUCKET", "MINIO_ROOT_PASSWORD", "MINIO_ROOT_USER",
+    "MINIO_PUBLIC_URL", "INTERNAL_API_KEY",
+):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+from app.core.ml_config import ml_settings  # noqa: E402
+from app.services.model_registry import ModelRegistry  # noqa: E402
+from app.services.quality import QualityRejection  # noqa: E402
+
+NO_FACES = b"no faces"
+BLURRY = b"blurry"
+UNDECODABLE = b"undecodable"
+
+
+class FakePipeline:
+    """
+    Stand-in for ModelPipeline in API tests: every image has one healthy
+    face, except the NO_FACES, BLURRY and UNDECODABLE payloads.
+    """
+
+    ready = True
+    settings = ml_settings
+
+    def __init__(self):
+        self.model_configs = ModelRegistry().model_configs()
+        self.classifier_names = [name for name in self.model_configs if name != "yolo"]
+        self.images = []
+
+    def model_version_key(self):
+        return "v1"
+
+    def classification(self, model_name):
+        class_names = self.model_configs[model_name]["class_names"]
+        probabilities = np.zeros(len(class_names), dtype=np.float32)
+        probabilities[0] = 1.0
+        return {
+            "model": model_name,
+            "predicted_class": 0,
+            "class_name": class_names[0],
+            "confidence": 1.0,
+            "all_probabilities": probabilities,
+        }
+
+    async def process_image(self, image, on_faces_detected=None, imgsz=None):
+        self.images.append(image)
+        if image == UNDECODABLE:
+            raise ValueError("Could not decode the image")
+        if image == BLURRY:
+            raise QualityRejection("blurry", "The photo is blurry", {"sharpness": 1.0})
+        output = {"results": [], "model_version": "v1", "filtered_faces": []}
+        if image == NO_FACES:
+            return output
+        if on_faces_detected is not None:
+            await on_faces_detected(1)
+        output["results"].append({
+            "face_id": 1,
+            "bbox": (10, 10, 110, 140),
+            "detection_confidence": 0.95,
+            "classification_results": [
+                self.classification(model_name) for model_name in self.classifier_names
+            ],
+        })
+        return output
+
+
+@pytest.fixture
+def fake_pipeline():
+    return FakePipeline()
+
+
+@pytest.fixture
+def api(monkeypatch, fake_pipeline):
+    """TestClient over the analyses router with the fake pipeline and no result cache."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api import dependencies
+    from app.api.endpoints import analyses
+    from app.services.result_cache import ResultCache
+
+    async def recommendations(pipeline, results, metrics):
+        return {"analysis_text": "Sleep more.", "parameters": {"skin_condition": "Fine."}}
+
+    async def pipeline():
+        return fake_pipeline
+
+    monkeypatch.setattr(analyses, "result_cache", ResultCache(max_entries=0))
+    monkeypatch.setattr(analyses, "get_recommendations", recommendations)
+
+    app = FastAPI()
+    app.include_router(analyses.router, prefix="/analyses")
+    app.dependency_overrides[dependencies.get_pipeline] = pipeline
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,96 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+from app.core.config import settings
+from app.services.storage import storage_service
+
+from conftest import BLURRY, NO_FACES, UNDECODABLE
+
+HEADERS = {"X-API-KEY": settings.INTERNAL_API_KEY}
+
+
+def zip_archive(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, payload in members.items():
+            archive.writestr(name, payload)
+    return buffer.getvalue()
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-API-KEY": "wrong"}])
+def test_batch_needs_the_internal_api_key(api, fake_pipeline, headers):
+    response = api.post(
+        "/analyses/batch",
+        files=[("files", ("a.jpg", b"face", "image/jpeg"))],
+        headers=headers,
+    )
+
+    assert response.status_code == 401
+    assert fake_pipeline.images == []
+
+
+def test_batch_streams_one_line_per_image_and_a_summary(api):
+    storage_service.client.put_object(storage_service.bucket_name, "stored.jpg", io.BytesIO(b"face"))
+    archive = zip_archive({"set/1.jpg": b"face", "set/2.png": BLURRY, "notes.txt": b"skipped"})
+
+    response = api.post(
+        "/analyses/batch",
+        files=[
+            ("files", ("a.jpg", b"face", "image/jpeg")),
+            ("files", ("set.zip", archive, "application/zip")),
+            ("files", ("empty.jpg", NO_FACES, "image/jpeg")),
+            ("files", ("broken.jpg", UNDECODABLE, "image/jpeg")),
+        ],
+        data={"keys": ["stored.jpg", "missing.jpg"]},
+        headers=HEADERS,
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    *lines, last = ndjson(response)
+    by_name = {line["name"]: line for line in lines}
+    assert sorted(line["index"] for line in lines) == list(range(7))
+    assert {name: line["status"] for name, line in by_name.items()} == {
+        "a.jpg": "ok",
+        "set.zip/set/1.jpg": "ok",
+        "set.zip/set/2.png": "rejected",
+        "empty.jpg": "error",
+        "broken.jpg": "error",
+        "stored.jpg": "ok",
+        "missing.jpg": "error",
+    }
+    assert by_name["a.jpg"]["model_version"] == "v1"
+    assert len(by_name["a.jpg"]["faces"]) == 1
+    assert by_name["set.zip/set/2.png"]["detail"]["reason"] == "blurry"
+    assert by_name["empty.jpg"]["detail"] == "No faces detected in the image"
+    assert by_name["broken.jpg"]["detail"] == "Could not decode the image"
+    assert by_name["missing.jpg"]["detail"] == "Object not found"
+    summary = last["summary"]
+    assert {key: summary[key] for key in ("total", "ok", "rejected", "error")} == {
+        "total": 7, "ok": 3, "rejected": 1, "error": 3,
+    }
+
+
+def test_empty_batch_is_rejected(api):
+    response = api.post("/analyses/batch", headers=HEADERS)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "No images in the batch"
+
+
+def test_invalid_zip_is_rejected(api):
+    response = api.post(
+        "/analyses/batch",
+        files=[("files", ("set.zip", b"not a zip", "application/zip"))],
+        headers=HEADERS,
+    )
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "set.zip is not a valid zip archive"
@@ -0,0 +1,94 @@
+import pytest
+import torch
+from pydantic import ValidationError
+
+from app.core.metrics import CASCADE_DECISIONS, CASCADE_SAVED_RUNS
+from app.core.ml_config import MLSettings, ml_settings
+from app.services.cascade import CascadePolicy, CascadeRule
+from app.services.ml_pipeline import ModelPipeline, ModelSet
+
+CASCADE_SETTINGS = {
+    "ML_CASCADE": True,
+    "ML_FUSED_HEADS": False,
+    "ML_EXECUTOR": "inline",
+    "ML_MICRO_BATCHING": False,
+    "ML_INFERENCE_SERVER_URL": "",
+}
+
+
+def test_fused_heads_and_cascade_are_rejected_by_settings():
+    with pytest.raises(ValidationError, match="cannot be enabled together"):
+        MLSettings(ML_FUSED_HEADS=True, ML_CASCADE=True)
+
+
+def test_fused_heads_and_cascade_are_rejected_by_the_pipeline():
+    # model_copy() skips validation, the pipeline checks again
+    settings = ml_settings.model_copy(update={**CASCADE_SETTINGS, "ML_FUSED_HEADS": True})
+    with pytest.raises(ValueError, match="cannot be enabled together"):
+        ModelPipeline(settings)
+
+
+def test_later_rules_cannot_drive_earlier_models():
+    with pytest.raises(ValueError, match="can only affect later models"):
+        CascadePolicy(
+            [CascadeRule(models=["a"], action="skip", when_model="b")],
+            classifier_names=["a", "b"],
+        )
+
+
+def test_skip_wins_over_downgrade():
+    policy = CascadePolicy(
+        [
+            {"models": ["a"], "action": "downgrade", "max_crop_size": 200, "reason": "small"},
+            {"models": ["a"], "action": "skip", "max_crop_size": 100, "reason": "tiny"},
+        ],
+        classifier_names=["a"],
+    )
+
+    assert policy.decide("a", {"crop_size": 50}, []) == ("skip", "tiny")
+    assert policy.decide("a", {"crop_size": 150}, []) == ("downgrade", "small")
+    assert policy.decide("a", {"crop_size": 300}, []) == ("full", None)
+
+
+def fake_model(class_count):
+    return lambda batch: torch.zeros(batch.shape[0], class_count)
+
+
+def test_every_face_is_classified_and_recorded():
+    pipeline = ModelPipeline(ml_settings.model_copy(update=CASCADE_SETTINGS))
+    models = {
+        model_name: {
+            "model": fake_model(len(pipeline.model_configs[model_name]["class_names"])),
+            "class_names": pipeline.model_configs[model_name]["class_names"],
+        }
+        for model_name in pipeline.classifier_names
+    }
+    model_set = ModelSet(pipeline.executor, models)
+    # Default rules: a 100 px crop skips the eye models and downgrades the rest
+    faces = [
+        {"detection_confidence": 0.95, "crop_size": 300},
+        {"detection_confidence": 0.95, "crop_size": 100},
+    ]
+    decisions_before = dict(CASCADE_DECISIONS._values)
+    saved_before = sum(CASCADE_SAVED_RUNS._values.values())
+
+    face_results = pipeline.classify_batch(torch.zeros(2, 3, 224, 224), faces, model_set)
+
+    large, small = face_results
+    assert [result["model"] for result in large] == pipeline.classifier_names
+    assert not any(result.get("skipped") or result.get("downgraded") for result in large)
+    eye_models = {"mobilenet_eyes_darkcircles", "mobilenet_eyes_pupils"}
+    assert {result["model"] for result in small if result.get("skipped")} == eye_models
+    assert all(result.get("downgraded") for result in small if result["model"] not in eye_models)
+
+    recorded = {
+        key: value - decisions_before.get(key, 0)
+        for key, value in CASCADE_DECISIONS._values.items()
+        if value != decisions_before.get(key, 0)
+    }
+    assert sum(recorded.values()) == len(faces) * len(pipeline.classifier_names)
+    assert sum(v for (_, decision), v in recorded.items() if decision == "skip") == len(eye_models)
+    reduced_cost = (ml_settings.ML_CASCADE_REDUCED_SIZE / 224) ** 2
+    saved = sum(CASCADE_SAVED_RUNS._values.values()) - saved_before
+    expected = len(eye_models) + (len(pipeline.classifier_names) - len(eye_models)) * (1 - reduced_cost)
+    assert saved == pytest.approx(expected)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from app.services.frame_stream import FaceTracker, box_iou
+
+
+def test_box_iou():
+    assert box_iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert box_iou((0, 0, 10, 10), (5, 0, 15, 10)) == pytest.approx(50 / 150)
+    assert box_iou((0, 0, 10, 10), (20, 20, 30, 30)) == 0.0
+
+
+def test_detections_keep_their_track_ids():
+    tracker = FaceTracker()
+    tracker.update([((0, 0, 100, 100), 0.9), ((300, 0, 400, 100), 0.8)], timestamp=0.0)
+    first_ids = {tuple(track.bbox[:2]): track.id for track in tracker.tracks}
+
+    # Both faces moved a little, listed in the opposite order
+    tracker.update([((310, 0, 410, 100), 0.85), ((10, 0, 110, 100), 0.95)], timestamp=1.0)
+
+    by_position = {tuple(track.bbox[:2]): track for track in tracker.tracks}
+    assert len(tracker.tracks) == 2
+    assert by_position[(10.0, 0.0)].id == first_ids[(0.0, 0.0)]
+    assert by_position[(310.0, 0.0)].id == first_ids[(300.0, 0.0)]
+    assert by_position[(10.0, 0.0)].confidence == 0.95
+
+
+def test_far_detection_starts_a_new_track():
+    tracker = FaceTracker()
+    tracker.update([((0, 0, 100, 100), 0.9)], timestamp=0.0)
+
+    tracker.update([((500, 500, 600, 600), 0.9)], timestamp=1.0)
+
+    assert [track.id for track in tracker.tracks] == [1, 2]
+    assert [track.missed for track in tracker.tracks] == [1, 0]
+
+
+def test_missed_track_expires_after_max_missed():
+    tracker = FaceTracker(max_missed=2)
+    tracker.update([((0, 0, 100, 100), 0.9)], timestamp=0.0)
+
+    tracker.update([], timestamp=1.0)
+    tracker.update([], timestamp=2.0)
+    assert [track.missed for track in tracker.tracks] == [2]
+
+    tracker.update([], timestamp=3.0)
+    assert tracker.tracks == []
+
+
+def test_redetection_resets_missed():
+    tracker = FaceTracker(max_missed=2)
+    tracker.update([((0, 0, 100, 100), 0.9)], timestamp=0.0)
+    tracker.update([], timestamp=1.0)
+    tracker.update([((0, 0, 100, 100), 0.9)], timestamp=2.0)
+
+    assert [(track.id, track.missed) for track in tracker.tracks] == [(1, 0)]
+
+
+def test_boxes_move_with_the_measured_velocity_between_detections():
+    tracker = FaceTracker()
+    tracker.update([((0, 0, 100, 100), 0.9)], timestamp=0.0)
+    tracker.update([((10, 0, 110, 100), 0.9)], timestamp=1.0)
+
+    tracker.predict(timestamp=1.5)
+
+    np.testing.assert_allclose(tracker.tracks[0].bbox, [15, 0, 115, 100])
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+
+from app.services.ml_pipeline import InferenceExecutor
+
+
+class FakePipeline:
+    """Blocking 'inference' that records the thread and peak concurrency."""
+
+    def __init__(self, duration=0.05):
+        self.duration = duration
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def infer(self, value):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.duration)
+        with self.lock:
+            self.running -= 1
+        return value, threading.get_ident()
+
+
+def test_inline_runs_on_the_event_loop_thread():
+    executor = InferenceExecutor(FakePipeline(duration=0), kind="inline", workers=1)
+
+    async def main():
+        return await executor.run("infer", 1)
+
+    assert asyncio.run(main()) == (1, threading.get_ident())
+
+
+def test_thread_mode_keeps_the_event_loop_responsive():
+    executor = InferenceExecutor(FakePipeline(duration=0.2), kind="thread", workers=1)
+
+    async def main():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(heartbeat())
+        value, thread_id = await executor.run("infer", 7)
+        task.cancel()
+        return value, thread_id, ticks
+
+    try:
+        value, thread_id, ticks = asyncio.run(main())
+    finally:
+        executor.shutdown()
+
+    assert value == 7
+    assert thread_id != threading.get_ident()
+    assert ticks >= 5
+
+
+def test_concurrent_inferences_are_bounded():
+    pipeline = FakePipeline(duration=0.05)
+    executor = InferenceExecutor(pipeline, kind="thread", workers=4, max_concurrency=2)
+
+    async def main():
+        return await asyncio.gather(*(executor.run("infer", i) for i in range(8)))
+
+    try:
+        results = asyncio.run(main())
+    finally:
+        executor.shutdown()
+
+    assert [value for value, _ in results] == list(range(8))
+    assert pipeline.peak == 2
+
+
+def test_concurrency_defaults_to_the_worker_count():
+    executor = InferenceExecutor(FakePipeline(), kind="thread", workers=3)
+
+    assert executor.max_concurrency == 3
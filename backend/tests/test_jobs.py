@@ -0,0 +1,109 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.api import dependencies
+from app.api.endpoints import analyses
+from app.services import jobs
+from app.services.jobs import JobManager
+from app.services.scoring import METRICS
+
+from conftest import NO_FACES
+
+
+@pytest.fixture
+def job_api(api, monkeypatch):
+    """The analyses API with a fresh job manager and a signed-in user 7."""
+    messages = []
+
+    async def send_personal_message(message, user_id):
+        messages.append((user_id, message))
+
+    async def current_user():
+        return SimpleNamespace(id=7)
+
+    monkeypatch.setattr(analyses, "job_manager", JobManager(workers=1, queue_size=4))
+    monkeypatch.setattr(jobs.connection_manager, "send_personal_message", send_personal_message)
+    api.app.dependency_overrides[dependencies.get_optional_current_user] = current_user
+    yield api, messages
+    api.portal.call(analyses.job_manager.stop)
+
+
+def wait_finished(client, job_id):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        job = client.get(f"/analyses/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_stage_events_are_pushed_in_order(job_api):
+    client, messages = job_api
+
+    response = client.post("/analyses/jobs", files={"file": ("a.jpg", b"face", "image/jpeg")})
+
+    assert response.status_code == 202
+    job = wait_finished(client, response.json()["job_id"])
+    assert job["status"] == "completed"
+    assert job["result"]["model_version"] == "v1"
+    assert [user_id for user_id, _ in messages] == [7, 7, 7]
+    assert [message["stage"] for _, message in messages] == [
+        "faces_detected", "classified", "recommendations_ready",
+    ]
+    assert messages[0][1]["data"] == {"faces": 1}
+    assert set(messages[1][1]["data"]["diagram"]) == set(METRICS)
+    assert messages[2][1]["result"] == job["result"]
+
+
+def test_failed_job_reports_the_error(job_api):
+    client, messages = job_api
+
+    response = client.post("/analyses/jobs", files={"file": ("a.jpg", NO_FACES, "image/jpeg")})
+
+    job = wait_finished(client, response.json()["job_id"])
+    assert job["status"] == "failed"
+    assert job["error"] == "No faces detected in the image"
+    assert [message["stage"] for _, message in messages] == ["failed"]
+    assert messages[0][1]["error"] == job["error"]
+
+
+def test_full_queue_returns_503(api, monkeypatch):
+    class FullJobManager:
+        def submit(self, handler, owner_id=None):
+            raise asyncio.QueueFull
+
+    monkeypatch.setattr(analyses, "job_manager", FullJobManager())
+
+    response = api.post("/analyses/jobs", files={"file": ("a.jpg", b"face", "image/jpeg")})
+
+    assert response.status_code == 503
+    assert response.json()["detail"] == "Too many analyses in progress, try again later"
+
+
+def test_submit_raises_when_the_backlog_is_full():
+    async def main():
+        manager = JobManager(workers=1, queue_size=1)
+        release = asyncio.Event()
+
+        async def handler(job):
+            await release.wait()
+
+        running = manager.submit(handler)
+        while running.status != "running":
+            await asyncio.sleep(0)
+        queued = manager.submit(handler)
+        try:
+            with pytest.raises(asyncio.QueueFull):
+                manager.submit(handler)
+        finally:
+            release.set()
+            await manager.stop()
+        return queued
+
+    queued = asyncio.run(main())
+
+    assert queued.status == "queued"
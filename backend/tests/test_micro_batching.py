@@ -0,0 +1,128 @@
+import asyncio
+
+import torch
+
+from app.services.ml_pipeline import MicroBatchScheduler
+
+
+class FakePipeline:
+    """Classifies a face as its tensor value and records every batch."""
+
+    def __init__(self, fail=False):
+        self.model_set = object()
+        self.batches = []
+        self.fail = fail
+
+    async def run_models(self, model_set, method_name, input_tensor, faces):
+        assert method_name == "classify_batch"
+        ids = input_tensor.flatten().tolist()
+        self.batches.append((model_set, ids))
+        if self.fail:
+            raise RuntimeError("model failed")
+        return [[f"face-{int(face_id)}"] for face_id in ids]
+
+
+def faces(*ids):
+    return torch.tensor(ids, dtype=torch.float32).reshape(-1, 1)
+
+
+def run(scheduler, requests):
+    """Runs the requests coroutine function, then stops the scheduler."""
+    async def main():
+        try:
+            return await asyncio.wait_for(requests(), timeout=5)
+        finally:
+            await scheduler.stop()
+
+    return asyncio.run(main())
+
+
+def test_full_batch_is_sent_without_waiting():
+    pipeline = FakePipeline()
+    scheduler = MicroBatchScheduler(pipeline, max_batch_size=4, max_wait_ms=60_000)
+
+    async def requests():
+        return await asyncio.gather(
+            scheduler.submit(faces(1, 2)),
+            scheduler.submit(faces(3, 4)),
+        )
+
+    first, second = run(scheduler, requests)
+
+    assert first == [["face-1"], ["face-2"]]
+    assert second == [["face-3"], ["face-4"]]
+    assert [ids for _, ids in pipeline.batches] == [[1, 2, 3, 4]]
+    assert scheduler.stats()["batch_size_histogram"] == {4: 1}
+
+
+def test_partial_batch_is_sent_after_the_wait():
+    pipeline = FakePipeline()
+    scheduler = MicroBatchScheduler(pipeline, max_batch_size=8, max_wait_ms=20)
+
+    async def request():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        results = await scheduler.submit(faces(1, 2, 3))
+        return results, loop.time() - start
+
+    results, elapsed = run(scheduler, request)
+
+    assert results == [["face-1"], ["face-2"], ["face-3"]]
+    assert 0.015 <= elapsed < 1
+    assert scheduler.stats()["batch_size_histogram"] == {3: 1}
+
+
+def test_results_are_routed_to_their_requests():
+    pipeline = FakePipeline()
+    scheduler = MicroBatchScheduler(pipeline, max_batch_size=3, max_wait_ms=20)
+
+    async def requests():
+        return await asyncio.gather(*(
+            scheduler.submit(faces(*range(10 * i, 10 * i + i + 1))) for i in range(4)
+        ))
+
+    results = run(scheduler, requests)
+
+    for i, request_results in enumerate(results):
+        assert request_results == [[f"face-{face_id}"] for face_id in range(10 * i, 10 * i + i + 1)]
+    assert all(len(ids) <= 3 for _, ids in pipeline.batches)
+    assert sorted(face_id for _, ids in pipeline.batches for face_id in ids) == sorted(
+        face_id for i in range(4) for face_id in range(10 * i, 10 * i + i + 1)
+    )
+
+
+def test_model_sets_are_not_mixed_in_one_batch():
+    pipeline = FakePipeline()
+    old_set, new_set = object(), object()
+    scheduler = MicroBatchScheduler(pipeline, max_batch_size=4, max_wait_ms=20)
+
+    async def requests():
+        return await asyncio.gather(
+            scheduler.submit(faces(1, 2), model_set=old_set),
+            scheduler.submit(faces(3, 4), model_set=new_set),
+        )
+
+    first, second = run(scheduler, requests)
+
+    assert first == [["face-1"], ["face-2"]]
+    assert second == [["face-3"], ["face-4"]]
+    assert sorted(pipeline.batches, key=lambda batch: batch[1]) == [
+        (old_set, [1, 2]),
+        (new_set, [3, 4]),
+    ]
+
+
+def test_batch_error_reaches_every_request():
+    scheduler = MicroBatchScheduler(FakePipeline(fail=True), max_batch_size=4, max_wait_ms=20)
+
+    async def requests():
+        return await asyncio.gather(
+            scheduler.submit(faces(1)),
+            scheduler.submit(faces(2)),
+            return_exceptions=True,
+        )
+
+    errors = run(scheduler, requests)
+
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert [str(error) for error in errors] == ["model failed", "model failed"]
@@ -0,0 +1,35 @@
+from pathlib import Path
+
+import pytest
+
+from app.services.ml_pipeline import ModelPipeline
+from app.tools.preprocess_parity import (
+    MAX_DIFF,
+    compare_preprocessing,
+    load_images,
+    sample_crops,
+)
+
+DATA_DIR = Path(__file__).parent / "data"
+
+
+@pytest.fixture(scope="module")
+def pipeline():
+    return ModelPipeline()
+
+
+def test_bundled_face_matches_reference_transform(pipeline):
+    images = load_images(DATA_DIR)
+    assert images
+
+    worst_max, worst_mean = compare_preprocessing(pipeline, images)
+
+    assert worst_max <= MAX_DIFF + 1e-5
+    assert worst_mean <= 1e-3
+
+
+def test_random_crops_match_reference_transform(pipeline):
+    worst_max, worst_mean = compare_preprocessing(pipeline, sample_crops(10))
+
+    assert worst_max <= MAX_DIFF + 1e-5
+    assert worst_mean <= 1e-3
@@ -0,0 +1,32 @@
+import pytest
+
+from app.core.ml_config import MLSettings
+from app.services.quality import QualityRejection, check_face_sizes
+
+SETTINGS = MLSettings(ML_QUALITY_MIN_FACE=96)
+
+
+def test_gate_is_off_by_default():
+    assert MLSettings().ML_QUALITY_GATE is False
+
+
+def test_small_faces_are_returned_not_dropped():
+    large = ((0, 0, 200, 260), 0.95)
+    small = ((300, 300, 350, 360), 0.9)
+
+    kept, filtered = check_face_sizes([large, small], SETTINGS)
+
+    assert kept == [large]
+    assert filtered == [small]
+
+
+def test_only_small_faces_is_a_rejection():
+    with pytest.raises(QualityRejection) as e:
+        check_face_sizes([((0, 0, 40, 50), 0.9)], SETTINGS)
+
+    assert e.value.reason == "face_too_small"
+    assert e.value.metrics == {"face_size": 40, "min_face_size": 96}
+
+
+def test_no_faces_is_not_a_rejection():
+    assert check_face_sizes([], SETTINGS) == ([], [])
@@ -0,0 +1,156 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.core.ml_config import ml_settings
+from app.services.result_cache import ResultCache, settings_key
+
+
+class FakePipeline:
+    """process_image that counts calls and blocks until released."""
+
+    def __init__(self, version="v1"):
+        self.settings = ml_settings
+        self.version = version
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    def model_version_key(self):
+        return self.version
+
+    async def process_image(self, image, on_faces_detected=None, imgsz=None):
+        self.calls += 1
+        version = self.version
+        await self.release.wait()
+        return {
+            "results": [{
+                "face_id": 1,
+                "bbox": (0, 0, 10, 10),
+                "detection_confidence": 0.9,
+                "classification_results": [
+                    {"model": "m", "all_probabilities": np.array([0.25, 0.75], dtype=np.float32)}
+                ],
+            }],
+            "model_version": version,
+            "filtered_faces": [],
+        }
+
+
+async def started(pipeline, calls=1):
+    while pipeline.calls < calls:
+        await asyncio.sleep(0)
+
+
+def test_concurrent_requests_share_one_computation():
+    async def main():
+        cache = ResultCache(max_entries=8)
+        pipeline = FakePipeline()
+        requests = [asyncio.create_task(cache.get_or_process(pipeline, b"image")) for _ in range(3)]
+        await started(pipeline)
+        pipeline.release.set()
+        outputs = await asyncio.gather(*requests)
+        cached = await cache.get_or_process(pipeline, b"image")
+        return pipeline.calls, outputs, cached
+
+    calls, outputs, cached = asyncio.run(main())
+
+    assert calls == 1
+    for output in outputs + [cached]:
+        assert output["model_version"] == "v1"
+        assert output["results"][0]["bbox"] == (0, 0, 10, 10)
+        np.testing.assert_allclose(
+            output["results"][0]["classification_results"][0]["all_probabilities"], [0.25, 0.75]
+        )
+
+
+def test_waiter_takes_over_when_the_computing_request_is_cancelled():
+    async def main():
+        cache = ResultCache(max_entries=8)
+        pipeline = FakePipeline()
+        first = asyncio.create_task(cache.get_or_process(pipeline, b"image"))
+        await started(pipeline)
+        second = asyncio.create_task(cache.get_or_process(pipeline, b"image"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await started(pipeline, calls=2)
+        pipeline.release.set()
+        output = await second
+        return first, output, pipeline.calls
+
+    first, output, calls = asyncio.run(main())
+
+    assert first.cancelled()
+    assert calls == 2
+    assert output["model_version"] == "v1"
+
+
+def test_cancelled_waiter_does_not_cancel_the_computation():
+    async def main():
+        cache = ResultCache(max_entries=8)
+        pipeline = FakePipeline()
+        first = asyncio.create_task(cache.get_or_process(pipeline, b"image"))
+        await started(pipeline)
+        second = asyncio.create_task(cache.get_or_process(pipeline, b"image"))
+        await asyncio.sleep(0)
+        second.cancel()
+        pipeline.release.set()
+        return await first, second, pipeline.calls
+
+    output, second, calls = asyncio.run(main())
+
+    assert second.cancelled()
+    assert calls == 1
+    assert output["model_version"] == "v1"
+
+
+def test_errors_reach_waiters_and_are_not_cached():
+    async def main():
+        cache = ResultCache(max_entries=8)
+        pipeline = FakePipeline()
+
+        async def fail(*args):
+            pipeline.calls += 1
+            await pipeline.release.wait()
+            raise ValueError("undecodable")
+
+        pipeline.process_image = fail
+        requests = [asyncio.create_task(cache.get_or_process(pipeline, b"image")) for _ in range(2)]
+        await started(pipeline)
+        pipeline.release.set()
+        errors = await asyncio.gather(*requests, return_exceptions=True)
+        return errors, cache.stats()["entries"]
+
+    errors, entries = asyncio.run(main())
+
+    assert [type(error) for error in errors] == [ValueError, ValueError]
+    assert entries == 0
+
+
+def test_output_is_stored_under_the_version_that_produced_it():
+    async def main():
+        cache = ResultCache(max_entries=8)
+        pipeline = FakePipeline(version="v1")
+        request = asyncio.create_task(cache.get_or_process(pipeline, b"image"))
+        await started(pipeline)
+        # Reload finishes while the request still runs on the old models
+        pipeline.version = "v2"
+        pipeline.release.set()
+        await request
+        return list(cache._entries)
+
+    (key,) = asyncio.run(main())
+
+    assert key == ResultCache.make_key(b"image", "v1", settings_key(ml_settings))
+
+
+@pytest.mark.parametrize(
+    "update, imgsz",
+    [({}, 416), ({"ML_CASCADE": True}, None), ({"ML_QUALITY_GATE": True}, None)],
+)
+def test_settings_that_change_results_change_the_key(update, imgsz):
+    assert settings_key(ml_settings.model_copy(update=update), imgsz) != settings_key(ml_settings)
+
+
+def test_explicit_default_size_shares_the_default_key():
+    assert settings_key(ml_settings, ml_settings.ML_DETECTION_SIZE) == settings_key(ml_settings)
@@ -0,0 +1,127 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.services.model_registry import ModelRegistry
+from app.services.scoring import METRICS, score_batch, score_faces, score_results
+
+MODEL_CONFIGS = ModelRegistry().model_configs()
+CLASSIFIERS = [name for name in MODEL_CONFIGS if name != "yolo"]
+CLASS_NAMES = {name: MODEL_CONFIGS[name]["class_names"] for name in CLASSIFIERS}
+
+HEALTHY = {
+    "mobilenet_skin": {"healthy": 1.0},
+    "mobilenet_age": {"adult": 1.0},
+    "mobilenet_eyes_darkcircles": {"healthy": 1.0},
+    "mobilenet_eyes_pupils": {"healthy": 1.0},
+    "mobilenet_general": {"healthy": 1.0},
+}
+
+
+def probabilities_row(model_name, classes):
+    return np.array(
+        [classes.get(name, 0.0) for name in CLASS_NAMES[model_name]], dtype=np.float32
+    )
+
+
+def face(**overrides):
+    """classification_results of one face, healthy adult unless overridden"""
+    classes = {**HEALTHY, **overrides}
+    return [
+        {"model": model_name, "all_probabilities": probabilities_row(model_name, classes[model_name])}
+        for model_name in CLASSIFIERS
+    ]
+
+
+def score(**overrides):
+    probabilities = {
+        model_name: probabilities_row(model_name, {**HEALTHY, **overrides}[model_name])[None]
+        for model_name in CLASSIFIERS
+    }
+    return {
+        metric: round(float(values[0]), 2)
+        for metric, values in score_batch(probabilities, CLASS_NAMES).items()
+    }
+
+
+@pytest.mark.parametrize(
+    "overrides, expected",
+    [
+        (
+            {},
+            {"tireness": 0.0, "swelling": 0.0, "eyes_darkcircles": 0.0, "eyes_health": 100.0,
+             "skin_health": 100.0, "acne": 0.0, "stress": 0.0, "balance": 100.0},
+        ),
+        # Acne at the teenage norm of the prompt stays in "healthy + young = 80-95"
+        (
+            {"mobilenet_skin": {"acne": 0.3, "healthy": 0.7}, "mobilenet_age": {"teenage": 1.0}},
+            {"tireness": 0.0, "swelling": 0.0, "eyes_darkcircles": 0.0, "eyes_health": 100.0,
+             "skin_health": 90.0, "acne": 30.0, "stress": 0.0, "balance": 97.0},
+        ),
+        # The same acne weighs more on an adult face
+        (
+            {"mobilenet_skin": {"acne": 0.3, "healthy": 0.7}},
+            {"tireness": 0.0, "swelling": 0.0, "eyes_darkcircles": 0.0, "eyes_health": 100.0,
+             "skin_health": 75.0, "acne": 30.0, "stress": 0.0, "balance": 97.0},
+        ),
+        # light_darkcircles: first degree tiredness (25-40)
+        (
+            {"mobilenet_eyes_darkcircles": {"light_darkcircles": 0.5, "healthy": 0.5}},
+            {"tireness": 35.0, "swelling": 24.5, "eyes_darkcircles": 25.0, "eyes_health": 100.0,
+             "skin_health": 100.0, "acne": 0.0, "stress": 25.15, "balance": 70.3},
+        ),
+        # Dark circles with edema saturate tiredness and drive swelling up
+        (
+            {"mobilenet_eyes_darkcircles": {"darkcircles": 0.7, "healthy": 0.3},
+             "mobilenet_general": {"edema": 0.6, "healthy": 0.4}},
+            {"tireness": 100.0, "swelling": 89.5, "eyes_darkcircles": 73.75, "eyes_health": 100.0,
+             "skin_health": 87.1, "acne": 0.0, "stress": 76.34, "balance": 9.32},
+        ),
+        (
+            {"mobilenet_eyes_pupils": {"conjunctivitis": 0.5, "healthy": 0.5}},
+            {"tireness": 0.0, "swelling": 0.0, "eyes_darkcircles": 0.0, "eyes_health": 90.0,
+             "skin_health": 100.0, "acne": 0.0, "stress": 0.0, "balance": 100.0},
+        ),
+    ],
+)
+def test_diagram_values(overrides, expected):
+    assert score(**overrides) == pytest.approx(expected, abs=0.01)
+
+
+@pytest.mark.parametrize(
+    "edema, swelling",
+    [(0.3, 30.0), (0.5, 40.0), (0.51, 45.4), (1.0, 65.0)],
+)
+def test_edema_ranges_from_prompt(edema, swelling):
+    # Tiredness stays below 25, so only the edema ranges set swelling
+    tireness_free = {
+        "mobilenet_general": {"edema": edema, "healthy": 1 - edema},
+    }
+    base = score(**tireness_free)
+    bonus = 10 + 20 * base["tireness"] / 100 if base["tireness"] > 25 else 0
+    assert base["swelling"] - bonus == pytest.approx(swelling, abs=0.05)
+
+
+def test_failed_and_skipped_models_score_as_default_class():
+    classifications = [
+        {"model": "mobilenet_skin", "error": "boom"},
+        {"model": "mobilenet_eyes_pupils", "skipped": True, "reason": "eyes_too_small"},
+    ] + [c for c in face() if c["model"] not in ("mobilenet_skin", "mobilenet_eyes_pupils")]
+    pipeline = SimpleNamespace(model_configs=MODEL_CONFIGS, classifier_names=CLASSIFIERS)
+
+    scores = score_faces(pipeline, [{"classification_results": classifications}])[0]
+
+    assert scores == score_faces(pipeline, [{"classification_results": face()}])[0]
+
+
+def test_results_are_scored_for_the_primary_face():
+    pipeline = SimpleNamespace(model_configs=MODEL_CONFIGS, classifier_names=CLASSIFIERS)
+    primary = {"classification_results": face()}
+    other = {"classification_results": face(mobilenet_skin={"acne": 1.0})}
+
+    scores = score_results(pipeline, [primary, other])
+
+    assert set(scores) == set(METRICS)
+    assert scores == score_faces(pipeline, [primary])[0]
+    assert score_faces(pipeline, [primary, other])[1]["acne"] == 100